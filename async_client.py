@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import order_execution
+from connection import mt5
+
+# Läsanrop utan sidoeffekter, samtidiga identiska anrop slås ihop till ett
+COALESCED = frozenset({
+    "terminal_info", "account_info", "symbols_get", "symbol_info", "symbol_info_tick",
+    "positions_get", "orders_get", "history_deals_get", "copy_ticks_from", "order_calc_margin",
+})
+
+
+class AsyncTerminal:
+    """
+    Asyncio-fasad över connection.mt5 för kod som körs i en event-loop. Anropen körs i
+    fasadens executor, så event-loopen blockeras aldrig. Identiska läsanrop som pågår
+    samtidigt (t.ex. flera korutiner som vill ha samma symbol_info_tick) blir ett enda
+    anrop till terminalen och alla får samma svar.
+
+    Med standard-executorn (en tråd) körs alla anrop som går genom samma AsyncTerminal ett
+    i taget, inklusive funktioner som skickas till run(). Det gäller bara dem: spread_estimator,
+    LadderSupervisor, hälsokontrollen i connection och trådpoolen i order_execution.submit_ladder
+    anropar connection.mt5 direkt från sina egna trådar, parallellt med fasaden.
+    """
+
+    def __init__(self, terminal=None, executor=None):
+        """
+        :param terminal: Objektet som anropen går till, standard är connection.mt5.
+        :param executor: Executor som anropen körs i, standard är en tråd.
+        """
+        self._terminal = terminal if terminal is not None else mt5
+        self._executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1,
+                                                                                  thread_name_prefix="mt5")
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def __getattr__(self, name):
+        value = getattr(self._terminal, name)
+        if not callable(value):
+            return value
+
+        async def call(*args, **kwargs):
+            return await self._call(name, args, kwargs)
+
+        call.__name__ = name
+        # Spara på instansen så att nästa uppslag inte går via __getattr__
+        self.__dict__[name] = call
+        return call
+
+    async def _call(self, name, args, kwargs):
+        key = _call_key(name, args, kwargs) if name in COALESCED else None
+        if key is not None:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                # shield så att en avbruten väntare inte avbryter anropet för de andra
+                return await asyncio.shield(future)
+        function = getattr(self._terminal, name)
+        future = asyncio.get_running_loop().run_in_executor(self._executor, lambda: function(*args, **kwargs))
+        self.calls += 1
+        if key is None:
+            return await future
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Kör en blockerande funktion som använder terminalen i samma tråd som övriga anrop.
+        """
+        self.calls += 1
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: function(*args, **kwargs))
+
+    async def place_order(self, symbol, lot_size, order_type, price=None, sl=None, tp=None, magic=0):
+        """
+        Samma som order_execution.place_order.
+        """
+        return await self.run(order_execution.place_order, symbol, lot_size, order_type, price, sl, tp, magic)
+
+    async def adjust_volume(self, volume, symbol):
+        """
+        Samma som order_execution.adjust_volume.
+        """
+        return await self.run(order_execution.adjust_volume, volume, symbol)
+
+    async def update_sl(self, ticket, sl_price, point, points_per_pip_value, symbol=None):
+        """
+        Samma som order_execution.update_sl.
+        """
+        return await self.run(order_execution.update_sl, ticket, sl_price, point, points_per_pip_value, symbol)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def _call_key(name, args, kwargs):
+    key = (name, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        # T.ex. en lista eller dictionary som argument, sådana anrop slås inte ihop
+        return None
+    return key
+
+
+# Delad fasad för hela processen, skapas vid första användningen
+_client = None
+
+
+def get_client():
+    """
+    :return: Den delade AsyncTerminal som går via connection.mt5.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncTerminal()
+    return _client
@@ -0,0 +1,293 @@
+import argparse
+import contextlib
+import io
+
+import numpy as np
+
+import fake_mt5
+from connection import mt5
+from order_execution import calculate_sl_price, calculate_tp_price, points_per_pip, prepare_ladder, submit_ladder
+from pip_values import PipValueService
+from planner import plan_ladders
+from sl_manager import SLManager
+from supervisor import Ladder
+
+# Första sökfönstret (antal ticks) när nästa händelse letas upp, dubblas tills något hittas
+_SCAN_CHUNK = 4096
+
+
+def load_ticks(path):
+    """
+    Läser historiska ticks.
+    .npz: arrayerna 'time', 'bid' och 'ask'.
+    .npy: strukturerad array med fälten time/bid/ask eller en (N, 3)-array.
+    .csv: kolumnerna time,bid,ask med rubrikrad, time i sekunder sedan epoch.
+    :return: (time, bid, ask) som NumPy-arrayer.
+    """
+    if path.endswith(".npz"):
+        data = np.load(path)
+        return data["time"], data["bid"], data["ask"]
+    if path.endswith(".npy"):
+        data = np.load(path)
+        if data.dtype.names:
+            return data["time"], data["bid"], data["ask"]
+        return data[:, 0], data[:, 1], data[:, 2]
+    data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=(0, 1, 2))
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def default_params(symbol, **overrides):
+    """
+    Stegens parametrar från settings.py, med pips justerade för symbolens decimaler.
+    Ska anropas efter att backenden installerats.
+    :param overrides: Värden som ersätter settings.py. number_of_pips och initial_stop_level
+                      anges i pips som i PIPS_FOR_DIGITS och justeras på samma sätt.
+    """
+    import settings
+    pips = dict(settings.PIPS_FOR_DIGITS)
+    for name in pips:
+        if name in overrides:
+            pips[name] = overrides.pop(name)
+    params = {
+        "account_size": settings.account_size,
+        "target_gain_percent": settings.target_gain_percent,
+        "number_of_pips": settings.adjust_pips_for_digits(symbol, pips["number_of_pips"]),
+        "initial_stop_percent": settings.initial_stop_percent,
+        "initial_stop_level": settings.adjust_pips_for_digits(symbol, pips["initial_stop_level"]),
+        "top_up_levels": list(settings.top_up_levels),
+    }
+    params.update(overrides)
+    return params
+
+
+def _next_event(bid, ask, start, buy_stop_min, sl_max, tp_min):
+    """
+    Index för första ticket från start där en stop-order, SL eller TP passeras.
+    Söker i växande fönster så att kostnaden följer avståndet till händelsen.
+    """
+    n = len(bid)
+    chunk = _SCAN_CHUNK
+    i = start
+    while i < n:
+        end = min(n, i + chunk)
+        mask = np.zeros(end - i, dtype=bool)
+        if buy_stop_min is not None:
+            mask |= ask[i:end] >= buy_stop_min
+        if sl_max:
+            mask |= bid[i:end] <= sl_max
+        if tp_min:
+            mask |= bid[i:end] >= tp_min
+        hit = int(mask.argmax())
+        if mask[hit]:
+            return i + hit
+        i = end
+        chunk *= 2
+    return None
+
+
+class _Drawdown:
+    """
+    Följer max drawdown på equity-kurvan.
+    """
+
+    def __init__(self, equity):
+        self.peak = equity
+        self.max_drawdown = 0.0
+
+    def update(self, equity):
+        equity = np.atleast_1d(equity)
+        if equity.size == 0:
+            return
+        running_peak = np.maximum.accumulate(np.maximum(equity, self.peak))
+        self.max_drawdown = max(self.max_drawdown, float((running_peak - equity).max()))
+        self.peak = float(running_peak[-1])
+
+
+def _open_ladder(terminal, symbol, params, magic, sl_updates=None, pip_service=None):
+    """
+    Lägger en stege på samma sätt som main.py, mot den installerade backenden.
+    :return: Ladder eller None om initialordern inte kunde läggas.
+    """
+    info = terminal.symbol_info(symbol)
+    spread_in_pips = (info.ask - info.bid) / info.point / 10
+    if pip_service is None:
+        pip_service = PipValueService()
+        pip_service.refresh()
+    pip_service.on_tick(symbol, info.bid, info.ask)
+    pip_value = pip_service.pip_value(symbol)
+    if pip_value is None:
+        return None
+    plan = plan_ladders([symbol], [pip_value], [spread_in_pips], params["account_size"],
+                        params["target_gain_percent"], params["number_of_pips"], params["initial_stop_percent"],
+                        params["initial_stop_level"], params["top_up_levels"])
+    lots = plan["break_even"]["lots"][0, 0]
+    if not np.all(np.isfinite(lots)) or np.any(lots <= 0):
+        return None
+
+    point = info.point
+    points_per_pip_value = points_per_pip(symbol)
+    current_price = info.ask
+    tp_price = calculate_tp_price(current_price, params["number_of_pips"], 'BUY', point, points_per_pip_value)
+    sl_price = calculate_sl_price(current_price, params["initial_stop_level"], 'BUY', point, points_per_pip_value)
+    entry_levels = [
+        current_price + (level / 100) * params["number_of_pips"] * point * points_per_pip_value
+        for level in params["top_up_levels"]
+    ]
+    requests = prepare_ladder(symbol, float(lots[0]), current_price, sl_price, tp_price,
+                              [float(lot) for lot in lots[1:]], entry_levels, magic=magic)
+    if requests is None:
+        return None
+    report = submit_ladder(requests, max_workers=1)
+    if report["initial"] is None or report["initial"].retcode != mt5.TRADE_RETCODE_DONE:
+        return None
+    return Ladder(symbol, magic, current_price, current_price, entry_levels, point, points_per_pip_value, tp_price,
+                  sl_updates)
+
+
+def run_backtest(times, bids, asks, symbol, symbol_spec=None, params=None, restart_ticks=1, leverage=100, quiet=True,
+                 overrides=None):
+    """
+    Spelar upp ticks mot stegens logik: initial BUY med SL/TP, BUY_STOP-ordrar på entry-nivåerna
+    och flytt av SL till break-even när en stop-order aktiveras (samma regel som monitor_positions).
+    Mellan två händelser görs inga anrop, nästa händelse letas upp vektoriserat.
+    :param times: Tidpunkter per tick.
+    :param bids: Bid per tick.
+    :param asks: Ask per tick.
+    :param symbol: Symbolens namn.
+    :param symbol_spec: Argument till FakeTerminal.add_symbol (digits, contract_size, tick_value ...).
+    :param params: Stegens parametrar, se default_params(). None betyder värdena i settings.py.
+    :param restart_ticks: Antal ticks att vänta efter en avslutad stege innan nästa läggs.
+    :param leverage: Kontots hävstång, styr marginalkravet i FakeTerminal.
+    :param quiet: Dölj utskrifterna från orderhanteringen.
+    :param overrides: Används när params är None, se default_params().
+    :return: Dictionary med 'ladders' (en rad per stege) och 'summary'. Om en stege inte
+             kan läggas avbryts uppspelningen och orsaken står i summary['error'].
+    """
+    bids = np.asarray(bids, dtype=float)
+    asks = np.asarray(asks, dtype=float)
+    terminal = fake_mt5.FakeTerminal(balance=(params or {}).get("account_size", 10000.0), leverage=leverage)
+    terminal.add_symbol(symbol, **(symbol_spec or {}))
+    previous = fake_mt5.install(terminal)
+    output = io.StringIO() if quiet else None
+    try:
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            if params is None:
+                params = default_params(symbol, **(overrides or {}))
+                terminal.balance = params["account_size"]
+            ladders, drawdown, error = _replay(terminal, times, bids, asks, symbol, params, restart_ticks)
+    finally:
+        fake_mt5.restore(previous)
+
+    profits = np.array([row["profit"] for row in ladders], dtype=float)
+    outcomes = [row["outcome"] for row in ladders]
+    topped_up = [row for row in ladders if row["break_even_moved"]]
+    summary = {
+        "ladders": len(ladders),
+        "net_profit": float(profits.sum()),
+        "return_percent": float(profits.sum() / params["account_size"] * 100),
+        "max_drawdown": drawdown.max_drawdown,
+        "max_drawdown_percent": drawdown.max_drawdown / params["account_size"] * 100,
+        "take_profit_hits": outcomes.count("take_profit"),
+        "stop_loss_hits": outcomes.count("stop_loss"),
+        "break_even_hits": outcomes.count("break_even"),
+        "break_even_hit_rate": outcomes.count("break_even") / len(topped_up) if topped_up else 0.0,
+        "final_balance": float(terminal.balance),
+        "error": error,
+    }
+    return {"ladders": ladders, "summary": summary}
+
+
+def _replay(terminal, times, bids, asks, symbol, params, restart_ticks):
+    ladders = []
+    drawdown = _Drawdown(terminal.balance)
+    value_per_price = None
+    # Uppspelningen går fortare än realtid, så SL-ändringarna begränsas inte per sekund
+    sl_updates = SLManager(max_per_second=None)
+    pip_service = PipValueService()
+    pip_service.refresh()
+    magic = 0
+    i = 0
+    n = len(bids)
+    while i < n:
+        terminal.push_tick(symbol, times[i], bids[i], asks[i])
+        magic += 1
+        ladder = _open_ladder(terminal, symbol, params, magic, sl_updates, pip_service)
+        if ladder is None:
+            # Samma parametrar ger samma fel på nästa tick, så uppspelningen avbryts
+            return ladders, drawdown, f"Ladder could not be opened at tick {i}: {terminal.last_error()}"
+        if value_per_price is None:
+            spec = terminal.symbols[symbol]
+            value_per_price = spec["trade_tick_value"] / spec["trade_tick_size"]
+
+        start_index, start_balance = i, terminal.balance
+        break_even_moved = False
+        while True:
+            positions = [pos for pos in terminal.positions.values() if pos["magic"] == magic]
+            orders = [order for order in terminal.orders.values() if order["magic"] == magic]
+            buy_stops = [order["price_open"] for order in orders if order["type"] == terminal.ORDER_TYPE_BUY_STOP]
+            stop_losses = [pos["sl"] for pos in positions if pos["sl"]]
+            take_profits = [pos["tp"] for pos in positions if pos["tp"]]
+            j = _next_event(bids, asks, i + 1, min(buy_stops) if buy_stops else None,
+                            max(stop_losses) if stop_losses else None,
+                            min(take_profits) if take_profits else None)
+
+            # Equity mellan händelserna är linjär i bid eftersom positionerna inte ändras
+            volume = sum(pos["volume"] for pos in positions)
+            cost = sum(pos["volume"] * pos["price_open"] for pos in positions)
+            segment = bids[i + 1:n if j is None else j]
+            drawdown.update(terminal.balance + value_per_price * (volume * segment - cost))
+            if j is None:
+                return ladders, drawdown, None
+
+            terminal.push_tick(symbol, times[j], bids[j], asks[j])
+            drawdown.update(terminal.account_info().equity)
+            ladder.process(mt5.positions_get(symbol=symbol), mt5.orders_get(symbol=symbol))
+            break_even_moved = break_even_moved or any(
+                pos["sl"] == ladder.break_even_price for pos in terminal.positions.values() if pos["magic"] == magic
+            )
+            i = j
+            if ladder.finished:
+                break
+
+        # Stop-ordrar som inte aktiverats tas bort när stegen är avslutad
+        for ticket in ladder.order_tickets:
+            mt5.order_send({"action": mt5.TRADE_ACTION_REMOVE, "order": ticket, "symbol": symbol})
+        exit_price = bids[i]
+        if exit_price >= ladder.tp_price:
+            outcome = "take_profit"
+        elif break_even_moved:
+            outcome = "break_even"
+        else:
+            outcome = "stop_loss"
+        ladders.append({
+            "start_time": float(times[start_index]),
+            "end_time": float(times[i]),
+            "profit": float(terminal.balance - start_balance),
+            "outcome": outcome,
+            "break_even_moved": break_even_moved,
+        })
+        i += restart_ticks
+    return ladders, drawdown, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest av double account-stegen mot historiska ticks.")
+    parser.add_argument("ticks", help="Tickfil (.csv, .npy eller .npz) med time, bid och ask.")
+    parser.add_argument("--symbol", default="EURUSD")
+    parser.add_argument("--digits", type=int, default=5)
+    parser.add_argument("--contract-size", type=float, default=100000)
+    parser.add_argument("--tick-value", type=float, default=1.0)
+    parser.add_argument("--leverage", type=float, default=100)
+    args = parser.parse_args(argv)
+
+    times, bids, asks = load_ticks(args.ticks)
+    spec = {"digits": args.digits, "contract_size": args.contract_size, "tick_value": args.tick_value}
+    result = run_backtest(times, bids, asks, args.symbol, symbol_spec=spec, leverage=args.leverage)
+    for key, value in result["summary"].items():
+        if value is None:
+            continue
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
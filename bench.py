@@ -0,0 +1,206 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import fake_mt5
+import symbol_cache
+from order_execution import adjust_volume, monitor_positions, place_order, prepare_ladder, submit_ladder, update_sl
+from planner import (
+    calculate_gain_in_dollars, calculate_initial_lot_size, calculate_loss_in_dollars, calculate_pip_gain,
+    plan_ladders,
+)
+from polling import AdaptivePoller
+from supervisor import Ladder, LadderSupervisor
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDCHF", "AUDUSD", "NZDUSD", "EURGBP"]
+
+
+def _measure(function, iterations, setup=None):
+    """
+    Kör function iterations gånger och returnerar statistik i mikrosekunder.
+    setup körs före varje varv och räknas inte in i tiden.
+    """
+    samples = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return _summarize(samples)
+
+
+def _summarize(samples):
+    samples = sorted(samples)
+    return {
+        "iterations": len(samples),
+        "mean_us": statistics.fmean(samples),
+        "median_us": statistics.median(samples),
+        "p95_us": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_us": samples[0],
+    }
+
+
+def _make_terminal(latency):
+    terminal = fake_mt5.FakeTerminal(balance=100000.0, leverage=500, latency=latency)
+    for i, symbol in enumerate(SYMBOLS):
+        terminal.add_symbol(symbol, tick_value=1.0)
+        price = 1.1 + i * 0.05
+        terminal.push_tick(symbol, 0, price, price + 0.00012)
+    return terminal
+
+
+def bench_planner(iterations):
+    results = {
+        "planner.calculate_loss_in_dollars": _measure(lambda: calculate_loss_in_dollars(4, 1000), iterations),
+        "planner.calculate_initial_lot_size": _measure(lambda: calculate_initial_lot_size(40.0, 3.0, 10.0), iterations),
+        "planner.calculate_pip_gain": _measure(lambda: calculate_pip_gain(10.0, 1.2, 35, 50, 65), iterations),
+        "planner.calculate_gain_in_dollars": _measure(lambda: calculate_gain_in_dollars(1.33, 8.8, 10.0), iterations),
+    }
+    # 30 symboler x 500 parametervarianter i ett anrop
+    rng = np.random.default_rng(0)
+    symbols = [f"SYM{i}" for i in range(30)]
+    pip_values = rng.uniform(1, 10, size=30)
+    spreads = rng.uniform(0.5, 3, size=30)
+    levels = np.sort(rng.uniform(20, 80, size=(500, 3)), axis=1)
+    results["planner.plan_ladders_30x500"] = _measure(
+        lambda: plan_ladders(symbols, pip_values, spreads, 1000, 50, 100.0, 4, 30.0, levels),
+        max(1, iterations // 100),
+    )
+    return results
+
+
+def bench_order_path(iterations, latency):
+    terminal = _make_terminal(latency)
+    fake_mt5.install(terminal)
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["order_execution.adjust_volume"] = _measure(lambda: adjust_volume(0.123, "EURUSD"), iterations)
+        results["order_execution.adjust_volume_cold"] = _measure(
+            lambda: adjust_volume(0.123, "EURUSD"), iterations, setup=symbol_cache.invalidate
+        )
+        results["order_execution.place_order"] = _measure(
+            lambda: place_order("EURUSD", 0.1, 'BUY', price=1.10012, sl=1.0990, tp=1.1100), iterations
+        )
+        tickets = list(terminal.positions)
+        results["order_execution.update_sl"] = _measure(
+            lambda: update_sl(tickets[0], 1.0995, 0.00001, 10, symbol="EURUSD"), iterations
+        )
+        results["order_execution.update_sl_lookup"] = _measure(
+            lambda: update_sl(tickets[0], 1.0995, 0.00001, 10), iterations
+        )
+
+        def ladder():
+            requests = prepare_ladder("EURUSD", 0.1, 1.10012, 1.0990, 1.1100, [0.02, 0.04, 0.08],
+                                      [1.1005, 1.1010, 1.1015])
+            submit_ladder(requests)
+
+        results["order_execution.prepare_and_submit_ladder"] = _measure(ladder, max(1, iterations // 10))
+    return results
+
+
+def bench_monitor(iterations, latency):
+    terminal = _make_terminal(latency)
+    fake_mt5.install(terminal)
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        place_order("EURUSD", 0.1, 'BUY', price=1.10012, sl=1.0990, tp=1.1100)
+        cycles = {"count": 0, "samples": []}
+        last = {"time": time.perf_counter()}
+
+        def fake_sleep(delay):
+            # Mät ett varv i taget och avsluta övervakningen efter iterations varv
+            now = time.perf_counter()
+            cycles["samples"].append((now - last["time"]) * 1e6)
+            cycles["count"] += 1
+            if cycles["count"] >= iterations:
+                terminal.push_tick("EURUSD", 1, 1.1101, 1.1102)
+            last["time"] = time.perf_counter()
+
+        last["time"] = time.perf_counter()
+        monitor_positions("EURUSD", 1.10012, 1.10012, [1.1005, 1.1010, 1.1015], 0.00001, 10,
+                          poller=AdaptivePoller(sleep=fake_sleep))
+        results["order_execution.monitor_positions_cycle"] = _summarize(cycles["samples"])
+
+        # Ett varv i supervisorn med en stege per symbol
+        supervisor = LadderSupervisor()
+        for magic, symbol in enumerate(SYMBOLS, start=1):
+            price = terminal.symbols[symbol]["ask"]
+            place_order(symbol, 0.1, 'BUY', price=price, sl=price - 0.001, tp=price + 0.01, magic=magic)
+            supervisor.register(Ladder(symbol, magic, price, price, [price + 0.0005], 0.00001, 10))
+        results["supervisor.run_cycle_6_ladders"] = _measure(supervisor.run_cycle, iterations)
+
+        # En tick som inte passerar någon nivå, det vanliga fallet mellan varven
+        tick = terminal.symbol_info_tick("EURUSD")
+        results["supervisor.on_tick_no_trigger"] = _measure(
+            lambda: supervisor.on_tick("EURUSD", tick.bid, tick.ask), iterations)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Jämför mot en tidigare körning.
+    :return: Lista med benchmarks vars median blivit mer än tolerance långsammare.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous and result["median_us"] > previous["median_us"] * (1 + tolerance):
+            regressions.append((name, previous["median_us"], result["median_us"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks för planering, orderväg och övervakning mot en fake-terminal.")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fördröjning per terminalanrop i millisekunder.")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Tidigare resultatfil att jämföra mot.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Tillåten försämring av medianen, 0.2 = 20 %%.")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    latency = args.latency_ms / 1000
+    previous_backend = fake_mt5.install(fake_mt5.FakeTerminal())
+    try:
+        results = {}
+        results.update(bench_planner(args.iterations))
+        results.update(bench_order_path(args.iterations, latency))
+        results.update(bench_monitor(args.iterations, latency))
+    finally:
+        fake_mt5.restore(previous_backend)
+
+    report = {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "latency_ms": args.latency_ms,
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=1)
+
+    for name, result in results.items():
+        print(f"{name:50s} median {result['median_us']:10.1f} us   p95 {result['p95_us']:10.1f} us")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.1f} us -> {after:.1f} us")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
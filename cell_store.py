@@ -0,0 +1,239 @@
+import json
+import mmap
+import os
+import struct
+import time
+import zipfile
+
+from excel import _sheet_paths, iter_cells
+from formula_engine import expand_range, split_coordinate
+
+_MAGIC = b"CELLIDX1"
+_HEADER = struct.Struct("<8sQ")
+# Nyckel (kolumn << 20 | rad, 0 = tom plats), position i datafilen och längd
+_ENTRY = struct.Struct("<QQQ")
+_MANIFEST = "manifest.json"
+_SHARED_STRINGS = "xl/sharedStrings.xml"
+
+
+def _key(coordinate):
+    column, row = split_coordinate(coordinate)
+    return (column << 20) | row
+
+
+def _slot(key, capacity):
+    # Fibonacci-hashning, capacity är alltid en tvåpotens
+    return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - capacity.bit_length() + 1)
+
+
+def _write_sheet(records, index_path, data_path):
+    """
+    Skriver en datafil med en JSON-rad per cell och ett hashindex med öppen adressering.
+    :return: Antal celler.
+    """
+    entries = []
+    with open(data_path + ".tmp", "wb") as data_file:
+        offset = 0
+        for record in records:
+            line = json.dumps({"value": record["value"], "formula": record["formula"],
+                               "coordinates": record["coordinates"]},
+                              separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            data_file.write(line + b"\n")
+            entries.append((_key(record["coordinates"]), offset, len(line)))
+            offset += len(line) + 1
+
+    # Högst halvfull tabell så att sonderingen blir kort
+    capacity = 8
+    while capacity < len(entries) * 2:
+        capacity *= 2
+    table = bytearray(_HEADER.size + capacity * _ENTRY.size)
+    _HEADER.pack_into(table, 0, _MAGIC, capacity)
+    for key, offset, length in entries:
+        slot = _slot(key, capacity)
+        while _ENTRY.unpack_from(table, _HEADER.size + slot * _ENTRY.size)[0]:
+            slot = (slot + 1) & (capacity - 1)
+        _ENTRY.pack_into(table, _HEADER.size + slot * _ENTRY.size, key, offset, length)
+    with open(index_path + ".tmp", "wb") as index_file:
+        index_file.write(table)
+
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(index_path + ".tmp", index_path)
+    return len(entries)
+
+
+class _SheetMap:
+    """
+    Ett blads index och data, minnesmappade.
+    """
+
+    def __init__(self, index_path, data_path):
+        with open(index_path, "rb") as file:
+            self.index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.capacity = _HEADER.unpack_from(self.index, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Invalid cell index: {index_path}")
+        self.data = b""
+        if os.path.getsize(data_path):
+            with open(data_path, "rb") as file:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def lookup(self, key):
+        slot = _slot(key, self.capacity)
+        while True:
+            stored, offset, length = _ENTRY.unpack_from(self.index, _HEADER.size + slot * _ENTRY.size)
+            if stored == key:
+                return json.loads(self.data[offset:offset + length])
+            if stored == 0:
+                return None
+            slot = (slot + 1) & (self.capacity - 1)
+
+    def close(self):
+        self.index.close()
+        if self.data:
+            self.data.close()
+
+
+class CellStore:
+    """
+    Celler från arbetsboken i ett kompakt lager på disk. Uppslag av en cell eller ett område
+    läser bara de poster som efterfrågas, och lagret byggs om per blad när arbetsboken ändras.
+    """
+
+    def __init__(self, workbook_path, store_dir=None, check_interval=1.0, clock=time.monotonic):
+        """
+        :param workbook_path: Sökväg till .xlsx-filen.
+        :param store_dir: Katalog för lagret, standard är arbetsbokens namn + '.cells'.
+        :param check_interval: Sekunder mellan kontrollerna av arbetsbokens mtime.
+        :param clock: Klocka för check_interval, kan bytas i tester.
+        """
+        self.workbook_path = workbook_path
+        self.store_dir = store_dir or workbook_path + ".cells"
+        self.check_interval = check_interval
+        self._clock = clock
+        self._checked_at = None
+        self._maps = {}
+        self.manifest = self._read_manifest()
+        self.rebuilds = 0
+        self.refresh()
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.store_dir, _MANIFEST)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {"mtime": None, "shared_strings_crc": None, "sheets": {}}
+
+    def _write_manifest(self):
+        path = os.path.join(self.store_dir, _MANIFEST)
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.manifest, file)
+        os.replace(path + ".tmp", path)
+
+    def refresh(self):
+        """
+        Bygger om de blad vars XML ändrats sedan förra gången.
+        Om arbetsboken saknas används lagret som det är.
+        :return: Lista med ombyggda blad.
+        """
+        self._checked_at = self._clock()
+        try:
+            mtime = os.path.getmtime(self.workbook_path)
+        except OSError:
+            return []
+        if mtime == self.manifest["mtime"]:
+            return []
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        with zipfile.ZipFile(self.workbook_path) as archive:
+            # CRC:erna står i zipfilens katalog, så inget blad behöver packas upp för att jämföras
+            crcs = {info.filename: info.CRC for info in archive.infolist()}
+            sheet_paths = _sheet_paths(archive)
+        shared_strings_crc = crcs.get(_SHARED_STRINGS)
+        strings_changed = shared_strings_crc != self.manifest["shared_strings_crc"]
+
+        old_sheets = self.manifest["sheets"]
+        sheets = {}
+        changed = []
+        for name, path in sheet_paths:
+            previous = old_sheets.get(name)
+            if previous and not strings_changed and previous["crc"] == crcs.get(path):
+                sheets[name] = previous
+            else:
+                changed.append(name)
+        # Nya filnamn får inte krocka med blad som behålls
+        used = {info["file"] for info in sheets.values()}
+        number = 0
+        for name, path in sheet_paths:
+            if name in changed:
+                while f"sheet{number}" in used:
+                    number += 1
+                used.add(f"sheet{number}")
+                sheets[name] = {"crc": crcs.get(path), "file": f"sheet{number}", "count": 0}
+
+        for name in list(self._maps):
+            if name in changed or name not in sheets:
+                self._maps.pop(name).close()
+        for name in changed:
+            info = sheets[name]
+            base = os.path.join(self.store_dir, info["file"])
+            info["count"] = _write_sheet(iter_cells(self.workbook_path, sheets=[name]), base + ".idx", base + ".jsonl")
+
+        self.manifest = {"mtime": mtime, "shared_strings_crc": shared_strings_crc, "sheets": sheets}
+        self._write_manifest()
+        self.rebuilds += len(changed)
+        return changed
+
+    def _sheet(self, sheet):
+        if self._checked_at is None or self._clock() - self._checked_at >= self.check_interval:
+            self.refresh()
+        sheet_map = self._maps.get(sheet)
+        if sheet_map is None:
+            info = self.manifest["sheets"].get(sheet)
+            if info is None:
+                return None
+            base = os.path.join(self.store_dir, info["file"])
+            sheet_map = self._maps[sheet] = _SheetMap(base + ".idx", base + ".jsonl")
+        return sheet_map
+
+    def get(self, sheet, coordinate):
+        """
+        :return: {"value", "formula", "coordinates"} för cellen, eller None om den är tom.
+        """
+        sheet_map = self._sheet(sheet)
+        if sheet_map is None:
+            return None
+        return sheet_map.lookup(_key(coordinate.replace("$", "").upper()))
+
+    def value(self, sheet, coordinate, default=None):
+        cell = self.get(sheet, coordinate)
+        return default if cell is None else cell["value"]
+
+    def range(self, sheet, cell_range):
+        """
+        Alla icke-tomma celler i ett område, t.ex. store.range('Breakeven Stops', 'C5:D18').
+        :return: Dictionary {koordinat: cell}.
+        """
+        sheet_map = self._sheet(sheet)
+        if sheet_map is None:
+            return {}
+        start, _, end = cell_range.replace("$", "").upper().partition(":")
+        cells = {}
+        for coordinate in expand_range(start, end or start):
+            cell = sheet_map.lookup(_key(coordinate))
+            if cell is not None:
+                cells[coordinate] = cell
+        return cells
+
+    def sheet_names(self):
+        return list(self.manifest["sheets"])
+
+    def close(self):
+        for sheet_map in self._maps.values():
+            sheet_map.close()
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,41 @@
+import argparse
+import importlib
+import sys
+
+# Underkommando -> (modul, beskrivning). Modulen importeras först när kommandot körs,
+# så att t.ex. en planering inte behöver ladda NumPy-tunga verktyg eller grafbibliotek.
+COMMANDS = {
+    "plan": ("main", "Räkna ut stegen, visa break-even-tabellerna och lägg ordrar efter bekräftelse."),
+    "daemon": ("daemon", "Håll terminalen varm och planera och lägg stegar via lokal HTTP."),
+    "mirror": ("mirror", "Lägg samma stege på flera konton samtidigt, en process per terminal."),
+    "backtest": ("backtest", "Backtest av stegen mot historiska ticks."),
+    "optimize": ("optimizer", "Sök parametrar mot historiska ticks."),
+    "bench": ("bench", "Benchmarks mot en fake-terminal."),
+    "excel": ("excel", "Läs värden och formler ur arbetsboken."),
+    "graph": ("zxxxx_excel", "Rita beroendegrafen mellan arbetsbokens formler."),
+}
+
+
+def _run_plan(argv):
+    parser = argparse.ArgumentParser(prog="cli.py plan", description=COMMANDS["plan"][1])
+    parser.add_argument("--symbol", default="EURUSD")
+    args = parser.parse_args(argv)
+    return importlib.import_module("main").main(args.symbol)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help") or argv[0] not in COMMANDS:
+        print("Användning: python cli.py <kommando> [argument]\n")
+        for name, (_, description) in COMMANDS.items():
+            print(f"  {name:<10} {description}")
+        return 0 if argv and argv[0] in ("-h", "--help") else 2
+
+    command, rest = argv[0], argv[1:]
+    if command == "plan":
+        return _run_plan(rest)
+    return importlib.import_module(COMMANDS[command][0]).main(rest)
+
+
+if __name__ == "__main__":
+    sys.exit(main() or 0)
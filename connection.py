@@ -0,0 +1,175 @@
+import importlib
+import threading
+import time
+
+# Funktioner som får anropas utan att terminalen är uppkopplad
+_UNGUARDED = frozenset({"initialize", "shutdown", "last_error", "version"})
+
+
+class MT5Connection:
+    """
+    Håller en MetaTrader 5-session som kopplas upp först när den behövs
+    och sedan återanvänds. En bakgrundstråd kan kontrollera sessionen och
+    koppla upp igen om terminalen har tappats.
+    """
+
+    def __init__(self, path=None, health_interval=5.0, backend_name="MetaTrader5", **initialize_kwargs):
+        """
+        :param path: Sökväg till terminal64.exe, None betyder standardterminalen.
+        :param health_interval: Sekunder mellan hälsokontrollerna i bakgrundstråden.
+        :param backend_name: Modulen som implementerar MetaTrader5-API:t.
+        :param initialize_kwargs: Skickas vidare till mt5.initialize (login, password, server, timeout).
+        """
+        self.path = path
+        self.initialize_kwargs = initialize_kwargs
+        self.health_interval = health_interval
+        self._backend_name = backend_name
+        self._backend = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._health_thread = None
+        self.connected = False
+        self.connect_seconds = None
+        self.reconnects = 0
+
+    @property
+    def backend(self):
+        # MetaTrader5 importeras först här så att ren beräkningskod kan importeras utan terminal
+        if self._backend is None:
+            self._backend = importlib.import_module(self._backend_name)
+        return self._backend
+
+    def use_backend(self, backend):
+        """
+        Byter modulen som implementerar MetaTrader5-API:t, t.ex. mot fake_mt5.FakeTerminal.
+        Sessionen kopplas upp på nytt vid nästa anrop.
+        """
+        with self._lock:
+            if self.connected:
+                self.backend.shutdown()
+            self._backend = backend
+            self.connected = False
+
+    def configure(self, path=None, **initialize_kwargs):
+        """
+        Byter terminal eller inloggningsuppgifter. Gäller från nästa uppkoppling.
+        """
+        with self._lock:
+            self.path = path
+            self.initialize_kwargs = initialize_kwargs
+
+    def connect(self):
+        """
+        Kopplar upp mot terminalen om det inte redan är gjort.
+        :return: True om sessionen är uppkopplad.
+        """
+        with self._lock:
+            if self.connected:
+                return True
+            start = time.perf_counter()
+            args = (self.path,) if self.path else ()
+            if self.backend.initialize(*args, **self.initialize_kwargs):
+                self.connected = True
+                self.connect_seconds = time.perf_counter() - start
+            else:
+                print("MetaTrader 5 initialization failed. Ensure that the terminal is running and properly configured.",
+                      self.backend.last_error())
+            return self.connected
+
+    def ensure(self):
+        return self.connected or self.connect()
+
+    def is_alive(self):
+        return self.connected and self.backend.terminal_info() is not None
+
+    def reconnect(self):
+        with self._lock:
+            self.backend.shutdown()
+            self.connected = False
+            self.reconnects += 1
+            return self.connect()
+
+    def start_health_check(self):
+        """
+        Startar bakgrundstråden som kopplar upp igen om terminalen slutar svara.
+        Anropas efter ensure() i processer som lever länge, shutdown() stoppar den.
+        """
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="mt5-health", daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self):
+        # Även när en tidigare återuppkoppling misslyckats, tills shutdown() anropas
+        while not self._stop.wait(self.health_interval):
+            if not self.is_alive():
+                print("MetaTrader 5 terminal not responding. Reconnecting...")
+                self.reconnect()
+
+    def shutdown(self):
+        self._stop.set()
+        thread = self._health_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._health_thread = None
+        with self._lock:
+            if self.connected:
+                self.backend.shutdown()
+            self.connected = False
+
+
+class Terminal:
+    """
+    Används i stället för MetaTrader5-modulen. Konstanter läses direkt från modulen,
+    och funktionsanrop kopplar upp sessionen först om det behövs.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        value = getattr(self._connection.backend, name)
+        if callable(value) and name not in _UNGUARDED:
+            function = value
+            ensure = self._connection.ensure
+
+            def value(*args, **kwargs):
+                ensure()
+                return function(*args, **kwargs)
+
+            value.__name__ = name
+        # Spara på instansen så att nästa uppslag inte går via __getattr__
+        self.__dict__[name] = value
+        return value
+
+    def reset(self):
+        """
+        Glömmer cachade attribut, t.ex. efter byte av backend.
+        """
+        for name in [name for name in self.__dict__ if not name.startswith("_")]:
+            del self.__dict__[name]
+
+
+# Delad session för hela processen
+connection = MT5Connection()
+mt5 = Terminal(connection)
+
+
+def ensure_connected():
+    """
+    Kopplar upp den delade sessionen om det behövs.
+    :return: True om terminalen är uppkopplad.
+    """
+    return connection.ensure()
+
+
+def use_backend(backend):
+    """
+    Låter alla moduler som använder connection.mt5 prata med en annan backend.
+    :return: Den tidigare backenden, så att den kan återställas.
+    """
+    previous = connection._backend
+    connection.use_backend(backend)
+    mt5.reset()
+    return previous
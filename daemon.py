@@ -0,0 +1,432 @@
+import argparse
+import hmac
+import itertools
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Sekunder som en plan får användas. Spread och pipvärde ändras, så en gammal plan planeras om.
+PLAN_TTL = 300.0
+# Header med nyckeln som serve() skapar vid varje start och request() skickar
+TOKEN_HEADER = "X-Daemon-Token"
+
+
+def plan_summary(ladder_plan):
+    """
+    Det ur main.plan som en klient behöver för att bestämma sig, som JSON-vänliga värden.
+    """
+    def first(key):
+        return ladder_plan[key][0, 0]
+
+    return {
+        "initial_lot_size": float(first("initial_lot_size")),
+        "loss_in_dollars": float(first("loss_in_dollars")),
+        "total_gain": float(first("total_gain")),
+        "total_gain_actual": float(first("total_gain_actual")),
+        "lots": [float(lots) for lots in ladder_plan["break_even"]["lots"][0, 0]],
+        "pip_gains": [float(pips) for pips in first("pip_gains")],
+        "gain_in_dollars": [float(gain) for gain in first("gain_in_dollars")],
+        "margin_of_safety": [
+            {"trade": trade, "stop_type": stop_type, "pips": pips}
+            for trade, stop_type, pips in ladder_plan.get("margin_of_safety") or []
+        ],
+    }
+
+
+class PlanningDaemon:
+    """
+    Långlivad process som håller terminalen uppkopplad och cacharna och tickbuffertarna
+    varma, så att en stege kan planeras och läggas utan att Python och MetaTrader5 startas
+    om. Planen räknas ut i förväg, och vid submit återstår bara att läsa priset, bygga
+    requests, kontrollera dem och skicka. Lagda stegar övervakas i en bakgrundstråd.
+    """
+
+    def __init__(self, journal_file=None, plan_ttl=PLAN_TTL):
+        """
+        :param journal_file: Journal över lagda stegar, standard settings.JOURNAL_FILE.
+        :param plan_ttl: Sekunder som en plan kan skickas efter att den räknats ut.
+        """
+        from supervisor import LadderSupervisor
+
+        if journal_file is None:
+            from settings import JOURNAL_FILE
+            journal_file = JOURNAL_FILE
+        self.journal_file = journal_file
+        self.plan_ttl = plan_ttl
+        self.supervisor = LadderSupervisor()
+        self.journal = None
+        self.plans = {}
+        self.started_at = None
+        self._plan_ids = itertools.count(1)
+        # En submit eller cancel i taget, så att samma plan inte kan skickas två gånger
+        self._lock = threading.Lock()
+
+    def start(self, symbols=()):
+        """
+        Kopplar upp terminalen, återupptar stegarna i journalen och börjar samla ticks.
+        :param symbols: Symboler som värms upp direkt, övriga värms vid första planen.
+        :return: True om daemonen kan ta emot anrop.
+        """
+        import metrics
+        from connection import connection, ensure_connected
+        from journal import Journal, recover
+        from main import watch_symbol
+        from settings import METRICS_TEXTFILE
+
+        if METRICS_TEXTFILE:
+            metrics.enable(METRICS_TEXTFILE)
+        if not ensure_connected():
+            return False
+        # Terminalen ska hållas uppkopplad så länge daemonen lever, även om den tappas
+        connection.start_health_check()
+
+        recovered = recover(self.journal_file, self.supervisor)
+        if recovered is None:
+            return False
+        self.journal = Journal(self.journal_file)
+        for ladder in recovered:
+            ladder.journal = self.journal
+            watch_symbol(ladder.symbol)
+        if recovered:
+            print(f"Återupptar övervakning av {len(recovered)} stegar från journalen.")
+            self.supervisor.start()
+
+        for symbol in symbols:
+            watch_symbol(symbol)
+        self.started_at = time.time()
+        return True
+
+    def plan(self, symbol):
+        """
+        Planerar en stege och sparar planen tills den skickas med submit.
+        :return: Dictionary med 'plan_id', 'symbol' och 'plan', eller 'error'.
+        """
+        from main import plan, watch_symbol
+
+        watch_symbol(symbol)
+        ladder_plan = plan(symbol)
+        if ladder_plan is None:
+            return {"error": f"Failed to plan the ladder for {symbol}."}
+        plan_id = str(next(self._plan_ids))
+        self._discard_expired_plans()
+        self.plans[plan_id] = (symbol, ladder_plan, time.monotonic())
+        return {"plan_id": plan_id, "symbol": symbol, "plan": plan_summary(ladder_plan)}
+
+    def _discard_expired_plans(self):
+        now = time.monotonic()
+        for plan_id, (symbol, ladder_plan, created) in list(self.plans.items()):
+            if now - created > self.plan_ttl:
+                self.plans.pop(plan_id, None)
+
+    def submit(self, plan_id=None, symbol=None):
+        """
+        Lägger en stege utan bekräftelsefråga, anropet är bekräftelsen. Med plan_id skickas en
+        sparad plan, med bara symbol planeras och skickas stegen i samma anrop.
+        :return: Dictionary med 'filled', 'magic', 'retcode', 'price' och latenser i ms, eller 'error'.
+        """
+        from connection import mt5
+        from main import prepare_planned_ladder, submit_planned_ladder
+
+        started = time.perf_counter()
+        with self._lock:
+            if plan_id is not None:
+                entry = self.plans.pop(str(plan_id), None)
+                if entry is None:
+                    return {"error": f"Unknown plan {plan_id}."}
+                symbol, ladder_plan, created = entry
+                if time.monotonic() - created > self.plan_ttl:
+                    return {"error": f"Plan {plan_id} is older than {self.plan_ttl:.0f} s, plan again."}
+            elif symbol is not None:
+                planned = self.plan(symbol)
+                if "error" in planned:
+                    return planned
+                symbol, ladder_plan, created = self.plans.pop(planned["plan_id"])
+            else:
+                return {"error": "Either plan_id or symbol is required."}
+
+            prepared = prepare_planned_ladder(symbol, ladder_plan)
+            if prepared is None:
+                if plan_id is not None:
+                    # Planen finns kvar, t.ex. tills marginalen räcker eller priset rört sig
+                    self.plans[str(plan_id)] = (symbol, ladder_plan, created)
+                return {"error": f"The ladder for {symbol} did not pass the checks before sending."}
+            # Tiden från anropet till första order_send, det som daemonen ska hålla kort
+            until_send = time.perf_counter() - started
+            report = submit_planned_ladder(prepared, self.journal)
+
+        initial = report["initial"]
+        filled = initial is not None and initial.retcode == mt5.TRADE_RETCODE_DONE
+        if filled:
+            self.supervisor.register(prepared["ladder"])
+            self.supervisor.start()
+        latency = report["latency"]
+        return {
+            "filled": filled,
+            "symbol": symbol,
+            "magic": prepared["ladder"].magic,
+            "retcode": None if initial is None else initial.retcode,
+            "price": None if initial is None else initial.price,
+            "stops": [None if result is None else result.retcode for result in report["stops"]],
+            "until_send_ms": until_send * 1000,
+            "initial_ms": latency["initial"] * 1000,
+            "ladder_ms": latency["ladder"] * 1000,
+        }
+
+    def cancel(self, symbol, magic):
+        """
+        Tar bort stegens väntande stop-ordrar. Öppna positioner ligger kvar och övervakas
+        tills de stängs, så att SL fortfarande flyttas till break-even.
+        :return: Dictionary med 'removed' och 'failed' (order-tickets), eller 'error'.
+        """
+        from connection import mt5
+        from order_execution import remove_order
+
+        magic = int(magic)
+        with self._lock:
+            orders = mt5.orders_get(symbol=symbol)
+            if orders is None:
+                return {"error": f"Failed to get orders for {symbol}. {mt5.last_error()}"}
+            tickets = [order.ticket for order in orders if order.magic == magic]
+            if not tickets and (symbol, magic) not in self.supervisor.ladders:
+                return {"error": f"No ladder for {symbol} with magic {magic}."}
+            removed = []
+            failed = []
+            for ticket in tickets:
+                result = remove_order(ticket, symbol)
+                if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+                    removed.append(ticket)
+                else:
+                    failed.append(ticket)
+        ladder = self.supervisor.ladders.get((symbol, magic))
+        if ladder is not None:
+            ladder.order_tickets.difference_update(removed)
+        return {"symbol": symbol, "magic": magic, "removed": removed, "failed": failed}
+
+    def status(self):
+        """
+        :return: Uppkoppling, övervakade stegar, sparade planer och spread per symbol.
+        """
+        import spread_estimator
+        from connection import connection
+        from sl_manager import manager as sl_manager
+
+        ladders = [
+            {
+                "symbol": ladder.symbol,
+                "magic": ladder.magic,
+                "entry_price": ladder.entry_price,
+                "levels": ladder.levels,
+                "positions": len(ladder.position_tickets),
+                "orders": len(ladder.order_tickets),
+                "break_even_active": ladder.break_even_active,
+            }
+            for ladder in list(self.supervisor.ladders.values())
+        ]
+        estimator = spread_estimator.estimator
+        return {
+            "connected": connection.is_alive(),
+            "uptime": None if self.started_at is None else time.time() - self.started_at,
+            "ladders": ladders,
+            "plans": sorted(self.plans),
+            "spread_in_pips": {symbol: estimator.spread_in_pips(symbol) for symbol in list(estimator.buffers)},
+            "sl_manager": sl_manager.stats(),
+        }
+
+    def close(self):
+        """
+        Stoppar insamlingen och kopplar ner. Stegarna tas upp igen ur journalen vid nästa start.
+        """
+        import spread_estimator
+        from connection import connection
+
+        spread_estimator.estimator.stop()
+        if self.journal is not None:
+            self.journal.close()
+        connection.shutdown()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    JSON över HTTP: POST /plan, /submit och /cancel med en JSON-kropp, GET /status.
+    Varje anrop måste ha daemonens nyckel. Anrop från webbläsare (med Origin) och POST
+    utan Content-Type application/json avvisas, så att en webbsida inte kan lägga ordrar.
+    """
+
+    def _refused(self, post):
+        if self.headers.get("Origin") is not None:
+            self._reply(403, {"error": "Requests from browsers are not accepted."})
+            return True
+        token = self.headers.get(TOKEN_HEADER) or ""
+        if not hmac.compare_digest(token.encode(), self.server.token.encode()):
+            self._reply(401, {"error": f"Missing or wrong {TOKEN_HEADER}."})
+            return True
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if post and content_type != "application/json":
+            self._reply(415, {"error": "Content-Type must be application/json."})
+            return True
+        return False
+
+    def do_GET(self):
+        if self._refused(post=False):
+            return
+        if self.path == "/status":
+            self._reply(200, self.server.planning_daemon.status())
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}."})
+
+    def do_POST(self):
+        if self._refused(post=True):
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply(400, {"error": "The body is not valid JSON."})
+            return
+        daemon = self.server.planning_daemon
+        try:
+            if self.path == "/plan" and "symbol" in payload:
+                reply = daemon.plan(payload["symbol"])
+            elif self.path == "/submit":
+                reply = daemon.submit(payload.get("plan_id"), payload.get("symbol"))
+            elif self.path == "/cancel" and "symbol" in payload and "magic" in payload:
+                reply = daemon.cancel(payload["symbol"], payload["magic"])
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path} or missing fields."})
+                return
+        except Exception as e:
+            # Ett fel i ett anrop ska inte stoppa daemonen eller övervakningen
+            print(f"Request to {self.path} failed: {e}")
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(409 if "error" in reply else 200, reply)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def write_token(path):
+    """
+    Skapar en ny nyckel och skriver den till en fil som bara användaren kan läsa.
+    :return: Nyckeln.
+    """
+    token = secrets.token_urlsafe(32)
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w") as file:
+        file.write(token)
+    return token
+
+
+def read_token(path=None):
+    """
+    :return: Nyckeln som den körande daemonen skrev, eller None om filen saknas.
+    """
+    if path is None:
+        from settings import DAEMON_TOKEN_FILE
+        path = DAEMON_TOKEN_FILE
+    try:
+        with open(path, "r") as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def serve(daemon, address=None, token_file=None):
+    """
+    Skapar HTTP-servern för daemonen, anropa serve_forever() på den. En ny nyckel skrivs
+    till token_file vid varje start, och bara den som kan läsa filen kan anropa daemonen.
+    :param address: (host, port), standard settings.DAEMON_ADDRESS. Port 0 väljer en ledig port.
+    :param token_file: Fil för nyckeln, standard settings.DAEMON_TOKEN_FILE.
+    """
+    from settings import DAEMON_ADDRESS, DAEMON_TOKEN_FILE
+    server = ThreadingHTTPServer(tuple(address or DAEMON_ADDRESS), _Handler)
+    server.daemon_threads = True
+    server.planning_daemon = daemon
+    server.token_file = token_file or DAEMON_TOKEN_FILE
+    server.token = write_token(server.token_file)
+    return server
+
+
+def request(path, payload=None, address=None, timeout=60.0, token=None):
+    """
+    Skickar ett anrop till en körande daemon.
+    :param path: '/plan', '/submit', '/cancel' eller '/status'.
+    :param payload: JSON-kroppen, None ger ett GET.
+    :param token: Daemonens nyckel, standard är den i settings.DAEMON_TOKEN_FILE.
+    :return: Svaret som dictionary. Fel från daemonen har nyckeln 'error'.
+    """
+    if address is None:
+        from settings import DAEMON_ADDRESS
+        address = DAEMON_ADDRESS
+    if token is None:
+        token = read_token()
+        if token is None:
+            return {"error": "No daemon token found, is the daemon running?"}
+    host, port = address
+    data = None if payload is None else json.dumps(payload).encode()
+    http_request = urllib.request.Request(f"http://{host}:{port}{path}", data=data,
+                                          headers={"Content-Type": "application/json", TOKEN_HEADER: token})
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b"{}") or {"error": f"HTTP {e.code}"}
+    except urllib.error.URLError as e:
+        return {"error": f"No daemon at {host}:{port}. {e.reason}"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Håll terminalen varm och planera och lägg stegar via lokal HTTP.")
+    parser.add_argument("command", nargs="?", default="serve", choices=["serve", "plan", "submit", "cancel", "status"])
+    parser.add_argument("--symbol", action="append",
+                        help="Symbol att planera eller avbryta. Med serve: värms upp vid start, kan anges flera gånger.")
+    parser.add_argument("--plan-id", help="Plan att skicka med submit.")
+    parser.add_argument("--magic", type=int, help="Stegen som avbryts med cancel.")
+    parser.add_argument("--port", type=int, help="Standard är porten i settings.DAEMON_ADDRESS.")
+    args = parser.parse_args(argv)
+
+    from settings import DAEMON_ADDRESS
+    address = (DAEMON_ADDRESS[0], args.port if args.port is not None else DAEMON_ADDRESS[1])
+    symbol = args.symbol[0] if args.symbol else None
+
+    if args.command != "serve":
+        if args.command == "status":
+            reply = request("/status", address=address)
+        elif args.command == "plan":
+            reply = request("/plan", {"symbol": symbol or "EURUSD"}, address)
+        elif args.command == "submit":
+            reply = request("/submit", {"plan_id": args.plan_id, "symbol": symbol}, address)
+        else:
+            reply = request("/cancel", {"symbol": symbol, "magic": args.magic}, address)
+        print(json.dumps(reply, indent=2))
+        return 1 if "error" in reply else 0
+
+    daemon = PlanningDaemon()
+    if not daemon.start(args.symbol or []):
+        return 1
+    server = serve(daemon, address)
+    print(f"Lyssnar på http://{address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Nyckeln gäller bara den här starten
+        os.remove(server.token_file)
+        daemon.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,41 +1,224 @@
-
-import openpyxl
+import argparse
 import json
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
 
-def excel_to_dictionary_with_formulas(file_path):
-    # Ladda arbetsboken två gånger: en med beräknade värden och en med formler
-    workbook_data_only = openpyxl.load_workbook(file_path, data_only=True)
-    workbook_with_formulas = openpyxl.load_workbook(file_path, data_only=False)
+from formula_engine import split_coordinate
 
-    excel_dict = {}
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Områdena i Breakeven Stops-bladet, samma som i dictionary.py
+NAMED_RANGES = {
+    "Input into the EA settings": "C5:D18",
+    "Trading Plan Overview": "J6:O12",
+    "Margin of Safety": "J15:N20",
+    "Initial Stop": "J23:O25",
+    "Break even stop at 1st top-up": "Q6:V10",
+    "Break even stop at 2nd top-up": "Q12:V17",
+    "Break even stop at 3rd top-up": "Q19:V25",
+}
+
+# Cellreferenser som ska flyttas när en delad formel kopieras, inte funktionsnamn som LOG10(
+_RELATIVE_REF_RE = re.compile(r"(?<![\w.])(\$?)([A-Z]{1,3})(\$?)(\d+)(?![\w(])")
+
+
+def _sheet_paths(archive):
+    """
+    Bladnamn och sökväg till bladets XML i arkivet, i arbetsbokens ordning.
+    """
+    relations = {}
+    for rel in ET.fromstring(archive.read("xl/_rels/workbook.xml.rels")).iter(f"{_PACKAGE_REL_NS}Relationship"):
+        target = rel.get("Target")
+        relations[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    return [(sheet.get("name"), relations[sheet.get(f"{_REL_NS}id")]) for sheet in workbook.iter(f"{_MAIN_NS}sheet")]
+
+
+def _shared_strings(archive):
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as file:
+        for _, element in ET.iterparse(file):
+            if element.tag == f"{_MAIN_NS}si":
+                strings.append("".join(text.text or "" for text in element.iter(f"{_MAIN_NS}t")))
+                element.clear()
+    return strings
+
+
+def _parse_ranges(ranges):
+    """
+    Gör om ['C5:D18', 'Blad!J6:O12'] till {blad eller None: [(min_kol, min_rad, max_kol, max_rad)]}.
+    """
+    bounds = {}
+    for text in ranges:
+        sheet = None
+        if "!" in text:
+            sheet, text = text.rsplit("!", 1)
+            sheet = sheet.strip("'")
+        start, _, end = text.replace("$", "").partition(":")
+        first_column, first_row = split_coordinate(start)
+        last_column, last_row = split_coordinate(end or start)
+        bounds.setdefault(sheet, []).append((min(first_column, last_column), min(first_row, last_row),
+                                             max(first_column, last_column), max(first_row, last_row)))
+    return bounds
+
+
+def _shift_formula(formula, rows, columns):
+    """
+    Flyttar de relativa referenserna i en delad formel, som när Excel kopierar den.
+    """
+    def shift(match):
+        column_absolute, column, row_absolute, row = match.groups()
+        if not column_absolute:
+            number = 0
+            for char in column:
+                number = number * 26 + ord(char) - 64
+            number += columns
+            column = ""
+            while number:
+                number, remainder = divmod(number - 1, 26)
+                column = chr(65 + remainder) + column
+        if not row_absolute:
+            row = str(int(row) + rows)
+        return f"{column_absolute}{column}{row_absolute}{row}"
 
-    for sheet_name in workbook_data_only.sheetnames:
-        sheet_data_only = workbook_data_only[sheet_name]
-        sheet_with_formulas = workbook_with_formulas[sheet_name]
-
-        sheet_data = {}
-        for row in sheet_data_only.iter_rows():
-            for cell in row:
-                if cell.value is not None:  # Endast celler med data eller formler
-                    formula_cell = sheet_with_formulas[cell.coordinate]
-                    sheet_data[cell.coordinate] = {
-                        "value": cell.value,  # Det beräknade värdet
-                        "formula": formula_cell.value if formula_cell.data_type == 'f' else None,  # Formeln om den finns
-                        "coordinates": cell.coordinate
-                    }
-        excel_dict[sheet_name] = sheet_data
+    # Text inom citattecken lämnas orörd
+    parts = re.split(r'("(?:[^"]|"")*")', formula)
+    return "".join(part if part.startswith('"') else _RELATIVE_REF_RE.sub(shift, part) for part in parts)
 
+
+def _cell_value(cell_type, raw, element, shared_strings):
+    if cell_type == "inlineStr":
+        return "".join(text.text or "" for text in element.iter(f"{_MAIN_NS}t"))
+    if raw is None:
+        return None
+    if cell_type == "s":
+        return shared_strings[int(raw)]
+    if cell_type == "b":
+        return raw == "1"
+    if cell_type in ("str", "e"):
+        return raw
+    if raw.lstrip("-").isdigit():
+        return int(raw)
+    return float(raw)
+
+
+def iter_cells(file_path, sheets=None, ranges=None):
+    """
+    Läser arbetsboken i ett svep och ger värde och formel för varje cell direkt ur bladens XML.
+    Arbetsboken laddas aldrig i sin helhet, varje rad släpps när den är läst.
+    :param file_path: Sökväg till .xlsx-filen.
+    :param sheets: Bladnamn att läsa, None betyder alla.
+    :param ranges: Områden som 'C5:D18' eller 'Blad!J6:O12'. Utan bladnamn gäller de alla blad.
+    :return: Generator med dictionaries {"sheet", "coordinates", "value", "formula"}.
+    """
+    bounds = _parse_ranges(ranges) if ranges else None
+    with zipfile.ZipFile(file_path) as archive:
+        shared_strings = _shared_strings(archive)
+        for sheet_name, path in _sheet_paths(archive):
+            if sheets is not None and sheet_name not in sheets:
+                continue
+            sheet_bounds = None
+            if bounds is not None:
+                sheet_bounds = bounds.get(None, []) + bounds.get(sheet_name, [])
+                if not sheet_bounds:
+                    continue
+            yield from _iter_sheet(archive, sheet_name, path, shared_strings, sheet_bounds)
+
+
+def _iter_sheet(archive, sheet_name, path, shared_strings, sheet_bounds):
+    last_row = max(bound[3] for bound in sheet_bounds) if sheet_bounds else None
+    shared_formulas = {}
+    with archive.open(path) as file:
+        for _, element in ET.iterparse(file):
+            if element.tag != f"{_MAIN_NS}row":
+                continue
+            row_number = int(element.get("r"))
+            if last_row is not None and row_number > last_row:
+                break
+            for cell in element.iter(f"{_MAIN_NS}c"):
+                coordinate = cell.get("r")
+                formula_element = cell.find(f"{_MAIN_NS}f")
+                formula = None
+                if formula_element is not None:
+                    formula = formula_element.text
+                    if formula_element.get("t") == "shared":
+                        index = formula_element.get("si")
+                        if formula is not None:
+                            shared_formulas[index] = (formula, split_coordinate(coordinate))
+                        elif index in shared_formulas:
+                            text, (origin_column, origin_row) = shared_formulas[index]
+                            column, row = split_coordinate(coordinate)
+                            formula = _shift_formula(text, row - origin_row, column - origin_column)
+                    if formula is not None:
+                        formula = "=" + formula
+                if sheet_bounds is not None:
+                    column, row = split_coordinate(coordinate)
+                    if not any(bound[0] <= column <= bound[2] and bound[1] <= row <= bound[3]
+                               for bound in sheet_bounds):
+                        continue
+                value_element = cell.find(f"{_MAIN_NS}v")
+                value = _cell_value(cell.get("t"), None if value_element is None else value_element.text,
+                                    cell, shared_strings)
+                if value is None and formula is None:
+                    continue
+                yield {"sheet": sheet_name, "coordinates": coordinate, "value": value, "formula": formula}
+            element.clear()
+
+
+def excel_to_dictionary_with_formulas(file_path, sheets=None, ranges=None):
+    """
+    Samma resultat som tidigare: {blad: {koordinat: {"value", "formula", "coordinates"}}},
+    men byggt från iter_cells i ett svep.
+    """
+    excel_dict = {}
+    for record in iter_cells(file_path, sheets, ranges):
+        excel_dict.setdefault(record["sheet"], {})[record["coordinates"]] = {
+            "value": record["value"],
+            "formula": record["formula"],
+            "coordinates": record["coordinates"],
+        }
     return excel_dict
 
-# Använd funktionen
-file_path = "DA (1).xlsx"
-result = excel_to_dictionary_with_formulas(file_path)
 
-# Skriv ut eller analysera dictionaryn
-import pprint
-pprint.pprint(result)
+def write_json_lines(records, file):
+    """
+    Skriver en kompakt JSON-rad per cell allteftersom de läses.
+    :return: Antal skrivna celler.
+    """
+    count = 0
+    for record in records:
+        file.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False))
+        file.write("\n")
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Läser värden och formler ur en arbetsbok i ett svep.")
+    parser.add_argument("file_path", nargs="?", default="DA (1).xlsx")
+    parser.add_argument("--output", default="excel_data.json")
+    parser.add_argument("--jsonl", action="store_true", help="En cell per rad i stället för en dictionary.")
+    parser.add_argument("--sheet", action="append", dest="sheets", help="Bladnamn, kan anges flera gånger.")
+    parser.add_argument("--range", action="append", dest="ranges",
+                        help="Område som C5:D18 eller namn ur NAMED_RANGES, kan anges flera gånger.")
+    args = parser.parse_args(argv)
+
+    ranges = [NAMED_RANGES.get(text, text) for text in args.ranges] if args.ranges else None
+    with open(args.output, "w", encoding="utf-8") as file:
+        if args.jsonl:
+            count = write_json_lines(iter_cells(args.file_path, args.sheets, ranges), file)
+        else:
+            result = excel_to_dictionary_with_formulas(args.file_path, args.sheets, ranges)
+            json.dump(result, file, separators=(",", ":"), ensure_ascii=False)
+            count = sum(len(cells) for cells in result.values())
+    print(f"{count} cells written to {args.output}")
 
-# Anta att result är den dictionary du genererat
-with open("excel_data.json", "w") as json_file:
-    json.dump(result, json_file, indent=4)
 
+if __name__ == "__main__":
+    main()
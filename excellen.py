@@ -1,10 +1,10 @@
-import json
-# Ladda in JSON-data
-with open("excel_data.json", "r") as f:
-    json_data = json.load(f)
+from cell_store import CellStore
 
-# Nu har vi JSON-data i en Python-dictionary
-#print(json_data)
+# Cellerna läses ur ett indexerat lager som byggs om när arbetsboken ändras,
+# så hela excel_data.json behöver inte läsas in för ett enda värde
+with CellStore("DA (1).xlsx") as store:
+    # Exempel på hur man får tag på värdet i cell D7:
+    print(store.value("Breakeven Stops", "D7"))
 
-# Exempel på hur man får tag på värdet i cell D7:
-print(json_data["Breakeven Stops"]["D7"]["value"])
\ No newline at end of file
+    # Ett helt område, t.ex. inställningarna i C5:D18
+    #print(store.range("Breakeven Stops", "C5:D18"))
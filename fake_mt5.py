@@ -0,0 +1,423 @@
+import time
+from collections import deque, namedtuple
+
+import connection
+import symbol_cache
+
+SymbolInfo = namedtuple("SymbolInfo", [
+    "name", "visible", "select", "digits", "point", "spread", "bid", "ask",
+    "volume_min", "volume_max", "volume_step", "trade_contract_size",
+    "trade_tick_size", "trade_tick_value", "trade_stops_level", "trade_freeze_level",
+    "currency_base", "currency_profit", "currency_margin",
+])
+Tick = namedtuple("Tick", ["time", "bid", "ask", "last", "volume", "time_msc", "flags", "volume_real"])
+TradePosition = namedtuple("TradePosition", [
+    "ticket", "time", "type", "magic", "volume", "price_open", "sl", "tp",
+    "price_current", "profit", "symbol", "comment",
+])
+TradeOrder = namedtuple("TradeOrder", [
+    "ticket", "time_setup", "type", "magic", "volume_current", "price_open", "sl", "tp",
+    "price_current", "symbol", "comment",
+])
+TradeDeal = namedtuple("TradeDeal", [
+    "ticket", "order", "position_id", "time", "type", "entry", "magic", "volume",
+    "price", "profit", "symbol", "comment",
+])
+OrderSendResult = namedtuple("OrderSendResult", [
+    "retcode", "deal", "order", "volume", "price", "bid", "ask", "comment", "request",
+])
+AccountInfo = namedtuple("AccountInfo", [
+    "login", "currency", "leverage", "balance", "equity", "margin", "margin_free",
+])
+TerminalInfo = namedtuple("TerminalInfo", ["connected", "trade_allowed", "name"])
+
+# Funktioner som motsvarar anrop till terminalen och som kan fördröjas med latency
+TERMINAL_CALLS = (
+    "initialize", "shutdown", "last_error", "version", "terminal_info", "account_info",
+    "symbol_select", "symbols_get", "symbol_info", "symbol_info_tick", "copy_ticks_from", "order_calc_margin",
+    "positions_get", "orders_get", "history_deals_get", "order_send",
+)
+
+
+class FakeTerminal:
+    """
+    Lokal ersättare för MetaTrader5-modulen, för backtest och benchmarks.
+    Stop-ordrar, SL och TP utförs när priset passerar dem i push_tick.
+    Installeras med install() så att all kod som använder connection.mt5 går hit.
+    """
+
+    # Samma värden som i MetaTrader5-modulen
+    TRADE_ACTION_DEAL = 1
+    TRADE_ACTION_PENDING = 5
+    TRADE_ACTION_SLTP = 6
+    TRADE_ACTION_MODIFY = 7
+    TRADE_ACTION_REMOVE = 8
+    ORDER_TYPE_BUY = 0
+    ORDER_TYPE_SELL = 1
+    ORDER_TYPE_BUY_LIMIT = 2
+    ORDER_TYPE_SELL_LIMIT = 3
+    ORDER_TYPE_BUY_STOP = 4
+    ORDER_TYPE_SELL_STOP = 5
+    POSITION_TYPE_BUY = 0
+    POSITION_TYPE_SELL = 1
+    DEAL_ENTRY_IN = 0
+    DEAL_ENTRY_OUT = 1
+    ORDER_FILLING_FOK = 0
+    ORDER_FILLING_IOC = 1
+    ORDER_FILLING_RETURN = 2
+    ORDER_TIME_GTC = 0
+    COPY_TICKS_ALL = -1
+    COPY_TICKS_INFO = 1
+    COPY_TICKS_TRADE = 2
+    TRADE_RETCODE_PLACED = 10008
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_INVALID = 10013
+    TRADE_RETCODE_INVALID_VOLUME = 10014
+    TRADE_RETCODE_INVALID_PRICE = 10015
+    TRADE_RETCODE_INVALID_STOPS = 10016
+    TRADE_RETCODE_NO_MONEY = 10019
+    TRADE_RETCODE_INVALID_ORDER = 10035
+
+    def __init__(self, balance=10000.0, currency="USD", leverage=100, latency=None, tick_history=10000):
+        """
+        :param balance: Kontots saldo.
+        :param currency: Kontovaluta.
+        :param leverage: Hävstång för marginalberäkningen.
+        :param latency: Fördröjning i sekunder per anrop till terminalen, antingen ett tal
+                        för alla anrop eller en dictionary per funktionsnamn.
+        :param tick_history: Antal ticks per symbol som sparas för copy_ticks_from.
+        """
+        self.tick_history = tick_history
+        self.balance = balance
+        self.currency = currency
+        self.leverage = leverage
+        self.initialized = False
+        self.symbols = {}
+        self.positions = {}
+        self.orders = {}
+        self.deals = []
+        self._next_ticket = 1
+        self._last_error = (1, "Success")
+        if latency:
+            self.set_latency(latency)
+
+    def set_latency(self, latency):
+        """
+        Fördröjer anropen i TERMINAL_CALLS för att efterlikna IPC mot en riktig terminal.
+        """
+        for name in TERMINAL_CALLS:
+            delay = latency.get(name, 0.0) if isinstance(latency, dict) else latency
+            method = getattr(type(self), name).__get__(self)
+            if delay:
+                setattr(self, name, _delayed(method, delay))
+            else:
+                self.__dict__.pop(name, None)
+
+    # --- Sessionen ---
+
+    def initialize(self, *args, **kwargs):
+        self.initialized = True
+        return True
+
+    def shutdown(self):
+        self.initialized = False
+
+    def last_error(self):
+        return self._last_error
+
+    def version(self):
+        return 500, 0, "fake"
+
+    def terminal_info(self):
+        if not self.initialized:
+            return None
+        return TerminalInfo(True, True, "FakeTerminal")
+
+    def account_info(self):
+        margin = sum(self._margin(pos["symbol"], pos["volume"], pos["price_open"]) for pos in self.positions.values())
+        equity = self.balance + sum(self._profit(pos) for pos in self.positions.values())
+        return AccountInfo(1, self.currency, self.leverage, self.balance, equity, margin, equity - margin)
+
+    # --- Symboler och priser ---
+
+    def add_symbol(self, name, digits=5, contract_size=100000, tick_value=1.0, volume_min=0.01,
+                   volume_max=100.0, volume_step=0.01, stops_level=0, freeze_level=0,
+                   currency_base=None, currency_profit=None, bid=0.0, ask=0.0):
+        """
+        Lägger till en symbol. Valutorna gissas från namnet om de inte anges.
+        """
+        self.symbols[name] = {
+            "name": name, "digits": digits, "point": 10 ** -digits,
+            "volume_min": volume_min, "volume_max": volume_max, "volume_step": volume_step,
+            "trade_contract_size": contract_size, "trade_tick_size": 10 ** -digits,
+            "trade_tick_value": tick_value, "trade_stops_level": stops_level,
+            "trade_freeze_level": freeze_level,
+            "currency_base": currency_base or name[:3], "currency_profit": currency_profit or name[3:6],
+            "bid": bid, "ask": ask, "time": 0, "visible": True,
+            "ticks": deque(maxlen=self.tick_history),
+        }
+
+    def symbol_select(self, symbol, enable=True):
+        if symbol not in self.symbols:
+            self._last_error = (-1, f"Unknown symbol {symbol}")
+            return False
+        self.symbols[symbol]["visible"] = enable
+        return True
+
+    def symbols_get(self, group=None):
+        return tuple(self.symbol_info(name) for name in self.symbols)
+
+    def symbol_info(self, symbol):
+        spec = self.symbols.get(symbol)
+        if spec is None:
+            return None
+        spread = round((spec["ask"] - spec["bid"]) / spec["point"])
+        return SymbolInfo(
+            spec["name"], spec["visible"], spec["visible"], spec["digits"], spec["point"], spread,
+            spec["bid"], spec["ask"], spec["volume_min"], spec["volume_max"], spec["volume_step"],
+            spec["trade_contract_size"], spec["trade_tick_size"], spec["trade_tick_value"],
+            spec["trade_stops_level"], spec["trade_freeze_level"],
+            spec["currency_base"], spec["currency_profit"], spec["currency_base"],
+        )
+
+    def symbol_info_tick(self, symbol):
+        spec = self.symbols.get(symbol)
+        if spec is None:
+            return None
+        return Tick(int(spec["time"]), spec["bid"], spec["ask"], 0.0, 0, int(spec["time"] * 1000), 6, 0.0)
+
+    def copy_ticks_from(self, symbol, date_from, count, flags):
+        """
+        Ticks från date_from och framåt ur historiken som push_tick sparat, som en
+        strukturerad NumPy-array med samma fält som MetaTrader5-modulen returnerar.
+        """
+        import numpy as np
+
+        spec = self.symbols.get(symbol)
+        if spec is None:
+            self._last_error = (-1, f"Unknown symbol {symbol}")
+            return None
+        start = date_from.timestamp() if hasattr(date_from, "timestamp") else float(date_from)
+        ticks = [tick for tick in spec["ticks"] if tick[0] >= start][:count]
+        array = np.zeros(len(ticks), dtype=[
+            ("time", "<i8"), ("bid", "<f8"), ("ask", "<f8"), ("last", "<f8"), ("volume", "<u8"),
+            ("time_msc", "<i8"), ("flags", "<u4"), ("volume_real", "<f8"),
+        ])
+        if ticks:
+            times, bids, asks = zip(*ticks)
+            array["time"] = np.asarray(times, dtype=float).astype("<i8")
+            array["time_msc"] = (np.asarray(times, dtype=float) * 1000).astype("<i8")
+            array["bid"] = bids
+            array["ask"] = asks
+            array["flags"] = 6
+        return array
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        if symbol not in self.symbols:
+            return None
+        return self._margin(symbol, volume, price)
+
+    def push_tick(self, symbol, time_value, bid, ask):
+        """
+        Sätter nytt pris för en symbol och utför de stop-ordrar, SL och TP som passerats.
+        """
+        spec = self.symbols[symbol]
+        spec["time"], spec["bid"], spec["ask"] = time_value, bid, ask
+        spec["ticks"].append((time_value, bid, ask))
+
+        for ticket, order in list(self.orders.items()):
+            if order["symbol"] != symbol:
+                continue
+            if order["type"] == self.ORDER_TYPE_BUY_STOP and ask >= order["price_open"]:
+                del self.orders[ticket]
+                self._open_position(symbol, self.POSITION_TYPE_BUY, order["volume"], ask,
+                                    order["sl"], order["tp"], order["magic"], order["comment"], ticket)
+            elif order["type"] == self.ORDER_TYPE_SELL_STOP and bid <= order["price_open"]:
+                del self.orders[ticket]
+                self._open_position(symbol, self.POSITION_TYPE_SELL, order["volume"], bid,
+                                    order["sl"], order["tp"], order["magic"], order["comment"], ticket)
+
+        for ticket, pos in list(self.positions.items()):
+            if pos["symbol"] != symbol:
+                continue
+            if pos["type"] == self.POSITION_TYPE_BUY:
+                hit = (pos["sl"] and bid <= pos["sl"]) or (pos["tp"] and bid >= pos["tp"])
+            else:
+                hit = (pos["sl"] and ask >= pos["sl"]) or (pos["tp"] and ask <= pos["tp"])
+            if hit:
+                self._close_position(ticket)
+
+    # --- Positioner och ordrar ---
+
+    def positions_get(self, symbol=None, ticket=None, group=None):
+        return tuple(
+            self._position_tuple(pos) for pos in self.positions.values()
+            if (symbol is None or pos["symbol"] == symbol) and (ticket is None or pos["ticket"] == ticket)
+        )
+
+    def orders_get(self, symbol=None, ticket=None, group=None):
+        return tuple(
+            TradeOrder(order["ticket"], order["time"], order["type"], order["magic"], order["volume"],
+                       order["price_open"], order["sl"], order["tp"],
+                       self._current_price(order["symbol"], order["type"] % 2 == 0), order["symbol"], order["comment"])
+            for order in self.orders.values()
+            if (symbol is None or order["symbol"] == symbol) and (ticket is None or order["ticket"] == ticket)
+        )
+
+    def history_deals_get(self, *args, **kwargs):
+        return tuple(self.deals)
+
+    def order_send(self, request):
+        action = request.get("action")
+        symbol = request.get("symbol")
+        spec = self.symbols.get(symbol)
+        if spec is None:
+            return self._result(self.TRADE_RETCODE_INVALID, request, comment="Unknown symbol")
+
+        if action == self.TRADE_ACTION_SLTP:
+            pos = self.positions.get(request.get("position"))
+            if pos is None:
+                return self._result(self.TRADE_RETCODE_INVALID, request, comment="Position not found")
+            sl = request.get("sl") or 0.0
+            tp = pos["tp"] if request.get("tp") is None else request["tp"]
+            if not self._stops_valid(spec, pos["type"] % 2 == 0, spec["bid"] if pos["type"] == 0 else spec["ask"], sl, tp):
+                return self._result(self.TRADE_RETCODE_INVALID_STOPS, request)
+            pos["sl"], pos["tp"] = sl, tp
+            return self._result(self.TRADE_RETCODE_DONE, request)
+
+        if action == self.TRADE_ACTION_REMOVE:
+            if self.orders.pop(request.get("order"), None) is None:
+                return self._result(self.TRADE_RETCODE_INVALID_ORDER, request)
+            return self._result(self.TRADE_RETCODE_DONE, request, order=request.get("order"))
+
+        volume = request.get("volume", 0)
+        if not self._volume_valid(spec, volume):
+            return self._result(self.TRADE_RETCODE_INVALID_VOLUME, request)
+        order_type = request.get("type")
+        is_buy = order_type % 2 == 0
+        sl = request.get("sl") or 0.0
+        tp = request.get("tp") or 0.0
+
+        if action == self.TRADE_ACTION_DEAL:
+            price = spec["ask"] if is_buy else spec["bid"]
+            if not self._stops_valid(spec, is_buy, spec["bid"] if is_buy else spec["ask"], sl, tp):
+                return self._result(self.TRADE_RETCODE_INVALID_STOPS, request)
+            if self._margin(symbol, volume, price) > self.account_info().margin_free:
+                return self._result(self.TRADE_RETCODE_NO_MONEY, request)
+            ticket = self._open_position(symbol, order_type, volume, price, sl, tp,
+                                         request.get("magic", 0), request.get("comment", ""))
+            return self._result(self.TRADE_RETCODE_DONE, request, deal=ticket, order=ticket, volume=volume, price=price)
+
+        if action == self.TRADE_ACTION_PENDING:
+            price = request.get("price") or 0.0
+            distance = spec["trade_stops_level"] * spec["point"]
+            if order_type == self.ORDER_TYPE_BUY_STOP and price <= spec["ask"] + distance:
+                return self._result(self.TRADE_RETCODE_INVALID_PRICE, request)
+            if order_type == self.ORDER_TYPE_SELL_STOP and price >= spec["bid"] - distance:
+                return self._result(self.TRADE_RETCODE_INVALID_PRICE, request)
+            ticket = self._new_ticket()
+            self.orders[ticket] = {
+                "ticket": ticket, "time": spec["time"], "type": order_type, "magic": request.get("magic", 0),
+                "volume": volume, "price_open": price, "sl": sl, "tp": tp, "symbol": symbol,
+                "comment": request.get("comment", ""),
+            }
+            return self._result(self.TRADE_RETCODE_PLACED, request, order=ticket, volume=volume, price=price)
+
+        return self._result(self.TRADE_RETCODE_INVALID, request, comment="Unsupported action")
+
+    # --- Internt ---
+
+    def _new_ticket(self):
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        return ticket
+
+    def _current_price(self, symbol, is_buy):
+        spec = self.symbols[symbol]
+        return spec["ask"] if is_buy else spec["bid"]
+
+    def _margin(self, symbol, volume, price):
+        return volume * self.symbols[symbol]["trade_contract_size"] * price / self.leverage
+
+    def _profit(self, pos):
+        spec = self.symbols[pos["symbol"]]
+        if pos["type"] == self.POSITION_TYPE_BUY:
+            move = spec["bid"] - pos["price_open"]
+        else:
+            move = pos["price_open"] - spec["ask"]
+        return move / spec["trade_tick_size"] * spec["trade_tick_value"] * pos["volume"]
+
+    def _position_tuple(self, pos):
+        price_current = self._current_price(pos["symbol"], pos["type"] != self.POSITION_TYPE_BUY)
+        return TradePosition(pos["ticket"], pos["time"], pos["type"], pos["magic"], pos["volume"],
+                             pos["price_open"], pos["sl"], pos["tp"], price_current, self._profit(pos),
+                             pos["symbol"], pos["comment"])
+
+    def _volume_valid(self, spec, volume):
+        if volume < spec["volume_min"] - 1e-9 or volume > spec["volume_max"] + 1e-9:
+            return False
+        steps = volume / spec["volume_step"]
+        return abs(steps - round(steps)) < 1e-6
+
+    def _stops_valid(self, spec, is_buy, price, sl, tp):
+        distance = spec["trade_stops_level"] * spec["point"]
+        if is_buy:
+            return (not sl or sl <= price - distance) and (not tp or tp >= price + distance)
+        return (not sl or sl >= price + distance) and (not tp or tp <= price - distance)
+
+    def _open_position(self, symbol, position_type, volume, price, sl, tp, magic, comment, order=None):
+        ticket = self._new_ticket()
+        spec = self.symbols[symbol]
+        self.positions[ticket] = {
+            "ticket": ticket, "time": spec["time"], "type": position_type % 2, "magic": magic,
+            "volume": volume, "price_open": price, "sl": sl, "tp": tp, "symbol": symbol, "comment": comment,
+        }
+        self.deals.append(TradeDeal(self._new_ticket(), order or ticket, ticket, spec["time"], position_type % 2,
+                                    self.DEAL_ENTRY_IN, magic, volume, price, 0.0, symbol, comment))
+        return ticket
+
+    def _close_position(self, ticket):
+        pos = self.positions.pop(ticket)
+        spec = self.symbols[pos["symbol"]]
+        profit = self._profit(pos)
+        self.balance += profit
+        price = spec["bid"] if pos["type"] == self.POSITION_TYPE_BUY else spec["ask"]
+        self.deals.append(TradeDeal(self._new_ticket(), ticket, ticket, spec["time"], 1 - pos["type"],
+                                    self.DEAL_ENTRY_OUT, pos["magic"], pos["volume"], price, profit,
+                                    pos["symbol"], pos["comment"]))
+        return profit
+
+    def _result(self, retcode, request, deal=0, order=0, volume=0.0, price=0.0, comment=""):
+        spec = self.symbols.get(request.get("symbol"), {})
+        if retcode not in (self.TRADE_RETCODE_DONE, self.TRADE_RETCODE_PLACED):
+            self._last_error = (retcode, comment or "Request rejected")
+        return OrderSendResult(retcode, deal, order, volume, price, spec.get("bid", 0.0), spec.get("ask", 0.0),
+                               comment, request)
+
+
+def _delayed(method, delay):
+    def call(*args, **kwargs):
+        # time.sleep släpper GIL, precis som ett riktigt IPC-anrop
+        time.sleep(delay)
+        return method(*args, **kwargs)
+
+    call.__name__ = method.__name__
+    return call
+
+
+def install(terminal):
+    """
+    Kopplar in en FakeTerminal bakom connection.mt5 och tömmer symbolcachen.
+    :return: Den tidigare backenden, som kan återställas med restore().
+    """
+    previous = connection.use_backend(terminal)
+    symbol_cache.invalidate()
+    return previous
+
+
+def restore(previous):
+    """
+    Återställer backenden som var installerad före install().
+    """
+    connection.use_backend(previous)
+    symbol_cache.invalidate()
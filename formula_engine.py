@@ -0,0 +1,596 @@
+import functools
+import math
+import re
+
+
+class ExcelError:
+    """
+    Ett Excel-felvärde (#DIV/0!, #VALUE! osv.) som sprids genom beräkningen.
+    """
+
+    def __init__(self, code):
+        self.code = code
+
+    def __eq__(self, other):
+        return isinstance(other, ExcelError) and other.code == self.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __repr__(self):
+        return self.code
+
+
+DIV0 = ExcelError("#DIV/0!")
+VALUE = ExcelError("#VALUE!")
+NAME = ExcelError("#NAME?")
+NA = ExcelError("#N/A")
+NUM = ExcelError("#NUM!")
+
+_CELL_RE = re.compile(r"\$?([A-Z]{1,3})\$?(\d+)")
+
+# Vanliga tokens, engelska formler med ',' som argumentavskiljare och '.' som decimaltecken
+_TOKEN_PATTERN = r"""
+    (?P<ws>\s+)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<func>[A-Za-zÅÄÖåäö_][\w.ÅÄÖåäö]*(?=\s*\())
+  | (?P<ref>(?:(?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)!)?\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?)
+  | (?P<number>\d+(?:%(DECIMAL)s\d+)?(?:[eE][+-]?\d+)?|%(DECIMAL)s\d+)
+  | (?P<bool>\b(?:TRUE|FALSE|SANT|FALSKT)\b)
+  | (?P<squote>'(?:[^']|'')*')
+  | (?P<op><>|<=|>=|[-+*/^&=<>%%(),;])
+"""
+_TOKEN_RE = re.compile(_TOKEN_PATTERN % {"DECIMAL": r"\."}, re.X)
+# Svenska formler (OM, ';' som avskiljare) har decimalkomma
+_TOKEN_RE_DECIMAL_COMMA = re.compile(_TOKEN_PATTERN % {"DECIMAL": r"[.,]"}, re.X)
+
+# Svenska funktionsnamn som de skrivs i arbetsboken
+_FUNCTION_ALIASES = {
+    "OM": "IF", "OMFEL": "IFERROR", "AVRUNDA": "ROUND", "AVRUNDA.UPPÅT": "ROUNDUP",
+    "AVRUNDA.NEDÅT": "ROUNDDOWN", "SUMMA": "SUM", "MEDEL": "AVERAGE", "OCH": "AND",
+    "ELLER": "OR", "ICKE": "NOT", "ABS": "ABS", "MIN": "MIN", "MAX": "MAX",
+}
+
+# Bindningsstyrka för binära operatorer, som i Excel
+_BINARY_PRECEDENCE = {
+    "=": 1, "<>": 1, "<": 1, ">": 1, "<=": 1, ">=": 1,
+    "&": 2,
+    "+": 3, "-": 3,
+    "*": 4, "/": 4,
+    "^": 5,
+}
+_UNARY_PRECEDENCE = 6
+
+
+def split_coordinate(coordinate):
+    """
+    Delar upp 'AB12' i kolumnnummer (1-baserat) och radnummer.
+    """
+    match = _CELL_RE.fullmatch(coordinate.upper())
+    if match is None:
+        raise ValueError(f"Invalid cell coordinate: {coordinate}")
+    column = 0
+    for char in match.group(1):
+        column = column * 26 + ord(char) - 64
+    return column, int(match.group(2))
+
+
+def column_letter(column):
+    letters = ""
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def expand_range(start, end):
+    """
+    Alla koordinater i ett område, radvis, t.ex. expand_range('V14', 'V16').
+    """
+    first_column, first_row = split_coordinate(start)
+    last_column, last_row = split_coordinate(end)
+    return [
+        f"{column_letter(column)}{row}"
+        for row in range(min(first_row, last_row), max(first_row, last_row) + 1)
+        for column in range(min(first_column, last_column), max(first_column, last_column) + 1)
+    ]
+
+
+# --- Tokenizer och parser ---
+
+def tokenize(formula):
+    """
+    Delar upp en formel i tokens (typ, text). Ledande '=' ignoreras.
+    """
+    text = formula[1:] if formula.startswith("=") else formula
+    token_re = _TOKEN_RE_DECIMAL_COMMA if ";" in re.sub(r'"(?:[^"]|"")*"', "", text) else _TOKEN_RE
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = token_re.match(text, position)
+        if match is None:
+            raise SyntaxError(f"Unexpected character {text[position]!r} in formula {formula!r}")
+        kind = match.lastgroup
+        if kind != "ws":
+            tokens.append((kind, match.group()))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Pratt-parser som bygger ett syntaxträd av tupler.
+    """
+
+    def __init__(self, tokens, sheet):
+        self.tokens = tokens
+        self.position = 0
+        self.sheet = sheet
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, text):
+        kind, value = self.take()
+        if value != text:
+            raise SyntaxError(f"Expected {text!r}, got {value!r}")
+
+    def parse(self):
+        if not self.tokens:
+            return ("blank",)
+        node = self.expression(0)
+        if self.position != len(self.tokens):
+            raise SyntaxError(f"Unexpected token {self.peek()[1]!r}")
+        return node
+
+    def expression(self, min_precedence):
+        node = self.prefix()
+        while True:
+            kind, value = self.peek()
+            if kind != "op":
+                break
+            if value == "%":
+                self.take()
+                node = ("percent", node)
+                continue
+            precedence = _BINARY_PRECEDENCE.get(value)
+            if precedence is None or precedence <= min_precedence:
+                break
+            self.take()
+            node = ("binary", value, node, self.expression(precedence))
+        return node
+
+    def prefix(self):
+        kind, value = self.take()
+        if kind == "number":
+            return ("number", float(value.replace(",", ".")))
+        if kind == "string":
+            return ("string", value[1:-1].replace('""', '"'))
+        if kind == "squote":
+            # 'N/A' förekommer i avskrivna formler och tolkas som text
+            return ("string", value[1:-1].replace("''", "'"))
+        if kind == "bool":
+            return ("bool", value in ("TRUE", "SANT"))
+        if kind == "ref":
+            return self.reference(value)
+        if kind == "func":
+            return self.call(value)
+        if kind == "op" and value in ("+", "-"):
+            operand = self.expression(_UNARY_PRECEDENCE)
+            return operand if value == "+" else ("negate", operand)
+        if kind == "op" and value == "(":
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        raise SyntaxError(f"Unexpected token {value!r}")
+
+    def reference(self, text):
+        sheet = self.sheet
+        if "!" in text:
+            sheet, text = text.rsplit("!", 1)
+            if sheet.startswith("'"):
+                sheet = sheet[1:-1].replace("''", "'")
+        text = text.replace("$", "").upper()
+        if ":" in text:
+            start, end = text.split(":")
+            return ("range", sheet, start, end)
+        return ("ref", sheet, text)
+
+    def call(self, name):
+        name = name.upper()
+        name = _FUNCTION_ALIASES.get(name, name)
+        self.expect("(")
+        args = []
+        if self.peek()[1] == ")":
+            self.take()
+            return ("call", name, args)
+        while True:
+            if self.peek()[1] in (",", ";", ")"):
+                args.append(("blank",))
+            else:
+                args.append(self.expression(0))
+            kind, value = self.take()
+            if value == ")":
+                return ("call", name, args)
+            if value not in (",", ";"):
+                raise SyntaxError(f"Expected ',' or ')' in {name}, got {value!r}")
+
+
+def parse(formula, sheet=None):
+    """
+    Tolkar en formel till ett syntaxträd.
+    :param formula: Formeltext, t.ex. '=ROUNDUP(+K9*D9;0)'.
+    :param sheet: Bladet som referenser utan bladnamn hör till.
+    """
+    return _Parser(tokenize(formula), sheet).parse()
+
+
+def references(node):
+    """
+    Alla (blad, koordinat) som ett syntaxträd läser, med områden utvecklade.
+    """
+    kind = node[0]
+    if kind == "ref":
+        return {(node[1], node[2])}
+    if kind == "range":
+        return {(node[1], coordinate) for coordinate in expand_range(node[2], node[3])}
+    found = set()
+    for child in node[1:]:
+        if isinstance(child, tuple):
+            found |= references(child)
+        elif isinstance(child, list):
+            for item in child:
+                found |= references(item)
+    return found
+
+
+# --- Excel-semantik för skalära värden ---
+
+def _significant(x):
+    # Excel räknar med 15 signifikanta siffror, så 0.35*100 blir 35 och inte 35.00000000000001
+    return float(f"{x:.15g}")
+
+
+def _number(value):
+    if isinstance(value, ExcelError):
+        return value
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace(",", "."))
+    except ValueError:
+        return VALUE
+
+
+def _truth(value):
+    value = _number(value)
+    if isinstance(value, ExcelError):
+        return value
+    return value != 0
+
+
+def _arithmetic(op, a, b):
+    a, b = _number(a), _number(b)
+    if isinstance(a, ExcelError):
+        return a
+    if isinstance(b, ExcelError):
+        return b
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+    if op == "/":
+        return DIV0 if b == 0 else a / b
+    try:
+        return a ** b
+    except (OverflowError, ZeroDivisionError):
+        return NUM
+
+
+def _compare_key(value, other):
+    # Tom cell jämförs som 0, "" eller FALSE beroende på det andra värdet
+    if value is None:
+        value = "" if isinstance(other, str) else False if isinstance(other, bool) else 0
+    if isinstance(value, bool):
+        return 2, value
+    if isinstance(value, str):
+        return 1, value.lower()
+    return 0, value
+
+
+def _compare(op, a, b):
+    if isinstance(a, ExcelError):
+        return a
+    if isinstance(b, ExcelError):
+        return b
+    a_key, b_key = _compare_key(a, b), _compare_key(b, a)
+    if op == "=":
+        return a_key == b_key
+    if op == "<>":
+        return a_key != b_key
+    if op == "<":
+        return a_key < b_key
+    if op == ">":
+        return a_key > b_key
+    if op == "<=":
+        return a_key <= b_key
+    return a_key >= b_key
+
+
+def _round_half_away(x, digits):
+    factor = 10.0 ** digits
+    return math.copysign(math.floor(_significant(abs(x) * factor) + 0.5) / factor, x)
+
+
+def _round_up(x, digits):
+    factor = 10.0 ** digits
+    return math.copysign(math.ceil(_significant(abs(x) * factor)) / factor, x)
+
+
+def _round_down(x, digits):
+    factor = 10.0 ** digits
+    return math.copysign(math.floor(_significant(abs(x) * factor)) / factor, x)
+
+
+def _rounding(function):
+    def call(x, digits=0.0):
+        x, digits = _number(x), _number(digits)
+        if isinstance(x, ExcelError):
+            return x
+        if isinstance(digits, ExcelError):
+            return digits
+        return function(x, int(digits))
+    return call
+
+
+def _numbers(args):
+    """
+    Talen i argumenten. I områden hoppas text och tomma celler över, som i Excel.
+    """
+    values = []
+    for arg in args:
+        if isinstance(arg, list):
+            for value in arg:
+                if isinstance(value, ExcelError):
+                    return value
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.append(value)
+        else:
+            value = _number(arg)
+            if isinstance(value, ExcelError):
+                return value
+            values.append(value)
+    return values
+
+
+def _aggregate(function, empty=0.0):
+    def call(*args):
+        values = _numbers(args)
+        if isinstance(values, ExcelError):
+            return values
+        return function(values) if values else empty
+    return call
+
+
+def _logical(function):
+    def call(*args):
+        values = []
+        for arg in args:
+            for value in (arg if isinstance(arg, list) else [arg]):
+                truth = _truth(value)
+                if isinstance(truth, ExcelError):
+                    return truth
+                values.append(truth)
+        return function(values)
+    return call
+
+
+def _not(value):
+    truth = _truth(value)
+    return truth if isinstance(truth, ExcelError) else not truth
+
+
+# Funktioner som får sina argument beräknade i förväg
+FUNCTIONS = {
+    "ROUND": _rounding(_round_half_away),
+    "ROUNDUP": _rounding(_round_up),
+    "ROUNDDOWN": _rounding(_round_down),
+    "SUM": _aggregate(math.fsum),
+    "MIN": _aggregate(min),
+    "MAX": _aggregate(max),
+    "AVERAGE": _aggregate(lambda values: math.fsum(values) / len(values), empty=DIV0),
+    "ABS": lambda x: x if isinstance(_number(x), ExcelError) else abs(_number(x)),
+    "AND": _logical(all),
+    "OR": _logical(any),
+    "NOT": _not,
+}
+
+
+# --- Kompilering till closures ---
+
+def _compile(node):
+    kind = node[0]
+    if kind == "number" or kind == "string" or kind == "bool":
+        value = node[1]
+        return lambda env: value
+    if kind == "blank":
+        return lambda env: None
+    if kind == "ref":
+        key = (node[1], node[2])
+        return lambda env: env.get(key)
+    if kind == "range":
+        keys = [(node[1], coordinate) for coordinate in expand_range(node[2], node[3])]
+        return lambda env: [env.get(key) for key in keys]
+    if kind == "negate":
+        operand = _compile(node[1])
+        return lambda env: _arithmetic("-", 0.0, operand(env))
+    if kind == "percent":
+        operand = _compile(node[1])
+        return lambda env: _arithmetic("/", operand(env), 100.0)
+    if kind == "binary":
+        op, left, right = node[1], _compile(node[2]), _compile(node[3])
+        if op in ("+", "-", "*", "/", "^"):
+            return lambda env: _arithmetic(op, left(env), right(env))
+        if op == "&":
+            return lambda env: _concat(left(env), right(env))
+        return lambda env: _compare(op, left(env), right(env))
+    if kind == "call":
+        return _compile_call(node[1], [_compile(arg) for arg in node[2]])
+    raise ValueError(f"Unknown node {kind}")
+
+
+def _concat(a, b):
+    if isinstance(a, ExcelError):
+        return a
+    if isinstance(b, ExcelError):
+        return b
+    return _text(a) + _text(b)
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _compile_call(name, args):
+    # IF och IFERROR beräknar bara den gren som används
+    if name == "IF":
+        condition = args[0]
+        if_true = args[1] if len(args) > 1 else (lambda env: True)
+        if_false = args[2] if len(args) > 2 else (lambda env: False)
+
+        def call_if(env):
+            truth = _truth(condition(env))
+            if isinstance(truth, ExcelError):
+                return truth
+            return if_true(env) if truth else if_false(env)
+        return call_if
+    if name == "IFERROR":
+        value, fallback = args
+
+        def call_iferror(env):
+            result = value(env)
+            return fallback(env) if isinstance(result, ExcelError) else result
+        return call_iferror
+    function = FUNCTIONS.get(name)
+    if function is None:
+        return lambda env: NAME
+    return lambda env: function(*[arg(env) for arg in args])
+
+
+class Formula:
+    """
+    En kompilerad formel med sina beroenden.
+    """
+
+    def __init__(self, text, sheet=None):
+        self.text = text
+        self.sheet = sheet
+        self.tree = parse(text, sheet)
+        self.references = references(self.tree)
+        self.evaluate = _compile(self.tree)
+
+    def __repr__(self):
+        return f"Formula({self.text!r})"
+
+
+@functools.lru_cache(maxsize=None)
+def compile_formula(text, sheet=None):
+    """
+    Kompilerar en formel en gång och återanvänder resultatet.
+    :return: Formula vars evaluate(env) tar en dictionary {(blad, koordinat): värde}.
+    """
+    return Formula(text, sheet)
+
+
+class FormulaEngine:
+    """
+    Beräknar alla formelceller i en arbetsbok i topologisk ordning.
+    Cellerna anges i samma format som excel_data.json:
+    {blad: {koordinat: {"value": ..., "formula": ...}}}.
+    """
+
+    def __init__(self, workbook_cells):
+        self.constants = {}
+        self.formulas = {}
+        for sheet, cells in workbook_cells.items():
+            for coordinate, cell in cells.items():
+                key = (sheet, coordinate.upper())
+                formula = cell.get("formula")
+                if isinstance(formula, str) and formula.startswith("="):
+                    self.formulas[key] = compile_formula(formula, sheet)
+                else:
+                    self.constants[key] = cell.get("value")
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        # Kahns algoritm över formelcellerna, konstanter är redan kända
+        dependents = {key: [] for key in self.formulas}
+        pending = {}
+        for key, formula in self.formulas.items():
+            inputs = [ref for ref in formula.references if ref in self.formulas]
+            pending[key] = len(inputs)
+            for ref in inputs:
+                dependents[ref].append(key)
+        ready = [key for key, count in pending.items() if count == 0]
+        order = []
+        while ready:
+            key = ready.pop()
+            order.append(key)
+            for dependent in dependents[key]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.formulas):
+            cycle = sorted(key for key, count in pending.items() if count > 0)
+            raise ValueError(f"Circular reference between cells: {cycle[:10]}")
+        return order
+
+    def evaluate(self, inputs=None):
+        """
+        Beräknar alla formler.
+        :param inputs: Värden som ersätter konstanter, {(blad, koordinat): värde}.
+        :return: Dictionary {(blad, koordinat): värde} för alla celler.
+        """
+        values = dict(self.constants)
+        if inputs:
+            values.update(inputs)
+        for key in self.order:
+            values[key] = self.formulas[key].evaluate(values)
+        return values
+
+    def differences(self, workbook_cells, tolerance=1e-9):
+        """
+        Jämför beräknade värden med värdena som Excel sparat i arbetsboken.
+        :return: Lista med (blad, koordinat, Excel-värde, beräknat värde) som skiljer sig.
+        """
+        values = self.evaluate()
+        mismatches = []
+        for key in self.order:
+            expected = workbook_cells[key[0]][key[1]].get("value")
+            actual = values[key]
+            if isinstance(actual, ExcelError):
+                # openpyxl läser felvärden som text, t.ex. '#DIV/0!'
+                actual = actual.code
+            if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+                if abs(expected - actual) > tolerance * max(1.0, abs(expected)):
+                    mismatches.append((key[0], key[1], expected, actual))
+            elif expected != actual and not (expected is None and actual == ""):
+                mismatches.append((key[0], key[1], expected, actual))
+        return mismatches
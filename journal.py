@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+
+from connection import mt5
+from supervisor import Ladder
+
+
+class Journal:
+    """
+    Append-only logg över stegar: plan, fyllda stop-ordrar, SL-flyttar och avslut.
+    Raderna skrivs direkt men fsync görs i omgångar av en bakgrundstråd, så att
+    övervakningen inte väntar på disken för varje händelse. sync() tvingar fram en fsync.
+    """
+
+    def __init__(self, path, sync_interval=0.05):
+        """
+        :param path: JSONL-filen som journalen skrivs till.
+        :param sync_interval: Sekunder mellan fsync-omgångarna, 0 betyder fsync efter varje rad.
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread = None
+        self.syncs = 0
+
+    def append(self, event_type, sync=False, **fields):
+        """
+        Lägger till en händelse.
+        :param event_type: 'plan', 'fill', 'sl' eller 'closed'.
+        :param sync: fsync innan anropet returnerar, för händelser som inte får gå förlorade.
+        """
+        record = {"type": event_type, "time": time.time()}
+        record.update(fields)
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._dirty = True
+        if sync or self.sync_interval <= 0:
+            self.sync()
+        elif self._thread is None:
+            self._thread = threading.Thread(target=self._sync_loop, name="journal-sync", daemon=True)
+            self._thread.start()
+
+    def sync(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+            self.syncs += 1
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sync()
+        self._file.close()
+
+
+def read_events(path):
+    """
+    Läser journalen rad för rad. En halvskriven sista rad från en krasch hoppas över.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def replay(path):
+    """
+    Bygger upp tillståndet för stegar som inte är avslutade.
+    :return: Dictionary {(symbol, magic): plan med 'positions' {ticket: sl}}.
+    """
+    ladders = {}
+    for event in read_events(path):
+        key = (event.get("symbol"), event.get("magic"))
+        if event["type"] == "plan":
+            state = {name: value for name, value in event.items() if name not in ("type", "time")}
+            state["positions"] = {}
+            ladders[key] = state
+        elif key not in ladders:
+            continue
+        elif event["type"] == "fill":
+            ladders[key]["positions"].setdefault(str(event["ticket"]), None)
+        elif event["type"] == "sl":
+            ladders[key]["positions"][str(event["ticket"])] = event["sl"]
+        elif event["type"] == "closed":
+            del ladders[key]
+    return ladders
+
+
+def compact(path, ladders):
+    """
+    Skriver om journalen med bara de stegar som lever, så att nästa återstart läser lite.
+    """
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        for state in ladders.values():
+            plan = {name: value for name, value in state.items() if name != "positions"}
+            file.write(json.dumps(dict({"type": "plan", "time": time.time()}, **plan), separators=(",", ":")) + "\n")
+            for ticket, sl in state["positions"].items():
+                file.write(json.dumps({"type": "fill", "time": time.time(), "symbol": state["symbol"],
+                                       "magic": state["magic"], "ticket": int(ticket)}, separators=(",", ":")) + "\n")
+                if sl is not None:
+                    file.write(json.dumps({"type": "sl", "time": time.time(), "symbol": state["symbol"],
+                                           "magic": state["magic"], "ticket": int(ticket), "sl": sl},
+                                          separators=(",", ":")) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def new_magic():
+    """
+    Magic-nummer för en ny stege, så att dess positioner och ordrar kan skiljas från andras.
+    """
+    return int(time.time() * 1000) % 2_000_000_000
+
+
+def record_plan(journal, ladder, **extra):
+    """
+    Journalför en stege innan ordrarna skickas, med fsync, så att en krasch mitt i
+    orderläggningen aldrig leder till att stegen läggs en gång till.
+    """
+    journal.append("plan", sync=True, symbol=ladder.symbol, magic=ladder.magic, entry_price=ladder.entry_price,
+                   break_even_price=ladder.break_even_price, levels=ladder.levels, point=ladder.point,
+                   points_per_pip_value=ladder.points_per_pip_value, **extra)
+    ladder.journal = journal
+
+
+def recover(path, supervisor):
+    """
+    Återställer övervakningen efter en omstart: tillståndet läses ur journalen och stäms av
+    mot terminalen med en enda fråga om positioner och ordrar. Stegar som stängts medan
+    processen var nere släpps, övriga registreras i supervisorn och journalen skrivs om
+    med bara dem. Öppna journalen först efteråt och sätt ladder.journal på de återställda stegarna.
+    :param path: Journalens sökväg.
+    :param supervisor: LadderSupervisor som stegarna registreras i.
+    :return: Lista med återställda Ladder, eller None om terminalen inte svarade.
+    """
+    ladders = replay(path)
+    if not ladders:
+        if os.path.exists(path):
+            compact(path, ladders)
+        return []
+
+    positions = mt5.positions_get()
+    orders = mt5.orders_get()
+    if positions is None or orders is None:
+        print(f"Failed to get positions/orders for recovery. {mt5.last_error()}")
+        return None
+    live_keys = {(item.symbol, item.magic) for item in positions} | {(item.symbol, item.magic) for item in orders}
+
+    recovered = []
+    for key, state in list(ladders.items()):
+        if key not in live_keys:
+            print(f"Stegen för {key[0]} (magic {key[1]}) stängdes medan övervakningen var nere.")
+            del ladders[key]
+            continue
+        ladder = Ladder(state["symbol"], state["magic"], state["entry_price"], state["break_even_price"],
+                        state["levels"], state["point"], state["points_per_pip_value"], state.get("tp_price"))
+        ladder.position_tickets = {int(ticket) for ticket in state["positions"]}
+        ladder.break_even_active = any(sl is not None for sl in state["positions"].values())
+        supervisor.register(ladder)
+        recovered.append(ladder)
+    compact(path, ladders)
+    return recovered
@@ -1,83 +1,29 @@
-def convert_excel_formula_to_python(expr):
-    if expr is None:
-        return None
+import json
+import time
 
-    # Ta bort ledande '='
-    expr = expr.lstrip('=')
-    # Ta bort ledande '+' om det finns
-    expr = re.sub(r'^\+', '', expr)
+from formula_engine import FormulaEngine
 
-    # Hantera IF-funktioner:
-    # Excel: IF(condition, value_if_true, value_if_false)
-    # Python: (value_if_true if condition else value_if_false)
-    # Ex. =IF(D15=0,"NA",T22*U22*D17)
-    # condition: D15=0 -> values['D15']==0
-    # true: "NA"
-    # false: values['T22']*values['U22']*values['D17']
+SHEET = "Breakeven Stops"
 
-    # Detta är en enkel hantering av IF:
-    def if_replacer(match):
-        # match: IF(...,...,...)
-        inner = match.group(1)  # Allt inom IF(...)
-        # Dela upp på kommatecken utanför parenteser (enkel lösning, förutsätter inga inbäddade IF)
-        parts = [p.strip() for p in inner.split(',')]
-        if len(parts) != 3:
-            return match.group(0)  # Okänt format, returnera original
+# Läs in cellerna som excel.py har sparat
+with open("excel_data.json", "r") as f:
+    data = json.load(f)
 
-        condition, val_if_true, val_if_false = parts
+# Varje formel kompileras en gång, sedan räknas bladet i topologisk ordning
+engine = FormulaEngine({SHEET: data.get(SHEET, {})})
 
-        # Konvertera condition (t.ex. D15=0) till Python:
-        # Ersätt '=' med '==' om det är en enkel jämförelse
-        # Detta är förenklat och förutsätter enkel form: D15=0
-        condition = condition.replace('=', '==')
+start = time.perf_counter()
+values = engine.evaluate()
+elapsed = time.perf_counter() - start
 
-        # Konvertera cellreferenser till values['cell']
-        condition = re.sub(r'([A-Z]{1,3}\d+)', r"values['\1']", condition)
-        val_if_true = re.sub(r'([A-Z]{1,3}\d+)', r"values['\1']", val_if_true)
-        val_if_false = re.sub(r'([A-Z]{1,3}\d+)', r"values['\1']", val_if_false)
-
-        return f"({val_if_true} if {condition} else {val_if_false})"
-
-    expr = re.sub(r'IF\((.*?)\)', if_replacer, expr)
-
-    # Ersätt cellreferenser med values['C5'] etc.
-    # Detta görs endast om de ej redan konverterats. Vi tar alla cellreferenser:
-    expr = re.sub(r'([A-Z]{1,3}\d+)', r"values['\1']", expr)
-
-    # Ta bort eventuella '+' som prefix på termer:
-    expr = re.sub(r'\+\s*values', 'values', expr)
-
-    # Kvarstående Excel-funktioner som ROUNDUP, etc. kan behöva ersättas med Python-funktioner
-    # Exempel: ROUNDUP(x,0) -> math.ceil(x) om det är 0 decimaler.
-    # Här gör vi en enkel ersättning för ROUNDUP(x,0) med int(math.ceil(x))
-
-    # För enkelhets skull: ersätt ROUNDUP(expr,0) med int(math.ceil(expr))
-    # Detta förutsätter att du importerat math: from math import ceil
-    def roundup_replacer(match):
-        inner = match.group(1)
-        parts = [p.strip() for p in inner.split(',')]
-        if len(parts) == 2 and parts[1] == '0':
-            return f"int(math.ceil({parts[0]}))"
-        else:
-            # Om det inte är just 0 decimaler, får du anpassa mer avancerat
-            # Här returneras originalet om vi inte kan hantera det enkelt:
-            return match.group(0)
-
-    expr = re.sub(r'ROUNDUP\((.*?)\)', roundup_replacer, expr)
-
-    # Ersätt Excel-dollarreferenser D$18 osv, med bara D18 (tar bort $)
-    expr = expr.replace('$', '')
-
-    return expr
-
-
-# Skapa en dictionary för formler
+# Skapa en dictionary med formel och beräknat värde per cell
 formulas_dict = {}
-
-for cell, content in data.get("Breakeven Stops", {}).items():
-    formula = content.get("formula")
-    if formula:
-        python_expr = convert_excel_formula_to_python(formula)
-        formulas_dict[cell] = python_expr
+for sheet, cell in engine.order:
+    formulas_dict[cell] = {"formula": engine.formulas[(sheet, cell)].text, "value": values[(sheet, cell)]}
 
 print(formulas_dict)
+print(f"{len(engine.order)} formulas evaluated in {elapsed * 1e6:.0f} us")
+
+# Kontrollera mot värdena som Excel har sparat i arbetsboken
+for sheet, cell, expected, actual in engine.differences({SHEET: data.get(SHEET, {})}):
+    print(f"Mismatch in {cell}: Excel {expected!r}, engine {actual!r}")
@@ -1,66 +1,40 @@
-from settings import (
-    initial_stop_level, initial_stop_percent, account_size,
-    number_of_pips, top_up_levels1, top_up_levels2, top_up_levels3,
-    target_gain_percent
-)
-from order_execution import place_order, confirm_execution, adjust_volume, calculate_sl_price, points_per_pip, monitor_positions, calculate_tp_price
-import MetaTrader5 as mt5
-import pandas as pd
-
-if not mt5.initialize():
-    print("MetaTrader 5 initialization failed. Ensure that the terminal is running and properly configured.")
-
-# Konvertera pips till points
-top_up_levels1_points = top_up_levels1 * 10  # 1 pip = 10 points
-top_up_levels2_points = top_up_levels2 * 10
-top_up_levels3_points = top_up_levels3 * 10
-
-def calculate_loss_in_dollars(initial_stop_percent, account_size):
-    """
-    Beräknar förlusten i dollar för den första traden.
-    :param initial_stop_percent: Procent av kontot som riskeras.
-    :param account_size: Totalt kontosaldo.
-    :return: Förlust i dollar.
-    """
-    loss_in_dollars = (initial_stop_percent / 100) * account_size
-    return loss_in_dollars
-
-
-def calculate_initial_lot_size(loss_in_dollars, initial_stop_level, pip_value):
-    """
-    Beräknar initial lot size för den första traden (marknadsorder).
-    :param loss_in_dollars: Förlusten i dollar för traden.
-    :param initial_stop_level: Antal pips till breakeven-nivån.
-    :param pip_value: Pipvärdet i kontovaluta.
-    :return: Initial lot size avrundad till två decimaler.
-    """
-    # Beräkna lot size
-    lot_size = loss_in_dollars / (initial_stop_level * pip_value)
-
-    # Skala ned till två decimaler
-    lot_size = round(lot_size, 2)
+import logging
+
+from order_execution import confirm_execution, calculate_sl_price, points_per_pip, calculate_tp_price, prepare_ladder, submit_ladder
+from planner import plan_ladders
+from symbol_cache import get_symbol_info, get_symbol_field, invalidate
+from connection import connection, mt5, ensure_connected
+from tables import print_table
+from preflight import margin_of_safety, print_violations, validate_ladder
+import metrics
+from journal import Journal, new_magic, record_plan, recover
+from supervisor import Ladder, LadderSupervisor
+import spread_estimator
+import pip_values
 
-    return lot_size
+# Symbol
+symbol = "EURUSD"
 
 
 def get_pip_value(symbol):
     """
-    Hämtar pip-värdet för en given symbol från MetaTrader 5.
+    Hämtar pip-värdet för en given symbol: värdet av en pip för en lot i kontovaluta,
+    från valutamatrisen i pip_values.
     :param symbol: Symbolens namn (t.ex. 'GBPJPY').
     :return: Pip-värdet för symbolen.
     """
 
     # Hämta symbolinformation
-    symbol_info = mt5.symbol_info(symbol)
+    symbol_info = get_symbol_info(symbol)
     if symbol_info is None or not symbol_info.visible:
         print(f"Symbol {symbol} information not found or symbol not visible.")
         return None
 
-    # Använd trade_tick_value för att hämta pip-värdet
-    pip_value = symbol_info.trade_tick_value
+    # Pip-värdet räknas om till kontovalutan, så korsvalutor som GBPJPY blir rätt
+    pip_value = pip_values.get_pip_value(symbol)
 
     # Kontrollera att pip_value är giltigt
-    if pip_value <= 0:
+    if pip_value is None or pip_value <= 0:
         print(f"Invalid pip value for {symbol}.")
         return None
 
@@ -69,14 +43,22 @@ def get_pip_value(symbol):
     return pip_value
 
 
-def get_spread_in_pips(symbol):
+def get_spread_in_pips(symbol, percentile=50):
     """
-    Hämtar spread i pips för en given symbol baserat på skillnaden mellan ASK och BID.
+    Hämtar spread i pips för en given symbol. Om spread_estimator samlar ticks för symbolen
+    används den rullande spreaden, annars skillnaden mellan ASK och BID just nu.
     :param symbol: Symbolens namn (t.ex. 'GBPJPY').
+    :param percentile: Percentil för den rullande spreaden, 50 ger medianen.
     :return: Spread i pips.
     """
+    # Rullande spread ur tickbufferten, utan anrop till terminalen
+    rolling_spread = spread_estimator.get_spread_in_pips(symbol, percentile)
+    if rolling_spread is not None and rolling_spread > 0:
+        print(f"Rolling spread ({percentile}th percentile) for {symbol}: {rolling_spread:.2f} pips")
+        return rolling_spread
+
     # Hämta symbolinformation
-    symbol_info = mt5.symbol_info(symbol)
+    symbol_info = get_symbol_info(symbol)
     if symbol_info is None:
         print(f"Symbol {symbol} information not found.")
         return None
@@ -86,6 +68,8 @@ def get_spread_in_pips(symbol):
         if not mt5.symbol_select(symbol, True):
             print(f"Failed to select {symbol}.")
             return None
+        invalidate(symbol)
+        symbol_info = get_symbol_info(symbol)
 
     # Kontrollera värdena
     print(f"Symbol Info: ask={symbol_info.ask}, bid={symbol_info.bid}, point={symbol_info.point}")
@@ -100,31 +84,7 @@ def get_spread_in_pips(symbol):
     return spread_in_pips
 
 
-def calculate_pip_gain(number_of_pips, spread_in_pips, top_up_levels1, top_up_levels2, top_up_levels3):
-    """
-    Beräknar pip gain för initial order och stop orders.
-    """
-    pip_gains = {
-        'initial': round(number_of_pips - spread_in_pips, 2),
-        'stop_1': round(number_of_pips * (1 - (top_up_levels1 / 100)) - spread_in_pips, 2),
-        'stop_2': round(number_of_pips * (1 - (top_up_levels2 / 100)) - spread_in_pips, 2),
-        'stop_3': round(number_of_pips * (1 - (top_up_levels3 / 100)) - spread_in_pips, 2)
-    }
-    return pip_gains
-
-
-def calculate_gain_in_dollars(lot_size, pip_gain, pip_value):
-    """
-    Beräknar gain in $ för en given order.
-    :param lot_size: Lot storlek.
-    :param pip_gain: Pip gain.
-    :param pip_value: Pip värde.
-    :return: Gain in $.
-    """
-    return lot_size * pip_gain * pip_value
-
-
-def summarize_results(pip_value, spread_in_pips, loss_in_dollars, initial_lot_size, pip_gains, gain_in_dollars_initial):
+def summarize_results(symbol, pip_value, spread_in_pips, loss_in_dollars, initial_lot_size, pip_gains, gain_in_dollars_initial):
     print("\n--- Trade Summary ---")
     print(f"Symbol: {symbol}")
     print(f"Pip Value: {pip_value:.2f}")
@@ -135,267 +95,150 @@ def summarize_results(pip_value, spread_in_pips, loss_in_dollars, initial_lot_si
     print(f"Gain in $ for Initial Order: {gain_in_dollars_initial:.2f}")
 
 
-# Symbol
-symbol = "EURUSD"
-
-# Hämta spread_in_pips
-spread_in_pips = get_spread_in_pips(symbol)
-if spread_in_pips is None:
-    print("Failed to retrieve spread in pips.")
-else:
+def plan(symbol):
+    """
+    Hämtar spread och pip-värde och räknar ut hela stegen enligt settings.py.
+    :return: Dictionary från plan_ladders för en symbol och en variant, eller None vid fel.
+    """
+    from settings import (
+        initial_stop_percent, account_size, top_up_levels,
+        target_gain_percent, SPREAD_PERCENTILE, pips_for_symbol
+    )
+    # Pips i settings.py justeras för den planerade symbolens decimaler, så terminalen måste vara uppkopplad
+    initial_stop_level = pips_for_symbol(symbol, "initial_stop_level")
+    number_of_pips = pips_for_symbol(symbol, "number_of_pips")
+
+    # Hämta spread_in_pips
+    spread_in_pips = get_spread_in_pips(symbol, SPREAD_PERCENTILE)
+    if spread_in_pips is None:
+        print("Failed to retrieve spread in pips.")
+        return None
     print(f"Spread in pips for {symbol}: {spread_in_pips:.2f}")
 
-# Hämta pip_value
-pip_value = get_pip_value(symbol)
-if pip_value is None:
-    print("Failed to retrieve pip value.")
-else:
+    # Hämta pip_value
+    pip_value = get_pip_value(symbol)
+    if pip_value is None:
+        print("Failed to retrieve pip value.")
+        return None
     print(f"Pip value for {symbol}: {pip_value:.2f}")
 
-# Beräkna förlust i dollar
-loss_in_dollars = calculate_loss_in_dollars(initial_stop_percent, account_size)
-
-
-# Beräkna initial lot size
-initial_lot_size = calculate_initial_lot_size(loss_in_dollars, initial_stop_level, pip_value)
-
-# Beräkna pip gains
-pip_gains = calculate_pip_gain(number_of_pips, spread_in_pips, top_up_levels1, top_up_levels2, top_up_levels3)
-
-# Beräkna total_gain
-total_gain = (account_size * target_gain_percent) / 100
-print(f"Total Gain Target: {total_gain:.2f}")
-
-# Beräkna gain in $ för initialorder
-gain_in_dollars_initial = calculate_gain_in_dollars(initial_lot_size, pip_gains['initial'], pip_value)
-
-# Beräkna Gain in $ för stop_1
-gain_in_dollars_stop_1 = ((total_gain - gain_in_dollars_initial) * top_up_levels1) / (top_up_levels1 + top_up_levels2 + top_up_levels3)
-print(f"Gain in $ for Stop 1: {gain_in_dollars_stop_1:.2f}")
-
-# Beräkna Gain in $ för stop_2
-gain_in_dollars_stop_2 = ((total_gain - gain_in_dollars_initial) * top_up_levels2) / (top_up_levels1 + top_up_levels2 + top_up_levels3)
-print(f"Gain in $ for Stop 2: {gain_in_dollars_stop_2:.2f}")
-
-# Beräkna Gain in $ för stop_3
-gain_in_dollars_stop_3 = ((total_gain - gain_in_dollars_initial) * top_up_levels3) / (top_up_levels1 + top_up_levels2 + top_up_levels3)
-print(f"Gain in $ for Stop 3: {gain_in_dollars_stop_3:.2f}")
-
-
-# Beräkna total_gain_actual
-total_gain_actual = (
-    gain_in_dollars_initial +
-    gain_in_dollars_stop_1 +
-    gain_in_dollars_stop_2 +
-    gain_in_dollars_stop_3
-)
-
-# Skriv ut total_gain_actual
-print(f"Total Gain Actual: {total_gain_actual:.2f}")
+    # Hela stegen räknas i ett pass: lot sizes, gain in $ och alla break-even-tabeller
+    ladder_plan = plan_ladders([symbol], [pip_value], [spread_in_pips], account_size, target_gain_percent,
+                               number_of_pips, initial_stop_percent, initial_stop_level, top_up_levels)
+    # Räknas här, där spread och pipvärde finns, så att den som bara skriver ut planen
+    # (t.ex. mirror.py) inte behöver koppla upp sig
+    ladder_plan["margin_of_safety"] = margin_of_safety(account_size, target_gain_percent, number_of_pips,
+                                                       initial_stop_level, initial_stop_percent, top_up_levels,
+                                                       pip_value, spread_in_pips)
 
-summarize_results(pip_value, spread_in_pips, loss_in_dollars, initial_lot_size, pip_gains, gain_in_dollars_initial)
+    # Förlust i dollar och initial lot size
+    loss_in_dollars = float(ladder_plan["loss_in_dollars"][0, 0])
+    initial_lot_size = float(ladder_plan["initial_lot_size"][0, 0])
 
+    # Pip gains, 'initial' och 'stop_1' ... 'stop_N'
+    row_names = ["initial"] + [f"stop_{i}" for i in range(1, len(top_up_levels) + 1)]
+    pip_gains = {name: float(value) for name, value in zip(row_names, ladder_plan["pip_gains"][0, 0])}
 
-# Break even at 1st stop - START
-# Grundläggande variabler
-pips_initial = 0
-pips_stop_1 = top_up_levels1 / number_of_pips
-pips_stop_2 = number_of_pips / (top_up_levels2 / 10)
-pips_stop_3 = number_of_pips / (top_up_levels3 / 10)
+    # Total gain
+    total_gain = float(ladder_plan["total_gain"][0, 0])
+    print(f"Total Gain Target: {total_gain:.2f}")
 
-# Lots för stop_1
-lots_stop_1 = gain_in_dollars_stop_1 / (pip_gains['stop_1'] * pip_value)
+    # Gain in $ för initialorder och varje stop
+    gain_in_dollars = ladder_plan["gain_in_dollars"][0, 0]
+    gain_in_dollars_initial = float(gain_in_dollars[0])
+    for i, gain in enumerate(gain_in_dollars[1:], start=1):
+        print(f"Gain in $ for Stop {i}: {gain:.2f}")
 
-# Nivåer för initial och stop_1 (avrundade och multiplicerade med 10)
-level_initial = (lots_stop_1 / initial_lot_size) * pips_stop_2 / (lots_stop_1 / initial_lot_size)
-level_stop_1 = level_initial  # Samma som level_initial, också avrundat
+    # Skriv ut total_gain_actual
+    total_gain_actual = float(ladder_plan["total_gain_actual"][0, 0])
+    print(f"Total Gain Actual: {total_gain_actual:.2f}")
 
-# Spread för initial och stop_1
-spread_initial = initial_lot_size * spread_in_pips * pip_value
-spread_stop_1 = lots_stop_1 * spread_in_pips * pip_value
+    summarize_results(symbol, pip_value, spread_in_pips, loss_in_dollars, initial_lot_size, pip_gains, gain_in_dollars_initial)
+    return ladder_plan
 
-# Pip gains för initial och stop_1
-pip_gains_initial = level_initial
-pip_gain_stop_1 = (level_initial - pips_stop_1) * -1
 
-# Resultat för initial och stop_1
-result_initial = initial_lot_size * pip_gains_initial * pip_value
-result_stop_1 = lots_stop_1 * pip_gain_stop_1 * (-pip_value)
-
-# Totalt
-total_spread = pip_value + spread_stop_1
-total_pip_gains = pip_gains_initial + (pip_gain_stop_1)
-total_result_dollar = result_initial + result_stop_1
-
-# Skapa data för tabellen
-data = {
-    "Level": [round(level_initial, 0), round(level_stop_1, 0)],
-    "Spread": [spread_initial, spread_stop_1],
-    "Lots": [round(initial_lot_size, 2), round(lots_stop_1, 2)],
-    "Pip Gain": [round(pip_gains_initial, 1), round(pip_gain_stop_1, 1)],
-    "Result": [round(result_initial, 1), round(result_stop_1, 1)]
-}
-
-# Skapa DataFrame
-df = pd.DataFrame(data, index=["Initial", "Stop_1"])
-
-# Lägg till totalsumma längst ned
-df.loc["Total"] = [
-    "",
-    round(total_spread, 1),
-    "",
-    round(total_pip_gains, 1),
-    round(total_result_dollar, 1)
-]
+def print_break_even_tables(ladder_plan):
+    """
+    Skriver ut break-even-tabellerna: tabell n visar initial och stop 1..n med summor.
+    """
+    break_even = {key: value[0, 0] for key, value in ladder_plan["break_even"].items()}
+    count = len(break_even["lots"]) - 1
+    table_index = ["Initial"] + [f"Stop_{i}" for i in range(1, count + 1)]
+    columns = ["Level", "Spread", "Lots", "Pip Gain", "Result"]
+
+    for n in range(1, count + 1):
+        rows = [
+            [round(float(level), 0), float(spread), round(float(lots), 2), round(float(pip_gain), 1), round(float(result), 1)]
+            for level, spread, lots, pip_gain, result in zip(
+                break_even["level"][:n + 1], break_even["spread"][:n + 1], break_even["lots"][:n + 1],
+                break_even["pip_gain"][:n + 1], break_even["result"][:n + 1]
+            )
+        ]
+        # Lägg till totalsumma längst ned
+        rows.append([
+            "",
+            round(float(break_even["total_spread"][n - 1]), 1),
+            "",
+            round(float(break_even["total_pip_gain"][n - 1]), 1),
+            round(float(break_even["total_result"][n - 1]), 1)
+        ])
+        print_table(columns, rows, index=table_index[:n + 1] + ["Total"], formats={"Spread": ".6f"})
+        print()
+
+
+def print_margin_of_safety(ladder_plan):
+    """
+    Skriver ut tabellen "Margin of Safety" som plan() räknat ut: avståndet i pips till
+    stoplossen för initialordern och till break-even för varje top up.
+    """
+    safety = ladder_plan.get("margin_of_safety")
+    if safety is None:
+        return
+    rows = [[stop_type, "N/A" if pips is None else round(pips, 1)] for trade, stop_type, pips in safety]
+    print_table(["Stop Type", "Pips"], rows, index=[trade for trade, stop_type, pips in safety])
+    print()
 
-# Visa tabellen
-print(df)
 
-# Break even at 1st stop - END
+def prepare_planned_ladder(symbol, ladder_plan):
+    """
+    Bygger alla requests för en planerad stege utifrån aktuellt pris, utan att skicka något.
+    :return: Dictionary med 'ladder', 'requests', 'sl_price' och 'tp_price', eller None vid fel.
+    """
+    from settings import pips_for_symbol, top_up_levels
+    initial_stop_level = pips_for_symbol(symbol, "initial_stop_level")
+    min_stop_distance = pips_for_symbol(symbol, "min_stop_distance")
+    number_of_pips = pips_for_symbol(symbol, "number_of_pips")
 
-# Break even at 2nd stop - START
+    # Aktuellt pris från tickdata
+    current_price = mt5.symbol_info_tick(symbol).ask
 
-# Lots för stop_2
-lots_stop_2 = gain_in_dollars_stop_2 / (pip_gains['stop_2'] * pip_value)
+    # Hämta symbolinformation
+    point = get_symbol_field(symbol, "point")
+    points_per_pip_value = points_per_pip(symbol)
 
-# Nivåer för stop_2
-level_stop_2 = (lots_stop_2 / lots_stop_1) * pips_stop_3 / (lots_stop_2 / lots_stop_1)
+    # Beräkna TP för initial och stop orders
+    tp_price_initial = calculate_tp_price(
+        entry_price=current_price,
+        tp_pips=number_of_pips,
+        order_type='BUY',
+        point=point,
+        points_per_pip_value=points_per_pip_value
+    )
 
-# Spread för stop_2
-spread_stop_2 = lots_stop_2 * spread_in_pips * pip_value
+    # Körs vid varje submit i daemonen och mirror-processerna, så felsökningen går till logging
+    logging.debug("Felsökning: current price %s, number_of_pips %s, point %s, points_per_pip_value %s",
+                  current_price, number_of_pips, point, points_per_pip_value)
+    if tp_price_initial is None:
+        print("Failed to calculate TP price. Exiting.")
 
-# Pip gains för stop_2
-pip_gain_stop_2 = (level_stop_2 - pips_stop_2) * -1
+    # Beräkna entry-nivåer för stop-orders baserat på procentandelar från settings
+    entry_levels = [
+        current_price + (level / 100) * number_of_pips * point * points_per_pip_value
+        for level in top_up_levels
+    ]
+    print(f"Entry Levels: {entry_levels}")
 
-# Resultat för stop_2
-result_stop_2 = lots_stop_2 * pip_gain_stop_2 * (-pip_value)
-
-# Totalt för 2nd stop
-total_spread_2 = total_spread + spread_stop_2
-total_pip_gains_2 = total_pip_gains + pip_gain_stop_2
-total_result_dollar_2 = total_result_dollar + result_stop_2
-
-# Skapa data för tabellen
-data_2 = {
-    "Level": [round(level_initial, 0), round(level_stop_1, 0), round(level_stop_2, 0)],
-    "Spread": [spread_initial, spread_stop_1, spread_stop_2],
-    "Lots": [round(initial_lot_size, 2), round(lots_stop_1, 2), round(lots_stop_2, 2)],
-    "Pip Gain": [round(pip_gains_initial, 1), round(pip_gain_stop_1, 1), round(pip_gain_stop_2, 1)],
-    "Result": [round(result_initial, 1), round(result_stop_1, 1), round(result_stop_2, 1)]
-}
-
-# Skapa DataFrame
-df_2 = pd.DataFrame(data_2, index=["Initial", "Stop_1", "Stop_2"])
-
-# Lägg till totalsumma längst ned
-df_2.loc["Total"] = [
-    "",
-    round(total_spread_2, 1),
-    "",
-    round(total_pip_gains_2, 1),
-    round(total_result_dollar_2, 1)
-]
-
-# Visa tabellen
-print(df_2)
-
-# Break even at 2nd stop - END
-
-# Break even at 3rd stop - START
-
-# Lots för stop_3
-lots_stop_3 = gain_in_dollars_stop_3 / (pip_gains['stop_3'] * pip_value)
-
-# Nivåer för stop_3
-level_stop_3 = (lots_stop_3 / lots_stop_2) * pips_stop_3 / (lots_stop_3 / lots_stop_2)
-
-# Spread för stop_3
-spread_stop_3 = lots_stop_3 * spread_in_pips * pip_value
-
-# Pip gains för stop_3
-pip_gain_stop_3 = (level_stop_3 - pips_stop_3) * -1
-
-# Resultat för stop_3
-result_stop_3 = lots_stop_3 * pip_gain_stop_3 * (-pip_value)
-
-# Totalt för 3rd stop
-total_spread_3 = total_spread_2 + spread_stop_3
-total_pip_gains_3 = total_pip_gains_2 + pip_gain_stop_3
-total_result_dollar_3 = total_result_dollar_2 + result_stop_3
-
-# Skapa data för tabellen
-data_3 = {
-    "Level": [round(level_initial, 0), round(level_stop_1, 0), round(level_stop_2, 0), round(level_stop_3, 0)],
-    "Spread": [spread_initial, spread_stop_1, spread_stop_2, spread_stop_3],
-    "Lots": [round(initial_lot_size, 2), round(lots_stop_1, 2), round(lots_stop_2, 2), round(lots_stop_3, 2)],
-    "Pip Gain": [round(pip_gains_initial, 1), round(pip_gain_stop_1, 1), round(pip_gain_stop_2, 1), round(pip_gain_stop_3, 1)],
-    "Result": [round(result_initial, 1), round(result_stop_1, 1), round(result_stop_2, 1), round(result_stop_3, 1)]
-}
-
-# Skapa DataFrame
-df_3 = pd.DataFrame(data_3, index=["Initial", "Stop_1", "Stop_2", "Stop_3"])
-
-# Lägg till totalsumma längst ned
-df_3.loc["Total"] = [
-    "",
-    round(total_spread_3, 1),
-    "",
-    round(total_pip_gains_3, 1),
-    round(total_result_dollar_3, 1)
-]
-
-# Visa tabellen
-print(df_3)
-
-# Break even at 3rd stop - END
-
-#Orderhantering
-
-# Fråga användaren om orderläggning
-if not confirm_execution():
-    print("Orderläggning avbruten.")
-    exit()
-
-# Lägg ordrar för initial och stop orders
-print("Lägger order...")
-
-# Aktuellt pris från tickdata
-current_price = mt5.symbol_info_tick(symbol).ask
-
-# Hämta symbolinformation
-point = mt5.symbol_info(symbol).point
-points_per_pip_value = points_per_pip(symbol)
-
-# Beräkna TP för initial och stop orders
-tp_price_initial = calculate_tp_price(
-    entry_price=current_price,
-    tp_pips=number_of_pips,
-    order_type='BUY',
-    point=point,
-    points_per_pip_value=points_per_pip_value
-)
-
-print(f"Felsökning:")
-print(f"Current price: {current_price}")
-print(f"number_of_pips: {number_of_pips}")
-print(f"point: {point}")
-print(f"points_per_pip_value: {points_per_pip_value}")
-if tp_price_initial is None:
-    print("Failed to calculate TP price. Exiting.")
-
-# Beräkna entry-nivåer för stop-orders baserat på procentandelar från settings
-entry_levels = [
-    current_price + (top_up_levels1 / 100) * number_of_pips * point * points_per_pip_value,
-    current_price + (top_up_levels2 / 100) * number_of_pips * point * points_per_pip_value,
-    current_price + (top_up_levels3 / 100) * number_of_pips * point * points_per_pip_value
-]
-print(f"Entry Levels: {entry_levels}")
-
-# Lägg initial order
-adjusted_lot_size = adjust_volume(initial_lot_size, symbol)
-if adjusted_lot_size is None:
-    print(f"Failed to adjust volume for {symbol}. Skipping Initial order.")
-else:
+    # Bygg alla requests i förväg: initial order med SL och stop-orders utan SL
     sl_price_initial = calculate_sl_price(
         entry_price=current_price,
         sl_pips=initial_stop_level,
@@ -403,37 +246,141 @@ else:
         point=point,
         points_per_pip_value=points_per_pip_value
     )
-    place_order(
+    lots = ladder_plan["break_even"]["lots"][0, 0]
+    magic = new_magic()
+    requests = prepare_ladder(
         symbol=symbol,
-        lot_size=adjusted_lot_size,
-        order_type='BUY',
-        price=current_price,
-        sl=sl_price_initial,
-        tp=tp_price_initial
+        initial_lot_size=float(lots[0]),
+        current_price=current_price,
+        sl_price=sl_price_initial,
+        tp_price=tp_price_initial,
+        stop_lot_sizes=[float(lot) for lot in lots[1:]],
+        entry_levels=entry_levels,
+        magic=magic
     )
+    if requests is None:
+        print("Failed to prepare ladder. Exiting.")
+        return None
 
-# Lägg stop-orders utan SL
-for i, entry_price in enumerate(entry_levels):
-    lot_size = adjust_volume([lots_stop_1, lots_stop_2, lots_stop_3][i], symbol)
-    if lot_size is None:
-        print(f"Failed to adjust volume for Stop {i + 1}. Skipping.")
-        continue
+    # Kontrollera hela stegen mot stops/freeze level och marginal innan något skickas,
+    # så att en avvisad order inte lämnar en halvbyggd stege
+    preflight_report = validate_ladder(requests, min_stop_distance, break_even_price=current_price)
+    if preflight_report is None:
+        return None
+    if preflight_report["violations"]:
+        print("Stegen klarar inte kontrollen före orderläggning:")
+        print_violations(preflight_report)
+        return None
+    print(f"Marginal för hela stegen: {preflight_report['margin_required']:.2f} "
+          f"(fri marginal {preflight_report['margin_free']:.2f})")
 
-    place_order(
-        symbol=symbol,
-        lot_size=lot_size,
-        order_type='BUY_STOP',
-        price=entry_price,
-        sl=None,  # Ingen SL
-        tp=tp_price_initial
-    )
+    ladder = Ladder(symbol, magic, current_price, current_price, entry_levels, point, points_per_pip_value,
+                    tp_price_initial)
+    return {"ladder": ladder, "requests": requests, "sl_price": sl_price_initial, "tp_price": tp_price_initial}
+
+
+def submit_planned_ladder(prepared, journal):
+    """
+    Journalför och skickar en stege från prepare_planned_ladder.
+    :return: Rapporten från submit_ladder. Stegen är lagd om report['initial'] har retcode DONE.
+    """
+    ladder = prepared["ladder"]
+
+    # Journalför stegen innan något skickas, så att en omstart övervakar den i stället för att lägga en ny
+    record_plan(journal, ladder, sl_price=prepared["sl_price"], tp_price=prepared["tp_price"])
+
+    # Skicka initial order och, när den är fylld, alla stop-orders parallellt
+    submit_report = submit_ladder(prepared["requests"])
+    latency = submit_report["latency"]
+    print(f"Initial order: {latency['initial'] * 1000:.1f} ms")
+    for i, stop_latency in enumerate(latency["stops"]):
+        print(f"Stop {i + 1}: {stop_latency * 1000:.1f} ms")
+    print(f"Hela stegen: {latency['ladder'] * 1000:.1f} ms")
+    if submit_report["initial"] is None or submit_report["initial"].retcode != mt5.TRADE_RETCODE_DONE:
+        journal.append("closed", symbol=ladder.symbol, magic=ladder.magic)
+    return submit_report
 
-# Starta övervakning efter att alla ordrar är lagda
-monitor_positions(
-    symbol=symbol,
-    entry_price=current_price,
-    break_even_price=current_price,  # Start på entry-priset för initial
-    levels=entry_levels,
-    point=point,
-    points_per_pip_value=points_per_pip_value
-)
+
+def place_ladder(symbol, ladder_plan, journal, supervisor):
+    """
+    Lägger initialordern och stop-ordrarna, journalför stegen och startar övervakningen.
+    """
+    # Lägg ordrar för initial och stop orders
+    print("Lägger order...")
+    prepared = prepare_planned_ladder(symbol, ladder_plan)
+    if prepared is None:
+        return False
+
+    submit_report = submit_planned_ladder(prepared, journal)
+    if submit_report["initial"] is None or submit_report["initial"].retcode != mt5.TRADE_RETCODE_DONE:
+        return False
+
+    # Starta övervakning efter att alla ordrar är lagda, break-even börjar på entry-priset
+    supervisor.register(prepared["ladder"])
+    supervisor.run()
+    return True
+
+
+def watch_symbol(symbol):
+    """
+    Börjar samla ticks för symbolen. Valutamatrisen för pipvärdena följer samma ticks,
+    även för paren som behövs för omräkningen till kontovalutan.
+    """
+    spread_estimator.track(symbol)
+    service = pip_values.service
+    if service.account_currency is None and not service.refresh():
+        return
+    if service.on_tick not in spread_estimator.estimator.listeners:
+        spread_estimator.estimator.listeners.append(service.on_tick)
+    spread_estimator.track(*service.conversion_symbols(symbol))
+
+
+def main(symbol=symbol):
+    from settings import JOURNAL_FILE, METRICS_TEXTFILE
+    if METRICS_TEXTFILE:
+        # Latens per terminalanrop och övervakningsvarv till Prometheus
+        metrics.enable(METRICS_TEXTFILE)
+
+    # Koppla upp direkt så att felet syns innan beräkningarna
+    if not ensure_connected():
+        return 1
+    # Övervakningen kan pågå i timmar, koppla upp igen om terminalen tappas under tiden
+    connection.start_health_check()
+
+    # Börja samla ticks direkt, så att planeringen får en rullande spread i stället för en enda tick
+    watch_symbol(symbol)
+
+    # Stegar som övervakades när processen stoppades tas upp igen i stället för att nya läggs
+    supervisor = LadderSupervisor()
+    recovered = recover(JOURNAL_FILE, supervisor)
+    if recovered is None:
+        return 1
+    journal = Journal(JOURNAL_FILE)
+    try:
+        if recovered:
+            for ladder in recovered:
+                ladder.journal = journal
+            print(f"Återupptar övervakning av {len(recovered)} stegar från journalen.")
+            supervisor.run()
+            return 0
+
+        ladder_plan = plan(symbol)
+        if ladder_plan is None:
+            return 1
+        print_break_even_tables(ladder_plan)
+        print_margin_of_safety(ladder_plan)
+
+        #Orderhantering
+
+        # Fråga användaren om orderläggning
+        if not confirm_execution():
+            print("Orderläggning avbruten.")
+            return 0
+
+        return 0 if place_ladder(symbol, ladder_plan, journal, supervisor) else 1
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,4 +1,5 @@
-import MetaTrader5 as mt5
+from connection import mt5, connection
+from pip_values import get_pip_value
 import json
 import math
 
@@ -11,7 +12,8 @@ def load_settings():
 
 # Initiera MT5
 def initialize_mt5(mt5_path):
-    if not mt5.initialize(mt5_path):
+    connection.configure(path=mt5_path)
+    if not connection.connect():
         raise RuntimeError("Failed to initialize MetaTrader 5")
 
 
@@ -102,8 +104,7 @@ def main():
     # Hämta symbolinformation
     symbol_info = mt5.symbol_info(symbol)
     point_value = symbol_info.point
-    contract_size = symbol_info.trade_contract_size
-    pip_value = point_value * contract_size
+    pip_value = get_pip_value(symbol)
 
     # Hämta aktuellt pris
     tick = mt5.symbol_info_tick(symbol)
@@ -0,0 +1,229 @@
+import bisect
+import importlib
+import os
+import threading
+import time
+
+# Gränser i sekunder, tätare kring de tider ett lokalt IPC-anrop brukar ta
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Anrop vars resultat inte säger något om fel (konstanter, initialize och shutdown räknas inte)
+_UNTIMED = frozenset({"last_error", "version", "initialize", "shutdown"})
+
+
+class Histogram:
+    """
+    Kumulativ histogram i Prometheus-format med fasta gränser.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        """
+        :return: (kumulativa antal per gräns inklusive +Inf, antal, summa).
+        """
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, count, total
+
+
+class Registry:
+    """
+    Latens per anropstyp, fel per retcode och övervakningsvarvens längd.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.calls = {}
+        self.errors = {}
+        self.monitor_cycle = Histogram(buckets)
+        self._lock = threading.Lock()
+
+    def observe_call(self, name, seconds):
+        histogram = self.calls.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.calls.setdefault(name, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    def count_error(self, name, retcode):
+        key = (name, str(retcode))
+        with self._lock:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def render(self):
+        """
+        :return: Alla mätvärden i Prometheus textformat.
+        """
+        lines = [
+            "# HELP mt5_call_duration_seconds Duration of MetaTrader 5 API calls.",
+            "# TYPE mt5_call_duration_seconds histogram",
+        ]
+        for name in sorted(self.calls):
+            lines.extend(_render_histogram("mt5_call_duration_seconds", self.calls[name], f'call="{name}"'))
+        lines.append("# HELP mt5_call_errors_total Failed MetaTrader 5 API calls by retcode.")
+        lines.append("# TYPE mt5_call_errors_total counter")
+        with self._lock:
+            errors = sorted(self.errors.items())
+        for (name, retcode), count in errors:
+            lines.append(f'mt5_call_errors_total{{call="{name}",retcode="{retcode}"}} {count}')
+        lines.append("# HELP mt5_monitor_cycle_duration_seconds Time spent in one monitoring cycle, excluding the sleep.")
+        lines.append("# TYPE mt5_monitor_cycle_duration_seconds histogram")
+        lines.extend(_render_histogram("mt5_monitor_cycle_duration_seconds", self.monitor_cycle, ""))
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(name, histogram, labels):
+    cumulative, count, total = histogram.snapshot()
+    prefix = labels + "," if labels else ""
+    lines = [f'{name}_bucket{{{prefix}le="{bound}"}} {value}' for bound, value in zip(histogram.buckets, cumulative)]
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative[-1]}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {total}")
+    lines.append(f"{name}_count{suffix} {count}")
+    return lines
+
+
+class InstrumentedBackend:
+    """
+    Lägger sig framför MetaTrader5-modulen (eller FakeTerminal) och mäter varje anrop.
+    Används via connection.use_backend, så all kod som går genom connection.mt5 mäts.
+    """
+
+    def __init__(self, backend, registry):
+        """
+        :param backend: Modulen eller objektet som implementerar API:t, eller dess modulnamn
+                        som då importeras först vid första anropet.
+        :param registry: Registry som mätvärdena samlas i.
+        """
+        self._backend = backend
+        self._registry = registry
+
+    @property
+    def backend(self):
+        if isinstance(self._backend, str):
+            self._backend = importlib.import_module(self._backend)
+        return self._backend
+
+    def __getattr__(self, name):
+        value = getattr(self.backend, name)
+        if not callable(value) or name in _UNTIMED:
+            return value
+        function = value
+        registry = self._registry
+        done_codes = _success_retcodes(self.backend)
+
+        def value(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                registry.observe_call(name, time.perf_counter() - start)
+                registry.count_error(name, "exception")
+                raise
+            registry.observe_call(name, time.perf_counter() - start)
+            if result is None or result is False:
+                registry.count_error(name, "none")
+            elif name == "order_send" and result.retcode not in done_codes:
+                registry.count_error(name, result.retcode)
+            return result
+
+        value.__name__ = name
+        # Spara omslaget så att nästa uppslag inte går via __getattr__
+        self.__dict__[name] = value
+        return value
+
+
+def _success_retcodes(backend):
+    return {getattr(backend, code) for code in
+            ("TRADE_RETCODE_DONE", "TRADE_RETCODE_PLACED", "TRADE_RETCODE_DONE_PARTIAL") if hasattr(backend, code)}
+
+
+class TextfileWriter:
+    """
+    Skriver mätvärdena till en fil för node_exporters textfile collector med jämna mellanrum.
+    """
+
+    def __init__(self, registry, path, interval=15.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        # Skriv till en temporär fil och byt namn, så att exportern aldrig läser en halv fil
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(self.registry.render())
+        os.replace(temporary, self.path)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Failed to write metrics to {self.path}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+
+# Delat register för hela processen
+registry = Registry()
+_writer = None
+
+
+def observe_monitor_cycle(seconds):
+    registry.monitor_cycle.observe(seconds)
+
+
+def instrument():
+    """
+    Mäter alla anrop som går genom connection.mt5 från och med nu.
+    :return: Den tidigare backenden, eller None om mätningen redan var på.
+    """
+    import connection
+    current = connection.connection._backend
+    if isinstance(current, InstrumentedBackend):
+        return None
+    return connection.use_backend(InstrumentedBackend(current or connection.connection._backend_name, registry))
+
+
+def enable(path, interval=15.0):
+    """
+    Slår på mätningen och startar en tråd som skriver en Prometheus-textfil var interval sekund.
+    """
+    global _writer
+    instrument()
+    if _writer is None:
+        _writer = TextfileWriter(registry, path, interval)
+        _writer.start()
+    return _writer
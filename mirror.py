@@ -0,0 +1,293 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from tables import print_table
+
+# Sekunder som en arbetare väntar på de andra innan stegen skickas
+BARRIER_TIMEOUT = 10.0
+
+
+def load_terminal_paths(path="settings.json"):
+    """
+    Läser terminalerna som ska speglas ur settings.json: 'mt5_paths' (lista) eller 'mt5_path'.
+    :return: Lista med sökvägar till terminal64.exe.
+    """
+    with open(path, "r") as file:
+        settings = json.load(file)
+    paths = settings.get("mt5_paths") or [settings["mt5_path"]]
+    return list(paths)
+
+
+def account_journal_file(journal_file, index):
+    """
+    Varje konto har en egen journal, t.ex. ladder_journal.1.jsonl för det andra kontot.
+    """
+    root, extension = os.path.splitext(journal_file)
+    return f"{root}.{index}{extension}"
+
+
+def _worker(index, terminal_path, commands, replies, barrier, journal_file, backend_factory):
+    """
+    Körs i en egen process per terminal, eftersom MetaTrader5-modulen bara kan vara
+    uppkopplad mot en terminal per process. Sessionen hålls uppe mellan stegarna.
+    """
+    import connection
+    import main
+    from journal import Journal, recover
+    from supervisor import LadderSupervisor
+
+    if backend_factory is not None:
+        connection.use_backend(backend_factory())
+    connection.connection.configure(path=terminal_path)
+    if not connection.ensure_connected():
+        replies.put((index, "ready", {"terminal": terminal_path, "error": "initialization failed"}))
+        return
+    connection.connection.start_health_check()
+
+    supervisor = LadderSupervisor()
+    recovered = recover(journal_file, supervisor)
+    if recovered is None:
+        # Utan avstämning mot journalen kan kontot redan ha en öppen stege, så inget läggs
+        replies.put((index, "ready", {"terminal": terminal_path, "error": "journal recovery failed"}))
+        connection.connection.shutdown()
+        return
+    journal = Journal(journal_file)
+    for ladder in recovered:
+        ladder.journal = journal
+    replies.put((index, "ready", {"terminal": terminal_path, "recovered": len(recovered)}))
+    # Övervakningen går i en tråd så att arbetaren kan ta emot nästa stege under tiden
+    if recovered:
+        supervisor.start()
+    try:
+        while True:
+            command, payload = commands.get()
+            if command == "stop":
+                break
+            if command == "plan":
+                replies.put((index, "plan", main.plan(payload)))
+            elif command == "status":
+                replies.put((index, "status", {"terminal": terminal_path, "ladders": len(supervisor.ladders)}))
+            elif command == "place":
+                replies.put((index, "placed", _place(terminal_path, payload, barrier, journal, supervisor)))
+    finally:
+        journal.close()
+        connection.connection.shutdown()
+
+
+def _place(terminal_path, payload, barrier, journal, supervisor):
+    import main
+    from connection import mt5
+
+    symbol, ladder_plan = payload
+    # Allt som går att räkna ut i förväg görs före barriären, så att bara order_send återstår
+    prepared = main.prepare_planned_ladder(symbol, ladder_plan)
+    if prepared is None:
+        # Inget konto lägger stegen om ett av dem inte kan
+        barrier.abort()
+        return {"terminal": terminal_path, "filled": False, "error": "prepare failed"}
+    try:
+        barrier.wait(BARRIER_TIMEOUT)
+    except threading.BrokenBarrierError:
+        return {"terminal": terminal_path, "filled": False, "error": "another account could not place the ladder"}
+
+    report = main.submit_planned_ladder(prepared, journal)
+    initial = report["initial"]
+    filled = initial is not None and initial.retcode == mt5.TRADE_RETCODE_DONE
+    if filled:
+        supervisor.register(prepared["ladder"])
+        supervisor.start()
+    return {
+        "terminal": terminal_path,
+        "filled": filled,
+        "retcode": None if initial is None else initial.retcode,
+        "price": None if initial is None else initial.price,
+        "filled_at": report["filled_at"],
+        "latency": report["latency"]["initial"],
+        "magic": prepared["ladder"].magic,
+    }
+
+
+class MirrorPool:
+    """
+    En långlivad arbetarprocess per terminal/konto. En stege planeras i den första
+    arbetaren och skickas sedan till alla samtidigt. Arbetarna förbereder sina requests,
+    väntar på varandra vid en barriär och skickar sedan, så att kontona fylls så nära
+    varandra i tid som möjligt.
+    """
+
+    def __init__(self, terminal_paths, journal_file=None, backend_factory=None):
+        """
+        :param terminal_paths: Sökväg till terminal64.exe per konto.
+        :param journal_file: Journal som varje kontos egen journal namnges efter, standard settings.JOURNAL_FILE.
+        :param backend_factory: Funktion som skapar backenden i varje arbetare, t.ex. en
+                                fake_mt5.FakeTerminal. None betyder MetaTrader5.
+        """
+        if journal_file is None:
+            from settings import JOURNAL_FILE
+            journal_file = JOURNAL_FILE
+        self.terminal_paths = list(terminal_paths)
+        self.journal_file = journal_file
+        self.backend_factory = backend_factory
+        # spawn fungerar likadant på Windows, där terminalerna körs
+        self._context = multiprocessing.get_context("spawn")
+        self._replies = self._context.Queue()
+        self._barrier = self._context.Barrier(len(self.terminal_paths))
+        self._commands = []
+        self._processes = []
+
+    def start(self, timeout=60.0):
+        """
+        Startar arbetarna och väntar tills alla är uppkopplade.
+        :return: Lista med status per terminal, eller None om någon inte kunde koppla upp.
+        """
+        for index, path in enumerate(self.terminal_paths):
+            commands = self._context.Queue()
+            process = self._context.Process(
+                target=_worker, name=f"mirror-{index}",
+                args=(index, path, commands, self._replies, self._barrier,
+                      account_journal_file(self.journal_file, index), self.backend_factory),
+                daemon=True,
+            )
+            process.start()
+            self._commands.append(commands)
+            self._processes.append(process)
+        statuses = self._collect("ready", range(len(self._processes)), timeout)
+        if statuses is None:
+            return None
+        for status in statuses:
+            if "error" in status:
+                print(f"Terminal {status['terminal']}: {status['error']}")
+                return None
+        return statuses
+
+    def _collect(self, kind, indexes, timeout):
+        indexes = list(indexes)
+        replies = {}
+        deadline = time.monotonic() + timeout
+        while len(replies) < len(indexes):
+            try:
+                index, reply_kind, payload = self._replies.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                missing = [self.terminal_paths[i] for i in indexes if i not in replies]
+                print(f"No {kind} reply from {missing} within {timeout} s.")
+                return None
+            if reply_kind == kind:
+                replies[index] = payload
+        return [replies[i] for i in indexes]
+
+    def plan(self, symbol, timeout=60.0):
+        """
+        Planerar stegen i den första arbetaren, med dess spread och pipvärde.
+        :return: Dictionary från main.plan, eller None vid fel.
+        """
+        self._commands[0].put(("plan", symbol))
+        replies = self._collect("plan", [0], timeout)
+        return None if replies is None else replies[0]
+
+    def place(self, symbol, ladder_plan, timeout=60.0):
+        """
+        Skickar stegen till alla arbetare samtidigt.
+        :return: Lista med en rapport per terminal (filled, price, filled_at, latency), eller None.
+        """
+        for commands in self._commands:
+            commands.put(("place", (symbol, ladder_plan)))
+        reports = self._collect("placed", range(len(self._commands)), timeout)
+        if self._barrier.broken:
+            self._barrier.reset()
+        return reports
+
+    def status(self, timeout=10.0):
+        for commands in self._commands:
+            commands.put(("status", None))
+        return self._collect("status", range(len(self._commands)), timeout)
+
+    def wait_until_idle(self, interval=5.0):
+        """
+        Väntar tills ingen arbetare har några stegar kvar att övervaka.
+        """
+        while True:
+            statuses = self.status()
+            if statuses is None or all(status["ladders"] == 0 for status in statuses):
+                return
+            time.sleep(interval)
+
+    def close(self, timeout=10.0):
+        for commands in self._commands:
+            commands.put(("stop", None))
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+def fill_skew(reports):
+    """
+    Tidsskillnaden mellan kontonas fyllningar.
+    :return: (skew i sekunder mellan första och sista fyllningen, förskjutning per rapport
+             i sekunder räknat från den första), eller (None, []) om färre än två fylldes.
+    """
+    times = [report["filled_at"] for report in reports if report.get("filled")]
+    if len(times) < 2:
+        return None, []
+    first = min(times)
+    offsets = [report["filled_at"] - first if report.get("filled") else None for report in reports]
+    return max(times) - first, offsets
+
+
+def print_fill_report(reports):
+    skew, offsets = fill_skew(reports)
+    offsets = offsets or [None] * len(reports)
+    rows = [
+        [report["terminal"], "ja" if report.get("filled") else report.get("error", report.get("retcode")),
+         report.get("price"), None if report.get("latency") is None else report["latency"] * 1000,
+         None if offset is None else offset * 1000]
+        for report, offset in zip(reports, offsets)
+    ]
+    print_table(["Terminal", "Fylld", "Pris", "Latens ms", "Skew ms"], rows,
+                formats={"Pris": ".5f", "Latens ms": ".1f", "Skew ms": ".1f"})
+    if skew is not None:
+        print(f"Fill skew mellan kontona: {skew * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lägg samma stege på flera konton samtidigt, en process per terminal.")
+    parser.add_argument("--symbol", default="EURUSD")
+    parser.add_argument("--terminal", action="append",
+                        help="Sökväg till terminal64.exe, anges en gång per konto. Standard är settings.json.")
+    parser.add_argument("--settings", default="settings.json")
+    args = parser.parse_args(argv)
+
+    from main import print_break_even_tables, print_margin_of_safety
+    from order_execution import confirm_execution
+
+    paths = args.terminal or load_terminal_paths(args.settings)
+    pool = MirrorPool(paths)
+    try:
+        if pool.start() is None:
+            return 1
+        ladder_plan = pool.plan(args.symbol)
+        if ladder_plan is None:
+            print("Failed to plan the ladder.")
+            return 1
+        print_break_even_tables(ladder_plan)
+        print_margin_of_safety(ladder_plan)
+        if not confirm_execution():
+            print("Orderläggning avbruten.")
+            return 0
+        reports = pool.place(args.symbol, ladder_plan)
+        if reports is None:
+            return 1
+        print_fill_report(reports)
+        pool.wait_until_idle()
+        return 0 if all(report.get("filled") for report in reports) else 1
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
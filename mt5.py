@@ -1,7 +1,4 @@
-import MetaTrader5 as mt5
-
-if not mt5.initialize():
-    print("MetaTrader 5 initialization failed. Ensure that the terminal is running and properly configured.")
+from connection import mt5
 
 symbol = "GBPJPY"
 
@@ -0,0 +1,200 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from backtest import load_ticks, run_backtest
+
+# Standardrymd runt värdena i settings.py
+DEFAULT_SPACE = {
+    "top_up_levels": [[25, 40, 55], [30, 45, 60], [35, 50, 65], [40, 55, 70], [45, 60, 75]],
+    "initial_stop_level": [20, 30, 40, 50],
+    "number_of_pips": [60, 80, 100, 150],
+    "target_gain_percent": [10, 25, 50],
+}
+
+# Tickdata per arbetsprocess, laddas en gång i _init_worker
+_ticks = None
+_backtest_args = None
+
+
+def config_key(config):
+    return json.dumps(config, sort_keys=True)
+
+
+def expand_space(space):
+    """
+    Alla kombinationer i sökrymden. Top-up-nivåerna måste vara strikt stigande.
+    :return: Lista med konfigurationer (dictionaries).
+    """
+    names = sorted(space)
+    configs = []
+    for values in itertools.product(*[space[name] for name in names]):
+        config = dict(zip(names, values))
+        levels = config.get("top_up_levels")
+        if levels is not None and any(a >= b for a, b in zip(levels, levels[1:])):
+            continue
+        configs.append(config)
+    return configs
+
+
+def _init_worker(ticks_path, backtest_args):
+    global _ticks, _backtest_args
+    _ticks = load_ticks(ticks_path)
+    _backtest_args = backtest_args
+
+
+def _evaluate(config, tick_count):
+    """
+    Kör en backtest på de första tick_count ticksen i arbetsprocessen.
+    """
+    times, bids, asks = _ticks
+    result = run_backtest(times[:tick_count], bids[:tick_count], asks[:tick_count], overrides=dict(config),
+                          **_backtest_args)
+    return result["summary"]
+
+
+def dominates(a, b):
+    """
+    True om a är minst lika bra som b på avkastning, drawdown och break-even-andel, och bättre på något.
+    """
+    at_least = (a["return_percent"] >= b["return_percent"] and a["max_drawdown_percent"] <= b["max_drawdown_percent"]
+                and a["break_even_hit_rate"] >= b["break_even_hit_rate"])
+    better = (a["return_percent"] > b["return_percent"] or a["max_drawdown_percent"] < b["max_drawdown_percent"]
+              or a["break_even_hit_rate"] > b["break_even_hit_rate"])
+    return at_least and better
+
+
+def prune(summaries, keep_fraction):
+    """
+    Successive halving: konfigurationer som domineras av någon annan släpps,
+    och av resten behålls de bästa keep_fraction efter avkastning (minst en).
+    :param summaries: Dictionary {nyckel: sammanfattning från run_backtest}.
+    :return: Nycklarna som går vidare till nästa steg.
+    """
+    # En stege som inte kan läggas senare i datan (t.ex. för lite marginal) är ett giltigt, dåligt resultat,
+    # men utan en enda stege finns inget att jämföra
+    valid = {key: summary for key, summary in summaries.items() if summary["ladders"] > 0}
+    front = [key for key, summary in valid.items()
+             if not any(dominates(other, summary) for other_key, other in valid.items() if other_key != key)]
+    front.sort(key=lambda key: valid[key]["return_percent"], reverse=True)
+    keep = max(1, int(round(len(valid) * keep_fraction)))
+    return front[:keep]
+
+
+def _load_checkpoint(path):
+    """
+    :return: Dictionary {(nyckel, tick_count): sammanfattning} från tidigare körningar.
+    """
+    done = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # En halvskriven sista rad från ett avbrott räknas inte
+                continue
+            done[(record["key"], record["ticks"])] = record["summary"]
+    return done
+
+
+def optimize(ticks_path, space=None, rungs=(0.25, 0.5, 1.0), keep_fraction=0.5, checkpoint=None, workers=None,
+             **backtest_args):
+    """
+    Söker bland konfigurationerna med successive halving: alla körs på den första delen av
+    tickdatan, de som inte domineras och ligger bäst till körs vidare på mer data.
+    :param ticks_path: Tickfil som backtest.load_ticks kan läsa.
+    :param space: Sökrymd, se DEFAULT_SPACE.
+    :param rungs: Andel av tickdatan i varje steg, sista steget bör vara 1.0.
+    :param keep_fraction: Andel som behålls mellan stegen.
+    :param checkpoint: JSONL-fil där varje färdig körning sparas, så att ett avbrutet sökande kan fortsätta.
+    :param workers: Antal processer, None betyder alla kärnor.
+    :param backtest_args: Skickas till run_backtest (symbol, symbol_spec, leverage, restart_ticks).
+    :return: Lista med (konfiguration, sammanfattning, tick_count) sorterad efter avkastning,
+             där konfigurationer som klarat flest steg kommer först. summary['error'] anger om
+             backtesten avbröts innan tickdatan tog slut.
+    """
+    configs = {config_key(config): config for config in expand_space(space or DEFAULT_SPACE)}
+    total_ticks = len(load_ticks(ticks_path)[0])
+    done = _load_checkpoint(checkpoint)
+    reached = {}
+    alive = list(configs)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(ticks_path, backtest_args)) as pool:
+        for rung_number, fraction in enumerate(rungs):
+            tick_count = max(1, int(total_ticks * fraction))
+            summaries = {key: done[(key, tick_count)] for key in alive if (key, tick_count) in done}
+            futures = {pool.submit(_evaluate, configs[key], tick_count): key for key in alive if key not in summaries}
+            with open(checkpoint, "a") if checkpoint else open(os.devnull, "w") as log:
+                for future in as_completed(futures):
+                    key = futures[future]
+                    summaries[key] = future.result()
+                    log.write(json.dumps({"key": key, "ticks": tick_count, "summary": summaries[key]}) + "\n")
+                    log.flush()
+            print(f"Rung {rung_number + 1}/{len(rungs)}: {len(summaries)} configurations on {tick_count} ticks "
+                  f"({len(futures)} evaluated, {len(summaries) - len(futures)} from checkpoint)")
+            for key, summary in summaries.items():
+                reached[key] = (summary, tick_count)
+            if rung_number < len(rungs) - 1:
+                alive = prune(summaries, keep_fraction)
+
+    ranked = [(configs[key], summary, tick_count) for key, (summary, tick_count) in reached.items()]
+    ranked.sort(key=lambda row: (-row[2], row[1]["ladders"] == 0, -row[1]["return_percent"]))
+    return ranked
+
+
+def format_table(ranked, limit=None):
+    """
+    Rangordnad tabell med avkastning, max drawdown och break-even-andel per konfiguration.
+    """
+    lines = [f"{'#':>3}  {'top-ups':<12} {'stop':>5} {'pips':>5} {'target':>6} {'ticks':>9} {'ladders':>7} "
+             f"{'return %':>9} {'max DD %':>9} {'BE hit %':>9}"]
+    for rank, (config, summary, tick_count) in enumerate(ranked[:limit], start=1):
+        levels = "/".join(str(level) for level in config["top_up_levels"])
+        if summary["ladders"] == 0:
+            lines.append(f"{rank:>3}  {levels:<12} {config['initial_stop_level']:>5} {config['number_of_pips']:>5} "
+                         f"{config['target_gain_percent']:>6} {tick_count:>9}  {summary['error']}")
+            continue
+        lines.append(f"{rank:>3}  {levels:<12} {config['initial_stop_level']:>5} {config['number_of_pips']:>5} "
+                     f"{config['target_gain_percent']:>6} {tick_count:>9} {summary['ladders']:>7} "
+                     f"{summary['return_percent']:>9.2f} {summary['max_drawdown_percent']:>9.2f} "
+                     f"{summary['break_even_hit_rate'] * 100:>9.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Söker top-up-nivåer, initial stop, antal pips och vinstmål mot historiska ticks.")
+    parser.add_argument("ticks", help="Tickfil (.csv, .npy eller .npz) med time, bid och ask.")
+    parser.add_argument("--symbol", default="EURUSD")
+    parser.add_argument("--digits", type=int, default=5)
+    parser.add_argument("--contract-size", type=float, default=100000)
+    parser.add_argument("--tick-value", type=float, default=1.0)
+    parser.add_argument("--leverage", type=float, default=100)
+    parser.add_argument("--space", help="JSON-fil med sökrymden, standard är DEFAULT_SPACE.")
+    parser.add_argument("--rungs", default="0.25,0.5,1.0", help="Andel av tickdatan per steg.")
+    parser.add_argument("--keep", type=float, default=0.5, help="Andel som behålls mellan stegen.")
+    parser.add_argument("--checkpoint", default="optimizer_checkpoint.jsonl")
+    parser.add_argument("--workers", type=int, help="Antal processer, standard är alla kärnor.")
+    parser.add_argument("--top", type=int, default=20, help="Antal rader i tabellen.")
+    args = parser.parse_args(argv)
+
+    space = None
+    if args.space:
+        with open(args.space) as file:
+            space = json.load(file)
+    spec = {"digits": args.digits, "contract_size": args.contract_size, "tick_value": args.tick_value}
+    ranked = optimize(args.ticks, space=space, rungs=[float(value) for value in args.rungs.split(",")],
+                      keep_fraction=args.keep, checkpoint=args.checkpoint, workers=args.workers,
+                      symbol=args.symbol, symbol_spec=spec, leverage=args.leverage)
+    print(format_table(ranked, args.top))
+
+
+if __name__ == "__main__":
+    main()
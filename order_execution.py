@@ -1,6 +1,10 @@
-import MetaTrader5 as mt5
+from connection import mt5
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from polling import AdaptivePoller, distance_to_trigger_pips
+from symbol_cache import get_static_info
 
 # Konfigurera loggning
 logging.basicConfig(
@@ -15,7 +19,7 @@ def points_per_pip(symbol):
     :param symbol: Symbolens namn.
     :return: Points per pip.
     """
-    symbol_info = mt5.symbol_info(symbol)
+    symbol_info = get_static_info(symbol)
     if not symbol_info:
         print(f"Failed to retrieve symbol info for {symbol}.")
         return None
@@ -29,14 +33,10 @@ def points_per_pip(symbol):
         print(f"Unexpected digit format for {symbol}. Defaulting to 1.")
         return 1
 
-def place_order(symbol, lot_size, order_type, price=None, sl=None, tp=None):
+def build_order_request(symbol, lot_size, order_type, price=None, sl=None, tp=None, magic=0):
     """
-    Lägg en order på MetaTrader 5-plattformen med valfria SL och TP.
+    Bygger request-dictionaryn för mt5.order_send utan att skicka den.
     """
-    if not mt5.symbol_select(symbol, True):
-        print(f"Failed to select symbol {symbol}. Exiting.")
-        return None
-
     request = {
         "action": mt5.TRADE_ACTION_DEAL if order_type in ['BUY', 'SELL'] else mt5.TRADE_ACTION_PENDING,
         "symbol": symbol,
@@ -46,7 +46,7 @@ def place_order(symbol, lot_size, order_type, price=None, sl=None, tp=None):
         "price": price,
         "tp": tp,
         "deviation": 10,
-        "magic": 0,
+        "magic": magic,
         "comment": "DA",
         "type_filling": mt5.ORDER_FILLING_IOC,
     }
@@ -54,23 +54,128 @@ def place_order(symbol, lot_size, order_type, price=None, sl=None, tp=None):
     # Lägg endast till 'sl' om det är satt
     if sl is not None:
         request["sl"] = sl
+    return request
 
-    print("Order Request:", request)  # Debugga begäran
-
-    # Skicka ordern
+def send_order_request(request):
+    """
+    Skickar en färdigbyggd request och skriver ut resultatet.
+    """
     result = mt5.order_send(request)
     if result is None:
         print("Order Send Failed:", mt5.last_error())
         return None
 
-    if result.retcode == mt5.TRADE_RETCODE_DONE:
+    if result.retcode in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_PLACED):
         print(f"Order utförd: {result}")
     else:
         print(f"Order misslyckades: {result}")
     return result
 
+def place_order(symbol, lot_size, order_type, price=None, sl=None, tp=None, magic=0):
+    """
+    Lägg en order på MetaTrader 5-plattformen med valfria SL och TP.
+    :param magic: Magic number som identifierar stegen, används av supervisor.LadderSupervisor.
+    """
+    if not mt5.symbol_select(symbol, True):
+        print(f"Failed to select symbol {symbol}. Exiting.")
+        return None
+
+    request = build_order_request(symbol, lot_size, order_type, price, sl, tp, magic)
+    print("Order Request:", request)  # Debugga begäran
+
+    # Skicka ordern
+    return send_order_request(request)
+
+def prepare_ladder(symbol, initial_lot_size, current_price, sl_price, tp_price, stop_lot_sizes, entry_levels, magic=0):
+    """
+    Validerar och bygger alla requests för en stege innan något skickas.
+    :param symbol: Symbolens namn.
+    :param initial_lot_size: Lot size för den initiala marknadsordern.
+    :param current_price: Aktuellt ask-pris för den initiala ordern.
+    :param sl_price: SL för den initiala ordern.
+    :param tp_price: TP för alla ordrar i stegen.
+    :param stop_lot_sizes: Lot size per stop-order.
+    :param entry_levels: Entry-pris per stop-order.
+    :param magic: Magic number för stegen.
+    :return: Dictionary med 'initial' och 'stops' (requests), eller None om stegen inte kan byggas.
+    """
+    if len(stop_lot_sizes) != len(entry_levels):
+        print("Antalet lot sizes och entry-nivåer för stop-ordrarna stämmer inte överens.")
+        return None
+    if not mt5.symbol_select(symbol, True):
+        print(f"Failed to select symbol {symbol}. Exiting.")
+        return None
+
+    initial_volume = adjust_volume(initial_lot_size, symbol)
+    if initial_volume is None:
+        print(f"Failed to adjust volume for {symbol}. Skipping ladder.")
+        return None
+    ladder = {
+        "initial": build_order_request(symbol, initial_volume, 'BUY', current_price, sl_price, tp_price, magic),
+        "stops": [],
+    }
+    for i, (lot_size, entry_price) in enumerate(zip(stop_lot_sizes, entry_levels)):
+        volume = adjust_volume(lot_size, symbol)
+        if volume is None:
+            print(f"Failed to adjust volume for Stop {i + 1}. Skipping.")
+            continue
+        # Stop-ordrar läggs utan SL, den sätts till break-even när de aktiveras
+        ladder["stops"].append(build_order_request(symbol, volume, 'BUY_STOP', entry_price, None, tp_price, magic))
+    return ladder
+
+def _timed_send(request):
+    start = time.perf_counter()
+    result = send_order_request(request)
+    return result, time.perf_counter() - start
+
+def submit_ladder(ladder, max_workers=None):
+    """
+    Skickar en förberedd stege: först marknadsordern, och när den är bekräftad
+    alla stop-ordrar parallellt via en trådpool.
+    :param ladder: Resultatet från prepare_ladder.
+    :param max_workers: Antal trådar för stop-ordrarna, standard en per order.
+    :return: Dictionary med resultat, latens i sekunder per order och för hela stegen,
+             och filled_at (time.time() när initialordern besvarades).
+    """
+    start = time.perf_counter()
+    initial_result, initial_latency = _timed_send(ladder["initial"])
+    report = {
+        "initial": initial_result,
+        "stops": [],
+        "latency": {"initial": initial_latency, "stops": [], "ladder": None},
+        # Väggklocka när initialordern besvarades, för att jämföra konton i olika processer
+        "filled_at": time.time(),
+    }
+    if initial_result is None or initial_result.retcode != mt5.TRADE_RETCODE_DONE:
+        print("Initial order not filled. Stop orders are not sent.")
+        report["latency"]["ladder"] = time.perf_counter() - start
+        return report
+
+    stops = ladder["stops"]
+    if stops:
+        with ThreadPoolExecutor(max_workers=max_workers or len(stops)) as executor:
+            for result, latency in executor.map(_timed_send, stops):
+                report["stops"].append(result)
+                report["latency"]["stops"].append(latency)
+    report["latency"]["ladder"] = time.perf_counter() - start
+
+    logging.info(
+        "Ladder %s submitted: initial %.1f ms, stops %s ms, total %.1f ms",
+        ladder["initial"]["symbol"], initial_latency * 1000,
+        [round(latency * 1000, 1) for latency in report["latency"]["stops"]],
+        report["latency"]["ladder"] * 1000,
+    )
+    return report
+
+def remove_order(ticket, symbol):
+    """
+    Tar bort en väntande order, t.ex. en stop-order i en stege som avbryts.
+    :return: Resultatet från order_send, eller None om terminalen inte svarade.
+    """
+    return send_order_request({"action": mt5.TRADE_ACTION_REMOVE, "order": ticket, "symbol": symbol})
+
 def adjust_volume(volume, symbol):
-    symbol_info = mt5.symbol_info(symbol)
+    symbol_info = get_static_info(symbol)
     if not symbol_info:
         print(f"Failed to retrieve symbol info for {symbol}.")
         return None
@@ -135,15 +240,25 @@ def confirm_execution():
         else:
             print("Ogiltigt svar. Skriv 'Y' för ja eller 'n' för nej.")
 
-def monitor_positions(symbol, entry_price, break_even_price, levels, point, points_per_pip_value):
+def monitor_positions(symbol, entry_price, break_even_price, levels, point, points_per_pip_value, poller=None):
     """
     Övervaka positioner och uppdatera SL till break-even när stop-orders aktiveras.
+    Väntetiden mellan kontrollerna anpassas efter avståndet till nästa entry-nivå
+    eller break-even-priset, se polling.AdaptivePoller.
     """
+    # Importeras här eftersom sl_manager själv använder update_sl
+    from sl_manager import manager as sl_updates
+
+    if poller is None:
+        poller = AdaptivePoller()
+
     print("Startar övervakning...")
+    break_even_active = False
     while True:
         positions = mt5.positions_get(symbol=symbol)
         if positions is None:
             print(f"Failed to get positions for {symbol}. Retrying...")
+            poller.wait_after_error()
             continue
 
         # Kontrollera aktiva ordrar
@@ -153,34 +268,51 @@ def monitor_positions(symbol, entry_price, break_even_price, levels, point, poin
             break
 
         # Kontrollera om en ny stop-order har aktiverats
-        for pos in active_positions:
-            if pos.price_open > entry_price and pos.sl == 0:
-                # Uppdatera SL för alla positioner till break-even
-                new_sl = break_even_price
-                for position in active_positions:
-                    update_sl(position.ticket, new_sl, point, points_per_pip_value)
-                print(f"Uppdaterade SL till {new_sl} för alla aktiva positioner.")
-                break
+        if not break_even_active:
+            break_even_active = any(pos.price_open > entry_price and pos.sl == 0 for pos in active_positions)
+        if break_even_active:
+            # Uppdatera SL till break-even för de positioner som inte redan har den
+            for position in active_positions:
+                sl_updates.request(position, break_even_price, point)
+            if sl_updates.flush():
+                print(f"Uppdaterade SL till {break_even_price} för aktiva positioner.")
 
-        # Vänta innan nästa kontroll
-        time.sleep(1)
+        # Vänta innan nästa kontroll, kortare ju närmare nästa trigger priset är
+        current_price = active_positions[0].price_current
+        pending_levels = [level for level in levels if level > current_price]
+        distance = distance_to_trigger_pips(
+            current_price, pending_levels + [break_even_price], point, points_per_pip_value
+        )
+        poller.wait(distance)
 
-def update_sl(ticket, sl_price, point, points_per_pip_value):
+def update_sl(ticket, sl_price, point, points_per_pip_value, symbol=None):
     """
     Uppdaterar SL för en given position.
+    :param symbol: Positionens symbol. Om den saknas slås positionen upp via ticket.
+    :return: Resultatet från order_send, eller None om positionen inte hittades eller terminalen inte svarade.
     """
+    if symbol is None:
+        positions = mt5.positions_get(ticket=ticket)
+        if not positions:
+            print(f"Position {ticket} not found. Cannot update SL.")
+            return None
+        symbol = positions[0].symbol
+
     request = {
         "action": mt5.TRADE_ACTION_SLTP,
-        "symbol": mt5.symbol_info(ticket).symbol,
+        "symbol": symbol,
         "position": ticket,
         "sl": sl_price,
         "tp": None,  # TP påverkas inte
     }
     result = mt5.order_send(request)
-    if result.retcode != mt5.TRADE_RETCODE_DONE:
+    if result is None:
+        print(f"Misslyckades att uppdatera SL för ticket {ticket}. {mt5.last_error()}")
+    elif result.retcode != mt5.TRADE_RETCODE_DONE:
         print(f"Misslyckades att uppdatera SL för ticket {ticket}. Retcode: {result.retcode}")
     else:
         print(f"Uppdaterade SL för ticket {ticket} till {sl_price}")
+    return result
 
 def adjust_pips_for_digits(symbol, pips):
     """
@@ -193,7 +325,7 @@ def adjust_pips_for_digits(symbol, pips):
     :param pips: Antalet pips att justera.
     :return: Justerat antal pips.
     """
-    symbol_info = mt5.symbol_info(symbol)
+    symbol_info = get_static_info(symbol)
     if not symbol_info:
         print(f"Failed to retrieve symbol info for {symbol}. Returning unadjusted pips.")
         return pips
@@ -0,0 +1,151 @@
+import threading
+
+import numpy as np
+
+from connection import mt5
+
+
+def points_per_pip_for_digits(digits):
+    """
+    Points per pip utifrån antal decimaler, samma regel som order_execution.points_per_pip.
+    """
+    return 10 if digits in (5, 3) else 1
+
+
+class PipValueService:
+    """
+    Pipvärde i kontovaluta för alla symboler från en valutamatris.
+    Matrisen rates[i, j] är priset för en enhet av valuta i uttryckt i valuta j och byggs
+    av mittkurserna för alla par med bas- och vinstvaluta. Valutor som saknar ett direkt
+    par mot kontovalutan räknas om via en mellanvaluta (t.ex. SEK -> EUR -> USD).
+    En ny tick uppdaterar bara sitt pars två celler och pipvärdena räknas om som en vektor,
+    så en fråga om pipvärdet är en uppslagning.
+    """
+
+    def __init__(self):
+        self.account_currency = None
+        self.currencies = []
+        self.rates = np.zeros((0, 0))
+        self._currency_index = {}
+        self._pairs = {}
+        self._symbol_index = {}
+        self._profit_index = np.zeros(0, dtype=np.int64)
+        self._pip_amount = np.zeros(0)
+        self.to_account = np.zeros(0)
+        self.pip_values = np.zeros(0)
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Bygger om matrisen från alla symboler i terminalen med ett enda symbols_get.
+        :return: True om matrisen kunde byggas.
+        """
+        account = mt5.account_info()
+        symbols = mt5.symbols_get()
+        if account is None or symbols is None:
+            print(f"Failed to get account or symbols for pip values. {mt5.last_error()}")
+            return False
+
+        currencies = sorted({account.currency} | {info.currency_profit for info in symbols} |
+                            {info.currency_base for info in symbols if info.currency_base != info.currency_profit})
+        currency_index = {currency: i for i, currency in enumerate(currencies)}
+        rates = np.full((len(currencies), len(currencies)), np.nan)
+        np.fill_diagonal(rates, 1.0)
+        pairs = {}
+        for info in symbols:
+            if info.currency_base != info.currency_profit:
+                pairs[info.name] = (currency_index[info.currency_base], currency_index[info.currency_profit])
+                _set_quote(rates, pairs[info.name], info.bid, info.ask)
+
+        with self._lock:
+            self.account_currency = account.currency
+            self.currencies = currencies
+            self.rates = rates
+            self._currency_index = currency_index
+            self._pairs = pairs
+            self._symbol_index = {info.name: i for i, info in enumerate(symbols)}
+            self._profit_index = np.array([currency_index[info.currency_profit] for info in symbols], dtype=np.int64)
+            # Vinsten för en pip och en lot i symbolens vinstvaluta
+            self._pip_amount = np.array([
+                info.trade_contract_size * info.point * points_per_pip_for_digits(info.digits) for info in symbols
+            ], dtype=float)
+            self._recompute()
+        return True
+
+    def _recompute(self):
+        account = self._currency_index[self.account_currency]
+        direct = self.rates[:, account]
+        # Via en mellanvaluta k: rates[i, k] * rates[k, account], största av de vägar som finns
+        via = np.fmax.reduce(self.rates * direct[np.newaxis, :], axis=1)
+        self.to_account = np.where(np.isnan(direct), via, direct)
+        self.pip_values = self._pip_amount * self.to_account[self._profit_index]
+
+    def on_tick(self, symbol, bid, ask):
+        """
+        Uppdaterar matrisen med en ny kurs. Symboler som inte är valutapar ignoreras.
+        """
+        pair = self._pairs.get(symbol)
+        if pair is None:
+            return
+        with self._lock:
+            if _set_quote(self.rates, pair, bid, ask):
+                self._recompute()
+
+    def pip_value(self, symbol):
+        """
+        Värdet av en pip för en lot i kontovaluta.
+        :return: Pipvärdet, eller None om symbolen är okänd eller saknar växelkurs.
+        """
+        i = self._symbol_index.get(symbol)
+        if i is None:
+            return None
+        value = float(self.pip_values[i])
+        return None if np.isnan(value) or value <= 0 else value
+
+    def conversion_symbols(self, symbol):
+        """
+        Paren som behövs för att räkna om symbolens vinstvaluta till kontovalutan, så att
+        de kan följas med ticks.
+        """
+        i = self._symbol_index.get(symbol)
+        if i is None:
+            return []
+        profit = int(self._profit_index[i])
+        account = self._currency_index[self.account_currency]
+        needed = {(profit, account), (account, profit)}
+        if np.isnan(self.rates[profit, account]):
+            # Via en mellanvaluta, den som _recompute valde
+            products = self.rates[profit, :] * self.rates[:, account]
+            if not np.all(np.isnan(products)):
+                pivot = int(np.nanargmax(products))
+                needed |= {(profit, pivot), (pivot, profit), (pivot, account), (account, pivot)}
+        return [name for name, pair in self._pairs.items() if pair in needed]
+
+
+def _set_quote(rates, pair, bid, ask):
+    if bid <= 0 or ask <= 0:
+        return False
+    mid = (bid + ask) / 2
+    base, profit = pair
+    if rates[base, profit] == mid:
+        return False
+    rates[base, profit] = mid
+    rates[profit, base] = 1 / mid
+    return True
+
+
+# Delad för hela processen
+service = PipValueService()
+
+
+def get_pip_value(symbol):
+    """
+    Pipvärdet i kontovaluta från den delade tjänsten. Matrisen byggs vid första anropet
+    och byggs om en gång om symbolen saknar kurs, t.ex. för att den nyss valts i Market Watch.
+    """
+    if service.account_currency is None and not service.refresh():
+        return None
+    pip_value = service.pip_value(symbol)
+    if pip_value is None and service.refresh():
+        pip_value = service.pip_value(symbol)
+    return pip_value
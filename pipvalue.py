@@ -1,17 +1,22 @@
+from connection import mt5, ensure_connected
+
+import pip_values
+from symbol_cache import get_symbol_info, invalidate
+
 
 def get_pip_value(symbol):
     """
     Hämtar pip-värdet för en given symbol från MetaTrader 5.
     :param symbol: Symbolens namn (t.ex. 'GBPJPY').
-    :return: Pip-värdet för symbolen.
+    :return: Pip-värdet för en lot i kontovaluta.
     """
-    # Anslut till MetaTrader 5
-    if not mt5.initialize():
+    # Anslut till MetaTrader 5 (återanvänder befintlig session)
+    if not ensure_connected():
         print("MetaTrader 5 initialization failed")
         return None
 
     # Hämta symbolinformation
-    symbol_info = mt5.symbol_info(symbol)
+    symbol_info = get_symbol_info(symbol)
     if symbol_info is None:
         print(f"Symbol {symbol} not found")
         return None
@@ -22,12 +27,11 @@ def get_pip_value(symbol):
         if not mt5.symbol_select(symbol, True):
             print(f"Failed to select symbol {symbol}")
             return None
+        invalidate(symbol)
+        symbol_info = get_symbol_info(symbol)
 
     # Inspektera symbolinformationen
     print(f"Symbol info for {symbol}: {symbol_info}")
 
-    # Beräkna pip-värde
-    pip_size = 0.01 if symbol_info.digits == 3 else 0.0001
-    pip_value = pip_size * symbol_info.trade_contract_size / symbol_info.point
-
-    return pip_value
\ No newline at end of file
+    # Pip-värde i kontovaluta, samma som main.get_pip_value
+    return pip_values.get_pip_value(symbol)
\ No newline at end of file
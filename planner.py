@@ -0,0 +1,145 @@
+import numpy as np
+
+
+def calculate_loss_in_dollars(initial_stop_percent, account_size):
+    """
+    Beräknar förlusten i dollar för den första traden.
+    Fungerar både för skalärer och NumPy-arrayer.
+    :param initial_stop_percent: Procent av kontot som riskeras.
+    :param account_size: Totalt kontosaldo.
+    :return: Förlust i dollar.
+    """
+    return (np.asarray(initial_stop_percent, dtype=float) / 100) * account_size
+
+
+def calculate_initial_lot_size(loss_in_dollars, initial_stop_level, pip_value):
+    """
+    Beräknar initial lot size för den första traden (marknadsorder).
+    :param loss_in_dollars: Förlusten i dollar för traden.
+    :param initial_stop_level: Antal pips till breakeven-nivån.
+    :param pip_value: Pipvärdet i kontovaluta.
+    :return: Initial lot size avrundad till två decimaler.
+    """
+    lot_size = np.asarray(loss_in_dollars, dtype=float) / (np.asarray(initial_stop_level) * pip_value)
+    return np.round(lot_size, 2)
+
+
+def calculate_pip_gain(number_of_pips, spread_in_pips, *top_up_levels):
+    """
+    Beräknar pip gain för initial order och stop orders.
+    Samma nycklar som tidigare i main.py ('initial', 'stop_1' ... 'stop_N'), men värdena
+    kan vara arrayer och antalet top up-nivåer är valfritt.
+    """
+    number_of_pips = np.asarray(number_of_pips, dtype=float)
+    pip_gains = {'initial': np.round(number_of_pips - spread_in_pips, 2)}
+    for i, level in enumerate(top_up_levels, start=1):
+        pip_gains[f'stop_{i}'] = np.round(number_of_pips * (1 - (np.asarray(level) / 100)) - spread_in_pips, 2)
+    return pip_gains
+
+
+def calculate_gain_in_dollars(lot_size, pip_gain, pip_value):
+    """
+    Beräknar gain in $ för en given order.
+    :param lot_size: Lot storlek.
+    :param pip_gain: Pip gain.
+    :param pip_value: Pip värde.
+    :return: Gain in $.
+    """
+    return np.asarray(lot_size, dtype=float) * pip_gain * pip_value
+
+
+def plan_ladders(symbols, pip_values, spreads_in_pips, account_size, target_gain_percent,
+                 number_of_pips, initial_stop_percent, initial_stop_level, top_up_levels):
+    """
+    Räknar ut hela stegen (lot sizes, pip gains, gain in $ och break-even-tabeller)
+    för alla symboler och alla parameteruppsättningar i ett enda NumPy-pass.
+
+    Symbolerna ligger på axel 0 och parameteruppsättningarna på axel 1, så
+    resultatet har formen (antal symboler, antal varianter, ...).
+
+    :param symbols: Lista med symbolnamn (längd S).
+    :param pip_values: Pipvärde per symbol, form (S,).
+    :param spreads_in_pips: Spread i pips per symbol, form (S,).
+    :param account_size: Kontostorlek, skalär eller form (V,).
+    :param target_gain_percent: Målvinst i procent, skalär eller form (V,).
+    :param number_of_pips: Antal pips till TP, skalär eller form (V,).
+    :param initial_stop_percent: Procent av kontot som riskeras, skalär eller form (V,).
+    :param initial_stop_level: Initial stop i pips, skalär eller form (V,).
+    :param top_up_levels: Top up-nivåer i procent, form (N,) eller (V, N) för N top ups.
+    :return: Dictionary med arrayer, se nycklarna nedan. Sista axeln har N + 1 rader
+             (initial och stop 1..N), summorna i break_even har N (tabell 1..N).
+    """
+    symbols = list(symbols)
+    pip_value = np.asarray(pip_values, dtype=float).reshape(-1, 1)
+    spread = np.asarray(spreads_in_pips, dtype=float).reshape(-1, 1)
+    if pip_value.shape[0] != len(symbols) or spread.shape[0] != len(symbols):
+        raise ValueError("pip_values and spreads_in_pips must have one value per symbol")
+
+    # Parametrar läggs på axel 1 så att de broadcastas mot symbolerna
+    account_size = np.atleast_1d(np.asarray(account_size, dtype=float))[np.newaxis, :]
+    target_gain_percent = np.atleast_1d(np.asarray(target_gain_percent, dtype=float))[np.newaxis, :]
+    number_of_pips = np.atleast_1d(np.asarray(number_of_pips, dtype=float))[np.newaxis, :]
+    initial_stop_percent = np.atleast_1d(np.asarray(initial_stop_percent, dtype=float))[np.newaxis, :]
+    initial_stop_level = np.atleast_1d(np.asarray(initial_stop_level, dtype=float))[np.newaxis, :]
+    top_up_levels = np.atleast_2d(np.asarray(top_up_levels, dtype=float))
+    if top_up_levels.ndim != 2 or top_up_levels.shape[-1] < 1:
+        raise ValueError("top_up_levels must have at least one level per variant")
+    # Form (1, V, N) så att nivåerna ligger på sista axeln
+    levels = top_up_levels[np.newaxis, :, :]
+    pips = number_of_pips[..., np.newaxis]
+
+    loss_in_dollars = calculate_loss_in_dollars(initial_stop_percent, account_size)
+    initial_lot_size = calculate_initial_lot_size(loss_in_dollars, initial_stop_level, pip_value)
+    gain_initial_pips = np.round(number_of_pips - spread, 2)
+    gain_stop_pips = np.round(pips * (1 - levels / 100) - spread[..., np.newaxis], 2)
+    gain_initial_pips = np.broadcast_to(gain_initial_pips[..., np.newaxis], gain_stop_pips.shape[:-1] + (1,))
+    pip_gains = np.concatenate([gain_initial_pips, gain_stop_pips], axis=-1)
+
+    total_gain = (account_size * target_gain_percent) / 100
+    gain_initial = calculate_gain_in_dollars(initial_lot_size, pip_gains[..., 0], pip_value)
+
+    # Resterande målvinst fördelas på stop-ordrarna i proportion till top up-nivåerna
+    remaining = (total_gain - gain_initial)[..., np.newaxis]
+    gain_stops = remaining * levels / levels.sum(axis=-1, keepdims=True)
+    gain_in_dollars = np.concatenate([gain_initial[..., np.newaxis], gain_stops], axis=-1)
+
+    # Break even - grundläggande variabler (samma formler som main.py):
+    # första stoppet t1 / pips, övriga pips / (t / 10)
+    pips_stops = pips / (levels / 10)
+    pips_stops[..., 0] = levels[..., 0] / number_of_pips
+    pips_stops = np.broadcast_to(pips_stops, gain_stops.shape)
+
+    lots_stops = gain_stops / (pip_gains[..., 1:] * pip_value[..., np.newaxis])
+    lots = np.concatenate([np.broadcast_to(initial_lot_size, gain_initial.shape)[..., np.newaxis], lots_stops], axis=-1)
+
+    # Nivåer: stop k ligger på pips_stop k + 1 (det sista på sitt eget), initial som stop 1
+    count = levels.shape[-1]
+    next_stop = np.minimum(np.arange(1, count + 1), count - 1)
+    level = pips_stops[..., next_stop]
+    level = np.concatenate([level[..., :1], level], axis=-1)
+    spread_cost = lots * spread[..., np.newaxis] * pip_value[..., np.newaxis]
+    pip_gain_rows = np.concatenate([level[..., :1], pips_stops - level[..., 1:]], axis=-1)
+    sign = np.ones(count + 1)
+    sign[1:] = -1.0
+    result = lots * pip_gain_rows * pip_value[..., np.newaxis] * sign
+
+    # Tabell n (n = 1..N) visar rad 0..n och summor över samma rader, alla i ett pass med cumsum
+    return {
+        "symbols": symbols,
+        "loss_in_dollars": np.broadcast_to(loss_in_dollars, gain_initial.shape),
+        "initial_lot_size": np.broadcast_to(initial_lot_size, gain_initial.shape),
+        "pip_gains": pip_gains,
+        "total_gain": np.broadcast_to(total_gain, gain_initial.shape),
+        "gain_in_dollars": gain_in_dollars,
+        "total_gain_actual": gain_in_dollars.sum(axis=-1),
+        "break_even": {
+            "level": level,
+            "spread": spread_cost,
+            "lots": lots,
+            "pip_gain": pip_gain_rows,
+            "result": result,
+            "total_spread": np.cumsum(spread_cost, axis=-1)[..., 1:],
+            "total_pip_gain": np.cumsum(pip_gain_rows, axis=-1)[..., 1:],
+            "total_result": np.cumsum(result, axis=-1)[..., 1:],
+        },
+    }
@@ -0,0 +1,96 @@
+import time
+
+import metrics
+
+
+class AdaptivePoller:
+    """
+    Bestämmer hur länge övervakningen ska vänta mellan två anrop till terminalen.
+    Nära nästa trigger (entry-nivå eller break-even) pollas det snabbt, långt bort
+    pollas det glest. Vid API-fel används exponentiell backoff.
+    """
+
+    def __init__(self, fast_interval=0.05, slow_interval=2.0, near_pips=3.0, far_pips=30.0,
+                 error_interval=0.5, max_error_interval=30.0, sleep=time.sleep, on_cycle=None):
+        """
+        :param fast_interval: Väntetid i sekunder när priset är inom near_pips från en trigger.
+        :param slow_interval: Väntetid i sekunder när priset är längre bort än far_pips.
+        :param near_pips: Avstånd i pips där snabb polling börjar.
+        :param far_pips: Avstånd i pips där långsam polling börjar.
+        :param error_interval: Första väntetiden efter ett misslyckat anrop.
+        :param max_error_interval: Tak för backoff vid upprepade fel.
+        :param on_cycle: Anropas med tiden i sekunder som ett varv tog, utan väntetiden.
+                         Standard är metrics.observe_monitor_cycle.
+        """
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.near_pips = near_pips
+        self.far_pips = far_pips
+        self.error_interval = error_interval
+        self.max_error_interval = max_error_interval
+        self._sleep = sleep
+        self._on_cycle = on_cycle if on_cycle is not None else metrics.observe_monitor_cycle
+        self._woke_at = None
+        self.consecutive_errors = 0
+
+    def interval_for_distance(self, distance_pips):
+        """
+        Väntetid för ett givet avstånd till närmaste trigger.
+        Mellan near_pips och far_pips interpoleras väntetiden linjärt.
+        """
+        if distance_pips is None:
+            return self.slow_interval
+        if distance_pips <= self.near_pips:
+            return self.fast_interval
+        if distance_pips >= self.far_pips:
+            return self.slow_interval
+        share = (distance_pips - self.near_pips) / (self.far_pips - self.near_pips)
+        return self.fast_interval + share * (self.slow_interval - self.fast_interval)
+
+    def error_delay(self):
+        """
+        Väntetid efter ett fel, dubblas för varje fel i rad.
+        """
+        delay = self.error_interval * (2 ** (self.consecutive_errors - 1))
+        return min(delay, self.max_error_interval)
+
+    def wait(self, distance_pips):
+        """
+        Sover fram till nästa kontroll efter ett lyckat anrop.
+        """
+        self.consecutive_errors = 0
+        delay = self.interval_for_distance(distance_pips)
+        self._sleep_between_cycles(delay)
+        return delay
+
+    def wait_after_error(self):
+        """
+        Sover med exponentiell backoff efter ett misslyckat anrop.
+        """
+        self.consecutive_errors += 1
+        delay = self.error_delay()
+        self._sleep_between_cycles(delay)
+        return delay
+
+    def _sleep_between_cycles(self, delay):
+        # Varvet räknas från förra uppvaknandet till nu, första varvet har ingen start
+        if self._woke_at is not None:
+            self._on_cycle(time.perf_counter() - self._woke_at)
+        self._sleep(delay)
+        self._woke_at = time.perf_counter()
+
+
+def distance_to_trigger_pips(price, triggers, point, points_per_pip_value):
+    """
+    Beräknar avståndet i pips från priset till närmaste trigger.
+    :param price: Aktuellt pris.
+    :param triggers: Prisnivåer (entry-nivåer, break-even osv.). None-värden ignoreras.
+    :param point: Symbolens point.
+    :param points_per_pip_value: Antal points per pip.
+    :return: Avstånd i pips, eller None om det inte finns några triggers.
+    """
+    prices = [level for level in triggers if level is not None]
+    if price is None or not prices:
+        return None
+    pip_size = point * points_per_pip_value
+    return min(abs(price - level) for level in prices) / pip_size
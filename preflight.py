@@ -0,0 +1,148 @@
+import numpy as np
+
+from connection import mt5
+from sheet_model import margin_of_safety_cells, SheetModel
+from symbol_cache import get_static_info, get_symbol_info
+
+# Celler och tecken för top up 1-3 i "Margin of Safety": U9, U16 och -U24
+_TOP_UP_CELLS = [("U9", 1), ("U16", 1), ("U24", -1)]
+# Kompileras vid första användningen
+_safety_model = None
+
+
+def validate_ladder(requests, min_stop_distance=None, break_even_price=None):
+    """
+    Kontrollerar hela stegen (initialorder och alla stop-ordrar) innan något skickas:
+    volym, stops level och freeze level, min_stop_distance, flytten av SL till break-even
+    när varje stop-order fylls, och att den fria marginalen räcker om alla ordrar fylls.
+    Alla fel samlas, kontrollen avbryts inte vid det första.
+    :param requests: Resultatet från order_execution.prepare_ladder.
+    :param min_stop_distance: Minsta avstånd i pips mellan pris och stop, None hoppar över kontrollen.
+    :param break_even_price: SL som stop-ordrarna får när de fylls, standard är initialorderns pris.
+    :return: Dictionary med 'violations' (lista med order, check och message), 'margin_required',
+             'margin_free' och 'margin_per_order', eller None om terminalen inte svarade.
+    """
+    initial = requests["initial"]
+    symbol = initial["symbol"]
+    static = get_static_info(symbol)
+    info = get_symbol_info(symbol)
+    account = mt5.account_info()
+    if static is None or info is None or account is None:
+        print(f"Failed to get symbol or account info for {symbol}. {mt5.last_error()}")
+        return None
+
+    point = static.point
+    pip_size = point * (10 if static.digits in (5, 3) else 1)
+    stops_distance = static.trade_stops_level * point
+    freeze_distance = static.trade_freeze_level * point
+    spread = info.ask - info.bid
+    # Halv point i marginal så att avrundningsfel i priserna inte ger falska fel
+    tolerance = point / 2
+    if break_even_price is None:
+        break_even_price = initial["price"]
+
+    orders = [("initial", initial)] + [(f"stop_{i}", request) for i, request in enumerate(requests["stops"], start=1)]
+    min_distance = None if min_stop_distance is None else min_stop_distance * pip_size
+    violations = []
+    margins = []
+
+    def add(order, check, message):
+        violations.append({"order": order, "check": check, "message": message})
+
+    # Marginalen är linjär i volymen och växer högst lika mycket som priset, så marginalen
+    # per lot vid stegens högsta pris är en övre gräns för alla ordrar. Ett anrop per stege.
+    margin_per_lot = mt5.order_calc_margin(mt5.ORDER_TYPE_BUY, symbol, 1.0,
+                                           max(request["price"] for _, request in orders))
+    if margin_per_lot is None:
+        add("ladder", "margin", f"order_calc_margin failed: {mt5.last_error()}")
+
+    for name, request in orders:
+        volume = request["volume"]
+        price = request["price"]
+        sl = request.get("sl")
+        tp = request.get("tp")
+
+        if volume < static.volume_min or volume > static.volume_max:
+            add(name, "volume", f"Volume {volume} outside {static.volume_min}-{static.volume_max}.")
+        elif static.volume_step and abs(round(volume / static.volume_step) * static.volume_step - volume) > 1e-9:
+            add(name, "volume", f"Volume {volume} is not a multiple of {static.volume_step}.")
+
+        if name == "initial":
+            # Marknadsorder för köp: SL och TP räknas från bid
+            reference = info.bid
+        else:
+            # Stop-order för köp: öppningspriset räknas från ask, SL och TP från öppningspriset
+            reference = price
+            if price - info.ask < stops_distance - tolerance:
+                add(name, "stops_level", f"Entry {price} is closer than {static.trade_stops_level} points to ask {info.ask}.")
+            if price - info.ask < freeze_distance + tolerance:
+                add(name, "freeze_level", f"Entry {price} is within the freeze level of {static.trade_freeze_level} points.")
+            if min_distance is not None and price - info.ask < min_distance - tolerance:
+                add(name, "min_stop_distance", f"Entry {price} is closer than {min_stop_distance} pips to ask {info.ask}.")
+
+            # När stop-ordern fylls flyttas SL till break-even, från bid vid entry-nivån
+            fill_bid = price - spread
+            if fill_bid - break_even_price < max(stops_distance, freeze_distance) - tolerance:
+                add(name, "break_even", f"Break-even SL {break_even_price} would be too close to bid "
+                                        f"{fill_bid:.{static.digits}f} when filled.")
+            if min_distance is not None and price - break_even_price < min_distance - tolerance:
+                add(name, "min_stop_distance", f"Break-even SL {break_even_price} is closer than "
+                                               f"{min_stop_distance} pips to entry {price}.")
+
+        if sl is not None:
+            if reference - sl < stops_distance - tolerance:
+                add(name, "stops_level", f"SL {sl} is closer than {static.trade_stops_level} points to {reference}.")
+            # min_stop_distance är strategins gräns och räknas från entry-priset
+            if min_distance is not None and price - sl < min_distance - tolerance:
+                add(name, "min_stop_distance", f"SL {sl} is closer than {min_stop_distance} pips to entry {price}.")
+        if tp is not None and tp - reference < stops_distance - tolerance:
+            add(name, "stops_level", f"TP {tp} is closer than {static.trade_stops_level} points to {reference}.")
+
+        margins.append(None if margin_per_lot is None else margin_per_lot * volume)
+
+    # Alla stop-ordrar kan fyllas, så hela stegens marginal ska rymmas i den fria marginalen
+    margin_required = sum(margin for margin in margins if margin is not None)
+    if margin_required > account.margin_free:
+        add("ladder", "margin", f"Ladder needs {margin_required:.2f} margin, {account.margin_free:.2f} is free.")
+    return {
+        "violations": violations,
+        "margin_required": margin_required,
+        "margin_free": account.margin_free,
+        "margin_per_order": margins,
+    }
+
+
+def margin_of_safety(account_size, target_gain_percent, number_of_pips, initial_stop_level,
+                     initial_stop_percent, top_up_levels, pip_value, spread_in_pips):
+    """
+    Tabellen "Margin of Safety" i arbetsboken, räknad med arbetsbokens egna formler
+    (sheet_model.MARGIN_OF_SAFETY_FORMULAS): för initialordern avståndet till stoplossen,
+    för varje top up avståndet i pips från dess entry till break-even när den fylls.
+    Parametrarna är samma som till planner.plan_ladders, procent anges som i settings.py.
+    :return: Lista med (trade, stop type, pips), pips är None där arbetsboken visar N/A.
+             None om stegen har fler top ups än arbetsbokens tre.
+    """
+    if len(top_up_levels) > len(_TOP_UP_CELLS):
+        print(f"Margin of Safety is only defined for {len(_TOP_UP_CELLS)} top-ups in the workbook.")
+        return None
+    global _safety_model
+    if _safety_model is None:
+        _safety_model = SheetModel(margin_of_safety_cells())
+
+    levels = list(top_up_levels) + [0] * (len(_TOP_UP_CELLS) - len(top_up_levels))
+    values = _safety_model.evaluate(
+        account_size=account_size, gain_percent=target_gain_percent / 100, number_of_pips=number_of_pips,
+        initial_stop=initial_stop_level, risk_percent=initial_stop_percent / 100,
+        top_up_level_1=levels[0] / 100, top_up_level_2=levels[1] / 100, top_up_level_3=levels[2] / 100,
+        pip_value=pip_value, spread_in_pips=spread_in_pips,
+    )
+    rows = [("Initial", "Stoploss", float(initial_stop_level))]
+    for i, (coordinate, sign) in enumerate(_TOP_UP_CELLS[:len(top_up_levels)], start=1):
+        pips = sign * float(values[coordinate])
+        rows.append((f"Topup{i}", "Breakeven", None if np.isnan(pips) else pips))
+    return rows
+
+
+def print_violations(report):
+    for violation in report["violations"]:
+        print(f"{violation['order']}: {violation['check']}: {violation['message']}")
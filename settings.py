@@ -1,9 +1,4 @@
-import MetaTrader5 as mt5
-
-# Initialize MetaTrader5 (om det behövs i settings)
-if not mt5.initialize():
-    print("MetaTrader 5 initialization failed. Ensure the terminal is running.")
-    raise RuntimeError("Failed to initialize MetaTrader 5")
+from symbol_cache import get_static_info
 
 def adjust_pips_for_digits(symbol, pips):
     """
@@ -16,7 +11,7 @@ def adjust_pips_for_digits(symbol, pips):
     :param pips: Antalet pips att justera.
     :return: Justerat antal pips.
     """
-    symbol_info = mt5.symbol_info(symbol)
+    symbol_info = get_static_info(symbol)
     if not symbol_info:
         print(f"Failed to retrieve symbol info for {symbol}. Returning unadjusted pips.")
         return pips
@@ -40,13 +35,49 @@ symbol = "EURUSD"
 # Trading settings
 account_size = 1000
 target_gain_percent = 50
-number_of_pips = adjust_pips_for_digits(symbol, 100)
 initial_stop_percent = 4
-initial_stop_level = adjust_pips_for_digits(symbol, 30)
 top_up_levels1 = 35
 top_up_levels2 = 50
 top_up_levels3 = 65
-min_stop_distance = 30
+# Alla top up-nivåer i ordning, lägg till fler för längre stegar
+top_up_levels = [top_up_levels1, top_up_levels2, top_up_levels3]
 pip_value = 1
 spread = 3
 FILE_PATH = r"C:\\Program Files\\MetaTrader 5 IC Markets (SC)_OPTIMIZER\\terminal64.exe"
+# Prometheus-textfil för node_exporter, None stänger av mätningen
+METRICS_TEXTFILE = None
+# Journal över lagda stegar, läses vid start så att övervakningen kan fortsätta efter en krasch
+JOURNAL_FILE = "ladder_journal.jsonl"
+# Adress som daemon.py lyssnar på, bara lokalt eftersom den kan lägga ordrar
+DAEMON_ADDRESS = ("127.0.0.1", 8765)
+# Nyckeln som daemon.py skapar vid varje start och som klienterna läser, bara läsbar för användaren
+DAEMON_TOKEN_FILE = "daemon.token"
+# Percentil av den rullande spreaden som planeringen använder, 50 är medianen
+SPREAD_PERCENTILE = 50
+
+# Pips som beror på symbolens decimaler räknas ut först när de används,
+# så att modulen kan importeras utan uppkopplad terminal
+PIPS_FOR_DIGITS = {
+    "number_of_pips": 100,
+    "initial_stop_level": 30,
+    # Kontrolleras av preflight.validate_ladder innan stegen skickas
+    "min_stop_distance": 30,
+}
+
+
+def pips_for_symbol(symbol, name):
+    """
+    Ett värde ur PIPS_FOR_DIGITS justerat för en viss symbols decimaler. Modulattributen
+    (t.ex. settings.number_of_pips) gäller bara för symbol ovan.
+    """
+    return adjust_pips_for_digits(symbol, PIPS_FOR_DIGITS[name])
+
+
+def __getattr__(name):
+    if name in PIPS_FOR_DIGITS:
+        value = adjust_pips_for_digits(symbol, PIPS_FOR_DIGITS[name])
+        # Utan symbolinfo är värdet ojusterat. Det sparas inte, nästa läsning försöker igen.
+        if get_static_info(symbol) is not None:
+            globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,226 @@
+import numpy as np
+
+from formula_engine import NAME, FormulaEngine, compile_formula, expand_range
+
+# Indata i "Input into the EA settings" (dictionary.py), procentsatser anges som i Excel, 10 % = 0.1
+INPUT_CELLS = {
+    "account_size": "D7",
+    "gain_percent": "D8",
+    "number_of_pips": "D9",
+    "initial_stop": "D10",
+    "risk_percent": "D11",
+    "initial_break_even_level": "D12",
+    "top_up_level_1": "D13",
+    "top_up_level_2": "D14",
+    "top_up_level_3": "D15",
+    "min_stop_distance": "D16",
+    "pip_value": "D17",
+    "spread_in_pips": "D18",
+}
+
+SHEET = "Breakeven Stops"
+
+# Formlerna bakom tabellen "Margin of Safety" (dictionary.py), med raderna som formlerna
+# refererar till: initial på rad 8, top up 1-3 på rad 9-11, break-even-tabellerna på rad
+# 8-9, 14-16 och 21-24. Top up 1-3 visas som U9, U16 och -U24.
+MARGIN_OF_SAFETY_FORMULAS = {
+    "K9": "=+D13", "K10": "=+D14", "K11": "=+D15",
+    "L9": "=ROUNDUP(+K9*D9;0)", "L10": "=ROUNDUP(+D9*K10;0)", "L11": "=ROUNDUP(+D9*K11;0)",
+    "N25": "=+D10", "O25": "=+D7*D11", "M25": "=ROUND((+O25/N25/D17);2)",
+    "M8": "=+M25", "N8": "=+D9-D18", "O8": "=ROUNDUP(+M8*N8*D17;0)", "O12": "=ROUND(+D7*D8;0)",
+    "N9": "=(+D$9*(1-K9))-D$18", "N10": "=(+D$9*(1-K10))-D$18", "N11": "=ROUND(OM(D15=0;0;+D9-L11-D18);0)",
+    "O9": "=ROUNDUP((O12-O8)*D13/(D13+D14+D15);0)", "O10": "=ROUNDUP((O12-O8)*D14/(D13+D14+D15);0)",
+    "O11": "=OM(D15=0;0;(ROUND((O12-O8)*D15/(D13+D14+D15);0)))",
+    "M9": "=ROUNDUP(+O9/N9/D17;2)", "M10": "=ROUNDUP(OM(D14=0;0;+O10/N10/D17);2)",
+    "M11": "=ROUNDUP(OM(D15=0;0;+O11/N11/D17);2)",
+    "T8": "=+M8", "T9": "=+M9", "R8": "=ROUNDUP((+T9/T8)*L9/(1+(M9/M8));0)", "U9": "=(+R8-L9)*-1",
+    "R14": "=ROUNDUP((((+M9*L9)+(M10*L10))/(M8+M9+M10));0)", "R15": "=+R14", "R16": "=+R15",
+    "U16": '=OM(D14=0;"     N/A";(+R16-L10)*-1)',
+    "R21": '=OM(D15=0;"NA";ROUNDUP((((+M9*L9)+(M10*L10)+(M11*L11))/(M8+M9+M10+M11));0))',
+    "R22": "=+R21", "R23": "=+R22", "R24": "=+R23",
+    # U19 finns inte med i dictionary.py, arbetsbokens sparade -U24 = 32 ger U19 = L11 (65)
+    "U19": "=+L11",
+    "U24": '=OM(D15=0;"NA";(+U19-R24)*-1)',
+}
+
+
+def _significant(x):
+    # Samma avrundning till 15 signifikanta siffror som Excel, elementvis
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(x)))
+        scale = 10.0 ** np.where(np.isfinite(magnitude), 14 - magnitude, 0)
+        return np.where(np.isfinite(x) & (x != 0), np.round(x * scale) / scale, x)
+
+
+def _round_half_away(x, digits):
+    factor = 10.0 ** digits
+    return np.copysign(np.floor(_significant(np.abs(x) * factor) + 0.5) / factor, x)
+
+
+def _round_up(x, digits):
+    factor = 10.0 ** digits
+    return np.copysign(np.ceil(_significant(np.abs(x) * factor)) / factor, x)
+
+
+def _round_down(x, digits):
+    factor = 10.0 ** digits
+    return np.copysign(np.floor(_significant(np.abs(x) * factor)) / factor, x)
+
+
+def _divide(a, b):
+    # #DIV/0! blir NaN
+    return np.where(b == 0, np.nan, a / np.where(b == 0, 1.0, b))
+
+
+def _flatten(args):
+    values = []
+    for arg in args:
+        values.extend(arg if isinstance(arg, list) else [arg])
+    return values
+
+
+def _numeric(value):
+    # Tom cell räknas som 0, text kan inte räknas med och blir NaN
+    if value is None:
+        return 0.0
+    if isinstance(value, str):
+        return np.nan
+    return value
+
+
+_BINARY = {
+    "+": np.add, "-": np.subtract, "*": np.multiply, "/": _divide, "^": np.power,
+    "=": np.equal, "<>": np.not_equal, "<": np.less, ">": np.greater, "<=": np.less_equal, ">=": np.greater_equal,
+}
+
+_FUNCTIONS = {
+    "ROUND": lambda x, digits=0.0: _round_half_away(x, digits),
+    "ROUNDUP": lambda x, digits=0.0: _round_up(x, digits),
+    "ROUNDDOWN": lambda x, digits=0.0: _round_down(x, digits),
+    "SUM": lambda *args: sum(_flatten(args)),
+    "MIN": lambda *args: np.minimum.reduce(np.broadcast_arrays(*_flatten(args))),
+    "MAX": lambda *args: np.maximum.reduce(np.broadcast_arrays(*_flatten(args))),
+    "AVERAGE": lambda *args: sum(_flatten(args)) / len(_flatten(args)),
+    "ABS": np.abs,
+    "AND": lambda *args: np.logical_and.reduce(np.broadcast_arrays(*[value != 0 for value in _flatten(args)])),
+    "OR": lambda *args: np.logical_or.reduce(np.broadcast_arrays(*[value != 0 for value in _flatten(args)])),
+    "NOT": lambda value: value == 0,
+}
+
+
+def compile_array(node):
+    """
+    Kompilerar ett syntaxträd från formula_engine.parse till en funktion som räknar
+    elementvis på NumPy-arrayer. OM/IF beräknar båda grenarna och väljer med np.where,
+    och Excel-fel (#DIV/0!, text i räkningar) blir NaN.
+    """
+    kind = node[0]
+    if kind in ("number", "bool"):
+        value = float(node[1])
+        return lambda env: value
+    if kind == "string":
+        return lambda env: np.nan
+    if kind == "blank":
+        return lambda env: 0.0
+    if kind == "ref":
+        key = (node[1], node[2])
+        return lambda env: env.get(key, 0.0)
+    if kind == "range":
+        keys = [(node[1], coordinate) for coordinate in expand_range(node[2], node[3])]
+        return lambda env: [env.get(key, 0.0) for key in keys]
+    if kind == "negate":
+        operand = compile_array(node[1])
+        return lambda env: -operand(env)
+    if kind == "percent":
+        operand = compile_array(node[1])
+        return lambda env: operand(env) / 100.0
+    if kind == "binary":
+        op, left, right = node[1], compile_array(node[2]), compile_array(node[3])
+        if op == "&":
+            raise ValueError("Text concatenation is not supported in array evaluation")
+        function = _BINARY[op]
+        return lambda env: function(left(env), right(env)) * 1.0
+    if kind == "call":
+        name, args = node[1], [compile_array(arg) for arg in node[2]]
+        if name == "IF":
+            condition = args[0]
+            if_true = args[1] if len(args) > 1 else (lambda env: 1.0)
+            if_false = args[2] if len(args) > 2 else (lambda env: 0.0)
+            return lambda env: np.where(condition(env) != 0, if_true(env), if_false(env))
+        if name == "IFERROR":
+            value, fallback = args
+
+            def call_iferror(env):
+                result = value(env)
+                return np.where(np.isfinite(result), result, fallback(env))
+            return call_iferror
+        function = _FUNCTIONS.get(name)
+        if function is None:
+            raise ValueError(f"{NAME}: {name} is not supported in array evaluation")
+        return lambda env: function(*[arg(env) for arg in args])
+    raise ValueError(f"Unknown node {kind}")
+
+
+def input_grid(**inputs):
+    """
+    Alla kombinationer av indata, t.ex. input_grid(account_size=[1000, 5000], spread_in_pips=np.arange(1, 4)).
+    :return: Dictionary med arrayer som har en axel per indata, i den ordning de angavs.
+    """
+    names = list(inputs)
+    grids = np.meshgrid(*[np.asarray(inputs[name], dtype=float) for name in names], indexing="ij")
+    return dict(zip(names, grids))
+
+
+class SheetModel:
+    """
+    Arbetsbokens blad som en funktion av indatacellerna, där varje indata kan vara en array.
+    En beräkning ger hela bladet för alla kombinationer på en gång.
+    """
+
+    def __init__(self, workbook_cells, sheet=SHEET):
+        """
+        :param workbook_cells: Celler i excel_data.json-format, t.ex. från excel.excel_to_dictionary_with_formulas.
+        :param sheet: Bladet som INPUT_CELLS avser.
+        """
+        self.sheet = sheet
+        # Samma beroendeordning som den skalära motorn
+        self.engine = FormulaEngine(workbook_cells)
+        self.constants = {key: _numeric(value) for key, value in self.engine.constants.items()}
+        self.compiled = [
+            (key, compile_array(compile_formula(self.engine.formulas[key].text, key[0]).tree))
+            for key in self.engine.order
+        ]
+
+    def evaluate(self, **inputs):
+        """
+        Beräknar alla formler med indata som skalärer eller arrayer som går att broadcasta.
+        :param inputs: Namn ur INPUT_CELLS eller koordinater, t.ex. account_size=np.linspace(500, 5000, 100).
+        :return: Dictionary {koordinat: array} för bladets celler, broadcastade till gemensam form.
+        """
+        env = dict(self.constants)
+        for name, value in inputs.items():
+            coordinate = INPUT_CELLS.get(name, name)
+            env[(self.sheet, coordinate.upper())] = np.asarray(value, dtype=float)
+        shape = np.broadcast_shapes(*[np.shape(value) for value in env.values()]) if env else ()
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            for key, function in self.compiled:
+                env[key] = function(env)
+        return {
+            coordinate: np.broadcast_to(np.asarray(value, dtype=float), shape)
+            for (sheet, coordinate), value in env.items() if sheet == self.sheet
+        }
+
+    def evaluate_grid(self, **inputs):
+        """
+        Som evaluate, men indata ges som 1-D-listor och alla kombinationer räknas.
+        """
+        return self.evaluate(**input_grid(**inputs))
+
+
+def margin_of_safety_cells():
+    """
+    Cellerna för tabellen "Margin of Safety" i excel_data.json-format, så att SheetModel kan
+    räkna den utan arbetsboken.
+    """
+    return {SHEET: {coordinate: {"value": None, "formula": formula}
+                    for coordinate, formula in MARGIN_OF_SAFETY_FORMULAS.items()}}
@@ -0,0 +1,112 @@
+import threading
+import time
+
+from connection import mt5
+from order_execution import update_sl
+
+
+class SLManager:
+    """
+    Samlar önskade SL-nivåer per ticket och skickar bara de ändringar som behövs.
+    Önskad SL jämförs med positionens nuvarande SL med en tolerans på en halv point,
+    flera önskemål för samma ticket slås ihop till det senaste och antalet
+    TRADE_ACTION_SLTP per sekund begränsas, eftersom brokern stryper för täta ändringar.
+    """
+
+    def __init__(self, max_per_second=10.0, burst=10, resend_after=1.0, clock=time.monotonic):
+        """
+        :param max_per_second: Högsta antal SL-ändringar per sekund i snitt, None betyder ingen gräns.
+        :param burst: Antal ändringar som får skickas direkt efter varandra.
+        :param resend_after: Sekunder innan samma SL skickas igen för en ticket, om positionen
+                             ännu inte visar den nya nivån.
+        """
+        self.max_per_second = max_per_second
+        self.burst = burst
+        self.resend_after = resend_after
+        self._clock = clock
+        self._tokens = float(burst)
+        self._refilled_at = clock()
+        self._pending = {}
+        self._sent_at = {}
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def request(self, position, sl_price, point):
+        """
+        Begär att en position ska ha en viss SL. Skickas först vid flush().
+        :param position: Position från positions_get.
+        :param sl_price: Önskad SL.
+        :param point: Symbolens point, för toleransen.
+        :return: True om en ändring behövs, False om positionen redan har SL:en.
+        """
+        ticket = position.ticket
+        with self._lock:
+            if abs(position.sl - sl_price) < point / 2:
+                self._pending.pop(ticket, None)
+                self._sent_at.pop(ticket, None)
+                self.skipped += 1
+                return False
+            sent = self._sent_at.get(ticket)
+            if sent is not None and abs(sent[0] - sl_price) < point / 2 and self._clock() - sent[1] < self.resend_after:
+                # Ändringen är redan skickad men syns inte i positionen än
+                self.skipped += 1
+                return False
+            self._pending[ticket] = (position.symbol, sl_price, point)
+            return True
+
+    def _take_token(self):
+        if self.max_per_second is None:
+            return True
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.max_per_second)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def flush(self, tickets=None):
+        """
+        Skickar väntande ändringar så långt hastighetsgränsen räcker. Resten ligger kvar
+        till nästa flush.
+        :param tickets: Skicka bara för dessa tickets, None betyder alla väntande.
+        :return: Lista med (ticket, sl, resultat från order_send) för de skickade ändringarna.
+        """
+        with self._lock:
+            candidates = [ticket for ticket in self._pending if tickets is None or ticket in tickets]
+            batch = []
+            for ticket in candidates:
+                if not self._take_token():
+                    break
+                batch.append((ticket,) + self._pending.pop(ticket))
+
+        results = []
+        for ticket, symbol, sl_price, point in batch:
+            # update_sl använder inte points per pip, SL-priset är redan uträknat
+            result = update_sl(ticket, sl_price, point, None, symbol=symbol)
+            with self._lock:
+                if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+                    self.sent += 1
+                    self._sent_at[ticket] = (sl_price, self._clock())
+                else:
+                    self.failed += 1
+            results.append((ticket, sl_price, result))
+        return results
+
+    def forget(self, tickets):
+        """
+        Glömmer tickets för positioner som stängts.
+        """
+        with self._lock:
+            for ticket in tickets:
+                self._pending.pop(ticket, None)
+                self._sent_at.pop(ticket, None)
+
+    def stats(self):
+        return {"sent": self.sent, "skipped": self.skipped, "failed": self.failed, "pending": len(self._pending)}
+
+
+# Delad för hela processen, så att hastighetsgränsen gäller alla stegar mot samma broker
+manager = SLManager()
@@ -0,0 +1,211 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from connection import mt5
+from symbol_cache import get_static_info
+
+# Spreadar över gränsen (i points) räknas i histogrammets sista fack
+MAX_SPREAD_POINTS = 2000
+
+
+class SpreadBuffer:
+    """
+    Ringbuffert med de senaste tickarna för en symbol. Spreaden i points räknas också in i
+    ett histogram som uppdateras när en tick läggs till och när den skrivs över, så att
+    median och percentiler kan läsas utan att bufferten sorteras.
+    """
+
+    def __init__(self, point, capacity=4096, max_points=MAX_SPREAD_POINTS):
+        """
+        :param point: Symbolens point, spreaden lagras som ett heltal points.
+        :param capacity: Antal ticks som sparas.
+        :param max_points: Största spread i points som histogrammet skiljer på.
+        """
+        self.point = point
+        self.capacity = capacity
+        self.time_msc = np.zeros(capacity, dtype=np.int64)
+        self.bid = np.zeros(capacity)
+        self.ask = np.zeros(capacity)
+        self.points = np.zeros(capacity, dtype=np.int64)
+        self.histogram = np.zeros(max_points + 1, dtype=np.int64)
+        self.count = 0
+        self.last_time_msc = -1
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def extend(self, time_msc, bid, ask):
+        """
+        Lägger till ticks i tidsordning. Ticks som inte är nyare än den senaste sparade hoppas över,
+        så att samma tick från copy_ticks_from och symbol_info_tick inte räknas två gånger.
+        :return: Antal ticks som lades till.
+        """
+        time_msc = np.asarray(time_msc, dtype=np.int64).ravel()
+        bid = np.asarray(bid, dtype=float).ravel()
+        ask = np.asarray(ask, dtype=float).ravel()
+        with self._lock:
+            keep = (time_msc > self.last_time_msc) & (bid > 0) & (ask >= bid)
+            time_msc, bid, ask = time_msc[keep], bid[keep], ask[keep]
+            added = len(time_msc)
+            if added == 0:
+                return 0
+            # Bara de sista capacity tickarna kan få plats
+            time_msc, bid, ask = time_msc[-self.capacity:], bid[-self.capacity:], ask[-self.capacity:]
+            points = np.clip(np.rint((ask - bid) / self.point), 0, len(self.histogram) - 1).astype(np.int64)
+
+            slots = (self._next + np.arange(len(points))) % self.capacity
+            evicted = max(0, self.count + len(points) - self.capacity)
+            if evicted:
+                # De äldsta tickarna ligger direkt efter skrivpositionen
+                oldest = (self._next - self.count + np.arange(evicted)) % self.capacity
+                self.histogram -= np.bincount(self.points[oldest], minlength=len(self.histogram))
+            self.histogram += np.bincount(points, minlength=len(self.histogram))
+
+            self.time_msc[slots] = time_msc
+            self.bid[slots] = bid
+            self.ask[slots] = ask
+            self.points[slots] = points
+            self._next = (self._next + len(points)) % self.capacity
+            self.count = min(self.capacity, self.count + len(points))
+            self.last_time_msc = int(time_msc[-1])
+            return added
+
+    def append(self, time_msc, bid, ask):
+        return self.extend([time_msc], [bid], [ask])
+
+    def percentile_points(self, percentile=50):
+        """
+        Spread i points vid en given percentil. Tiden beror bara på histogrammets storlek,
+        inte på hur många ticks som ligger i bufferten.
+        :return: Spread i points, eller None om bufferten är tom.
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = max(1, int(np.ceil(percentile / 100 * self.count)))
+            return int(np.searchsorted(np.cumsum(self.histogram), rank))
+
+    def latest(self):
+        """
+        :return: (time_msc, bid, ask) för den senaste ticken, eller None om bufferten är tom.
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            i = (self._next - 1) % self.capacity
+            return int(self.time_msc[i]), float(self.bid[i]), float(self.ask[i])
+
+
+class SpreadEstimator:
+    """
+    Samlar ticks för ett antal symboler i en bakgrundstråd. När en symbol läggs till fylls
+    bufferten med historik från copy_ticks_from, därefter läses symbol_info_tick varje interval
+    sekund. Planeringen läser spreaden ur bufferten och gör inga egna anrop till terminalen.
+    """
+
+    def __init__(self, capacity=4096, interval=0.25, history_seconds=600, max_points=MAX_SPREAD_POINTS):
+        """
+        :param capacity: Antal ticks som sparas per symbol.
+        :param interval: Sekunder mellan anropen till symbol_info_tick.
+        :param history_seconds: Hur långt bakåt copy_ticks_from hämtar ticks när en symbol läggs till.
+        :param max_points: Största spread i points som histogrammet skiljer på.
+        """
+        self.capacity = capacity
+        self.interval = interval
+        self.history_seconds = history_seconds
+        self.max_points = max_points
+        self.buffers = {}
+        # Anropas med (symbol, bid, ask) för varje ny tick, t.ex. pip_values.service.on_tick
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def track(self, symbol):
+        """
+        Börjar samla ticks för en symbol och fyller bufferten med historik.
+        :return: SpreadBuffer för symbolen, eller None om symbolen inte hittas.
+        """
+        buffer = self.buffers.get(symbol)
+        if buffer is not None:
+            return buffer
+        info = get_static_info(symbol)
+        if info is None:
+            print(f"Symbol {symbol} information not found. Spread is not collected.")
+            return None
+        buffer = SpreadBuffer(info.point, self.capacity, self.max_points)
+
+        date_from = datetime.now(timezone.utc) - timedelta(seconds=self.history_seconds)
+        ticks = mt5.copy_ticks_from(symbol, date_from, self.capacity, mt5.COPY_TICKS_INFO)
+        if ticks is None:
+            print(f"Failed to copy ticks for {symbol}. {mt5.last_error()}")
+        elif len(ticks):
+            buffer.extend(ticks["time_msc"], ticks["bid"], ticks["ask"])
+
+        with self._lock:
+            self.buffers[symbol] = buffer
+        return buffer
+
+    def collect(self):
+        """
+        Läser senaste ticken för varje symbol en gång.
+        """
+        with self._lock:
+            buffers = list(self.buffers.items())
+        for symbol, buffer in buffers:
+            tick = mt5.symbol_info_tick(symbol)
+            if tick is not None and buffer.append(tick.time_msc, tick.bid, tick.ask):
+                for listener in self.listeners:
+                    listener(symbol, tick.bid, tick.ask)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="spread-collector", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"Failed to collect ticks: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def spread_in_pips(self, symbol, percentile=50):
+        """
+        Rullande spread i pips, räknad som i main.get_spread_in_pips (points / 10).
+        :param percentile: 50 ger medianen, högre värden ger en försiktigare spread.
+        :return: Spread i pips, eller None om inga ticks har samlats för symbolen.
+        """
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            return None
+        points = buffer.percentile_points(percentile)
+        if points is None:
+            return None
+        return points / 10
+
+
+# Delad insamlare för hela processen
+estimator = SpreadEstimator()
+
+
+def track(*symbols):
+    """
+    Börjar samla ticks för symbolerna och startar bakgrundstråden.
+    """
+    for symbol in symbols:
+        estimator.track(symbol)
+    estimator.start()
+    return estimator
+
+
+def get_spread_in_pips(symbol, percentile=50):
+    return estimator.spread_in_pips(symbol, percentile)
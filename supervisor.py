@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+
+from connection import mt5
+
+from polling import AdaptivePoller, distance_to_trigger_pips
+from sl_manager import manager as shared_sl_manager
+from triggers import ASK, BID, BREAK_EVEN, ENTRY, TAKE_PROFIT, TriggerIndex
+
+
+class Ladder:
+    """
+    En aktiv stege (initial order + stop-orders) som övervakas av LadderSupervisor.
+    """
+
+    def __init__(self, symbol, magic, entry_price, break_even_price, levels, point, points_per_pip_value,
+                 tp_price=None, sl_manager=None):
+        self.symbol = symbol
+        self.magic = magic
+        self.entry_price = entry_price
+        self.break_even_price = break_even_price
+        self.levels = list(levels)
+        self.point = point
+        self.points_per_pip_value = points_per_pip_value
+        self.tp_price = tp_price
+        # SLManager som SL-ändringarna går genom, standard är den delade sl_manager.manager
+        self.sl_manager = sl_manager if sl_manager is not None else shared_sl_manager
+        self.position_tickets = set()
+        self.order_tickets = set()
+        self.finished = False
+        # Sätts när första stop-ordern aktiverats, därefter ska alla positioner ha SL på break-even
+        self.break_even_active = False
+        # journal.Journal som fyllningar, SL-flyttar och avslut skrivs till, valfri
+        self.journal = None
+
+    @property
+    def key(self):
+        return self.symbol, self.magic
+
+    def triggers(self):
+        """
+        Nivåer där stegen behöver ses över: entry-nivåerna (stop-ordrarna aktiveras på ask),
+        break-even och TP (på bid).
+        :return: Lista med (prissida, pris, typ).
+        """
+        triggers = [(ASK, level, ENTRY) for level in self.levels]
+        triggers.append((BID, self.break_even_price, BREAK_EVEN))
+        triggers.append((BID, self.tp_price, TAKE_PROFIT))
+        return triggers
+
+    def process(self, positions, orders):
+        """
+        Hanterar positioner och väntande ordrar som hör till stegen.
+        Samma regel som monitor_positions: när en stop-order har aktiverats
+        (price_open över entry och ingen SL) flyttas SL till break-even för alla positioner,
+        via SLManager så att positioner som redan har rätt SL inte skickas igen.
+        :return: Avstånd i pips till nästa trigger, eller None.
+        """
+        tickets = {pos.ticket for pos in positions}
+        previous_tickets = self.position_tickets
+        if self.journal is not None:
+            for ticket in tickets - self.position_tickets:
+                self.journal.append("fill", symbol=self.symbol, magic=self.magic, ticket=ticket)
+        self.position_tickets = tickets
+        self.order_tickets = {order.ticket for order in orders}
+        if not positions:
+            print(f"Inga aktiva positioner för {self.symbol} (magic {self.magic}). Avslutar övervakning.")
+            self.finished = True
+            self.sl_manager.forget(previous_tickets)
+            if self.journal is not None:
+                self.journal.append("closed", symbol=self.symbol, magic=self.magic)
+            return None
+
+        # När en stop-order har aktiverats ska alla positioner ha SL på break-even. Önskad SL
+        # jämförs med positionernas, så bara de som saknar den skickas till terminalen.
+        if not self.break_even_active:
+            self.break_even_active = any(pos.price_open > self.entry_price and pos.sl == 0 for pos in positions)
+        if self.break_even_active:
+            for pos in positions:
+                self.sl_manager.request(pos, self.break_even_price, self.point)
+            results = self.sl_manager.flush(tickets)
+            for ticket, sl, result in results:
+                if self.journal is not None and result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+                    self.journal.append("sl", symbol=self.symbol, magic=self.magic, ticket=ticket, sl=sl)
+            if results:
+                print(f"Uppdaterade SL till {self.break_even_price} för {len(results)} positioner i {self.symbol}.")
+
+        current_price = positions[0].price_current
+        pending_levels = [level for level in self.levels if level > current_price]
+        return distance_to_trigger_pips(
+            current_price, pending_levels + [self.break_even_price], self.point, self.points_per_pip_value
+        )
+
+
+class LadderSupervisor:
+    """
+    Övervakar många stegar samtidigt med ett enda positions_get() och orders_get() per varv.
+    Resultaten fördelas till stegarna via (symbol, magic).
+    Mellan varven läses bara ticks, och en stege som fått en nivå passerad hanteras direkt.
+    """
+
+    def __init__(self, poller=None, tick_interval=0.02):
+        """
+        :param poller: AdaptivePoller som bestämmer tiden mellan varven. Standard är en
+                       som läser ticks i stället för att sova.
+        :param tick_interval: Sekunder mellan tickavläsningarna mellan varven när en trigger är
+                              nära. Längre bort glesas de ut efter pollerns avstånd.
+        """
+        self.poller = poller if poller is not None else AdaptivePoller(sleep=self.watch_ticks)
+        self.tick_interval = tick_interval
+        self.ladders = {}
+        self.triggers = TriggerIndex()
+        # Pipstorlek per symbol, för avståndet till närmaste trigger i pips
+        self._pip_sizes = {}
+        # Monotonic-tid för nästa tickavläsning per symbol
+        self._next_tick_read = {}
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        # Registret och triggerindexet ändras från andra trådar (t.ex. daemonens submit) medan
+        # övervakningen läser dem. Låset hålls aldrig under anrop till terminalen, så register()
+        # väntar inte på dem. RLock eftersom _finish avregistrerar med låset taget.
+        self._lock = threading.RLock()
+
+    def register(self, ladder):
+        """
+        Lägger till en stege i registret. En befintlig stege med samma symbol och magic ersätts.
+        """
+        with self._lock:
+            self.ladders[ladder.key] = ladder
+            self.triggers.add(ladder)
+            self._pip_sizes[ladder.symbol] = ladder.point * ladder.points_per_pip_value
+            # Läs den nya stegens symbol direkt, även om den redan glesats ut
+            self._next_tick_read.pop(ladder.symbol, None)
+        return ladder
+
+    def unregister(self, symbol, magic):
+        with self._lock:
+            self.triggers.remove((symbol, magic))
+            return self.ladders.pop((symbol, magic), None)
+
+    def on_tick(self, symbol, bid, ask):
+        """
+        Kontrollerar en tick mot triggerindexet. Bara stegar vars nivåer passerats hämtar
+        positioner och ordrar, så att SL flyttas på samma tick som nivån passeras.
+        :return: Nycklar för stegarna som hanterades, tom lista om ingen nivå passerats.
+        """
+        with self._lock:
+            hits = self.triggers.crossed(symbol, bid, ask)
+            ladders = {key: self.ladders[key] for price, kind, key in hits if key in self.ladders}
+        if not ladders:
+            return []
+        positions = mt5.positions_get(symbol=symbol)
+        orders = mt5.orders_get(symbol=symbol)
+        if positions is None or orders is None:
+            # Nästa varv stämmer av igen
+            print(f"Failed to get positions/orders for {symbol}. {mt5.last_error()}")
+            return []
+        for key, ladder in ladders.items():
+            ladder.process([pos for pos in positions if pos.magic == key[1]],
+                           [order for order in orders if order.magic == key[1]])
+            if ladder.finished:
+                self._finish(ladder)
+        return sorted(ladders)
+
+    def _finish(self, ladder):
+        # En stege som ersatts med register() medan den hanterades ligger kvar
+        with self._lock:
+            if self.ladders.get(ladder.key) is ladder:
+                self.unregister(*ladder.key)
+
+    def watch_ticks(self, duration):
+        """
+        Läser ticks för de övervakade symbolerna i duration sekunder, används i stället för
+        att sova mellan varven. Varje symbol läses så ofta som avståndet till dess närmaste
+        trigger kräver, se tick_interval_for.
+        """
+        deadline = time.monotonic() + duration
+        while self.ladders:
+            with self._lock:
+                symbols = self.triggers.symbols()
+            now = time.monotonic()
+            for symbol in symbols:
+                if self._next_tick_read.get(symbol, now) > now:
+                    continue
+                tick = mt5.symbol_info_tick(symbol)
+                if tick is None:
+                    self._next_tick_read[symbol] = now + self.tick_interval
+                    continue
+                self.on_tick(symbol, tick.bid, tick.ask)
+                self._next_tick_read[symbol] = now + self.tick_interval_for(symbol, tick.bid, tick.ask)
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            wake = min((self._next_tick_read.get(symbol, now) for symbol in symbols), default=now + self.tick_interval)
+            time.sleep(max(0.0, min(wake, deadline) - now))
+
+    def tick_interval_for(self, symbol, bid, ask):
+        """
+        Sekunder till nästa tickavläsning för symbolen. Samma kurva som pollerns väntetid
+        mellan varven, skalad så att en trigger inom near_pips läses var tick_interval sekund.
+        """
+        with self._lock:
+            distance = self.triggers.distance(symbol, bid, ask)
+            pip_size = self._pip_sizes.get(symbol)
+        distance_pips = None if distance is None or not pip_size else distance / pip_size
+        scale = self.tick_interval / self.poller.fast_interval
+        return max(self.tick_interval, self.poller.interval_for_distance(distance_pips) * scale)
+
+    def run_cycle(self):
+        """
+        Kör ett övervakningsvarv för alla registrerade stegar.
+        :return: Minsta avståndet i pips till någon trigger (None om inget avstånd finns),
+                 eller False om terminalen inte svarade.
+        """
+        with self._lock:
+            ladders = list(self.ladders.items())
+        positions = mt5.positions_get()
+        orders = mt5.orders_get()
+        if positions is None or orders is None:
+            print(f"Failed to get positions/orders. Retrying... {mt5.last_error()}")
+            return False
+
+        # Gruppera en gång per varv så att kostnaden inte växer med antalet stegar
+        positions_by_key = {}
+        for pos in positions:
+            positions_by_key.setdefault((pos.symbol, pos.magic), []).append(pos)
+        orders_by_key = {}
+        for order in orders:
+            orders_by_key.setdefault((order.symbol, order.magic), []).append(order)
+
+        distances = []
+        for key, ladder in ladders:
+            distance = ladder.process(positions_by_key.get(key, []), orders_by_key.get(key, []))
+            if ladder.finished:
+                self._finish(ladder)
+            elif distance is not None:
+                distances.append(distance)
+        return min(distances) if distances else None
+
+    def start(self):
+        """
+        Kör övervakningen i en bakgrundstråd så länge det finns stegar, för processer som
+        tar emot nya stegar medan de gamla övervakas. Anropa efter register().
+        """
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_in_background, name="ladder-monitor", daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def _run_in_background(self):
+        try:
+            while True:
+                try:
+                    self.run()
+                except Exception as e:
+                    # Ett fel i ett varv får inte lämna stegarna utan övervakning
+                    print(f"Ladder monitor cycle failed: {e!r}")
+                    logging.exception("Ladder monitor cycle failed")
+                    # Sov utan att läsa ticks, det kan vara tickavläsningen som felar
+                    self.poller.consecutive_errors += 1
+                    time.sleep(self.poller.error_delay())
+                    continue
+                # Under låset så att en stege som registreras just nu inte blir utan övervakning
+                with self._thread_lock:
+                    if not self.ladders:
+                        self._thread = None
+                        return
+        finally:
+            # Även om tråden dör av något annat ska nästa start() kunna starta en ny
+            with self._thread_lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def run(self):
+        """
+        Övervakar tills inga stegar finns kvar i registret.
+        """
+        print(f"Startar övervakning av {len(self.ladders)} stegar...")
+        while self.ladders:
+            distance = self.run_cycle()
+            if distance is False:
+                self.poller.wait_after_error()
+            else:
+                self.poller.wait(distance)
+        print("Alla stegar avslutade.")
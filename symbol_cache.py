@@ -0,0 +1,153 @@
+import threading
+import time
+
+from connection import mt5
+
+# Fält som inte ändras under en session och därför cachas tills sessionen avslutas
+STATIC_FIELDS = frozenset({
+    "name", "digits", "point", "volume_min", "volume_max", "volume_step",
+    "trade_contract_size", "trade_tick_size", "trade_stops_level", "trade_freeze_level",
+    "currency_base", "currency_profit", "currency_margin",
+})
+
+# Hur länge volatila fält (bid/ask, tick value osv.) får återanvändas, i sekunder
+DEFAULT_VOLATILE_TTL = 0.25
+
+
+class SymbolInfoCache:
+    """
+    Cache för mt5.symbol_info per symbol.
+    Statiska fält lever tills cachen töms, volatila fält hämtas om efter volatile_ttl sekunder.
+    """
+
+    def __init__(self, volatile_ttl=DEFAULT_VOLATILE_TTL, clock=time.monotonic):
+        self.volatile_ttl = volatile_ttl
+        self._clock = clock
+        self._entries = {}
+        # Skyddar bara dictionaryna. mt5.symbol_info anropas under symbolens eget lås,
+        # så att en långsam symbol inte får alla andra att vänta.
+        self._lock = threading.Lock()
+        self._symbol_locks = {}
+        # Räknas upp av invalidate(), ett svar som hämtats före ogiltigförklaringen sparas inte
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh(self, symbol):
+        with self._lock:
+            generation = self._generation
+        info = mt5.symbol_info(symbol)
+        with self._lock:
+            self.misses += 1
+            if generation != self._generation:
+                return info
+            if info is None:
+                self._entries.pop(symbol, None)
+            else:
+                self._entries[symbol] = {"info": info, "fetched_at": self._clock(), "stale": set()}
+        return info
+
+    def _cached(self, symbol, fields):
+        # Anropas med self._lock taget
+        entry = self._entries.get(symbol)
+        if fields is None:
+            fresh = entry is not None and not entry["stale"] and self._clock() - entry["fetched_at"] < self.volatile_ttl
+        else:
+            fresh = self._is_fresh(entry, fields)
+        if fresh:
+            self.hits += 1
+            return entry["info"]
+        return None
+
+    def _is_fresh(self, entry, fields):
+        if entry is None or entry["stale"].intersection(fields):
+            return False
+        if all(field in STATIC_FIELDS for field in fields):
+            return True
+        return self._clock() - entry["fetched_at"] < self.volatile_ttl
+
+    def get(self, symbol, field):
+        """
+        Hämtar ett enskilt fält för en symbol.
+        :param symbol: Symbolens namn.
+        :param field: Fältnamn i SymbolInfo (t.ex. 'point' eller 'ask').
+        :return: Fältets värde eller None om symbolen inte hittas.
+        """
+        info = self.info(symbol, fields=(field,))
+        if info is None:
+            return None
+        return getattr(info, field)
+
+    def info(self, symbol, fields=None):
+        """
+        Hämtar hela SymbolInfo för en symbol.
+        :param symbol: Symbolens namn.
+        :param fields: Fält som anroparen behöver. Om bara statiska fält anges
+                       används cachat värde oavsett ålder. None betyder alla fält.
+        :return: SymbolInfo eller None om symbolen inte hittas.
+        """
+        with self._lock:
+            info = self._cached(symbol, fields)
+            if info is not None:
+                return info
+            symbol_lock = self._symbol_locks.setdefault(symbol, threading.Lock())
+        with symbol_lock:
+            # En annan tråd kan ha hämtat symbolen medan vi väntade
+            with self._lock:
+                info = self._cached(symbol, fields)
+            if info is not None:
+                return info
+            return self._refresh(symbol)
+
+    def static(self, symbol):
+        """
+        Hämtar SymbolInfo där endast de statiska fälten är garanterat aktuella.
+        """
+        return self.info(symbol, fields=("digits",))
+
+    def invalidate(self, symbol=None, fields=None):
+        """
+        Ogiltigförklarar cachade värden.
+        :param symbol: Symbol att ogiltigförklara, None betyder alla symboler.
+        :param fields: Fält som ska hämtas om vid nästa läsning, None betyder hela posten.
+        """
+        with self._lock:
+            self._generation += 1
+            symbols = list(self._entries) if symbol is None else [symbol]
+            for name in symbols:
+                if fields is None:
+                    self._entries.pop(name, None)
+                elif name in self._entries:
+                    self._entries[name]["stale"].update(fields)
+
+
+# Delad cache för hela processen
+cache = SymbolInfoCache()
+
+
+def get_symbol_info(symbol):
+    """
+    Hämtar SymbolInfo med volatila fält som är högst volatile_ttl sekunder gamla.
+    """
+    return cache.info(symbol)
+
+
+def get_static_info(symbol):
+    """
+    Hämtar SymbolInfo för statiska fält (digits, point, volymgränser, kontraktsstorlek).
+    """
+    return cache.static(symbol)
+
+
+def get_symbol_field(symbol, field):
+    """
+    Hämtar ett fält för en symbol, statiskt eller volatilt.
+    """
+    return cache.get(symbol, field)
+
+
+def invalidate(symbol=None, fields=None):
+    """
+    Ogiltigförklarar den delade cachen, se SymbolInfoCache.invalidate.
+    """
+    cache.invalidate(symbol, fields)
@@ -0,0 +1,36 @@
+def format_table(columns, rows, index=None, formats=None):
+    """
+    Formaterar en tabell med fasta kolumnbredder, som pandas utskrift av en DataFrame
+    men utan att pandas behöver importeras.
+    :param columns: Kolumnnamn.
+    :param rows: Lista med rader, en lista med värden per rad.
+    :param index: Radnamn som visas i första kolumnen, valfritt.
+    :param formats: Formatsträngar per kolumn, t.ex. {"Spread": ".2f"}. Tomma värden ("" eller None) visas tomma.
+    :return: Tabellen som en sträng.
+    """
+    formats = formats or {}
+
+    def cell(column, value):
+        if value is None or value == "":
+            return ""
+        if isinstance(value, float) and column in formats:
+            return format(value, formats[column])
+        return str(value)
+
+    body = [[cell(column, value) for column, value in zip(columns, row)] for row in rows]
+    labels = [str(label) for label in index] if index is not None else None
+
+    widths = [max([len(str(column))] + [len(row[i]) for row in body]) for i, column in enumerate(columns)]
+    index_width = max(len(label) for label in labels) if labels else 0
+
+    lines = []
+    header = "  ".join(str(column).rjust(width) for column, width in zip(columns, widths))
+    lines.append((" " * index_width + "  " + header) if labels else header)
+    for i, row in enumerate(body):
+        line = "  ".join(value.rjust(width) for value, width in zip(row, widths))
+        lines.append((labels[i].ljust(index_width) + "  " + line) if labels else line)
+    return "\n".join(lines)
+
+
+def print_table(columns, rows, index=None, formats=None):
+    print(format_table(columns, rows, index, formats))
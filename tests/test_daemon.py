@@ -0,0 +1,77 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import daemon
+import fake_mt5
+
+
+@pytest.fixture
+def served(tmp_path):
+    terminal = fake_mt5.FakeTerminal(balance=100000, leverage=1000, currency="USD")
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+    previous = fake_mt5.install(terminal)
+    planning_daemon = daemon.PlanningDaemon(journal_file=str(tmp_path / "journal.jsonl"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert planning_daemon.start(["EURUSD"])
+    server = daemon.serve(planning_daemon, ("127.0.0.1", 0), token_file=str(tmp_path / "daemon.token"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield terminal, server
+    server.shutdown()
+    server.server_close()
+    # Övervakningen slutar när registret är tomt, innan terminalen kopplas bort
+    supervisor = planning_daemon.supervisor
+    for key in list(supervisor.ladders):
+        supervisor.unregister(*key)
+    if supervisor._thread is not None:
+        supervisor._thread.join(5)
+    planning_daemon.close()
+    fake_mt5.restore(previous)
+
+
+def _post(server, path, payload, headers):
+    host, port = server.server_address
+    http_request = urllib.request.Request(f"http://{host}:{port}{path}", data=json.dumps(payload).encode(),
+                                          headers=headers)
+    try:
+        with urllib.request.urlopen(http_request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def test_token_file_is_private(served):
+    _, server = served
+    assert os.stat(server.token_file).st_mode & 0o077 == 0
+    assert daemon.read_token(server.token_file) == server.token
+
+
+def test_browser_requests_are_refused(served):
+    terminal, server = served
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan_id = daemon.request("/plan", {"symbol": "EURUSD"}, server.server_address, token=server.token)["plan_id"]
+    submit = {"plan_id": plan_id}
+    token = {daemon.TOKEN_HEADER: server.token}
+
+    # Så som en webbsida kan skicka utan preflight
+    assert _post(server, "/submit", submit, {"Content-Type": "text/plain", "Origin": "http://evil.example"}) == 403
+    assert _post(server, "/submit", submit, {"Content-Type": "application/json", "Origin": "null", **token}) == 403
+    assert _post(server, "/submit", submit, {"Content-Type": "text/plain", **token}) == 415
+    assert _post(server, "/submit", submit, {"Content-Type": "application/json"}) == 401
+    assert _post(server, "/submit", submit, {"Content-Type": "application/json", daemon.TOKEN_HEADER: "x"}) == 401
+    assert daemon.request("/status", address=server.server_address, token="x")["error"]
+    assert not terminal.positions and not terminal.orders
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = daemon.request("/submit", submit, server.server_address, token=server.token)
+    assert "error" not in result
+    assert terminal.positions
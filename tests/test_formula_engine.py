@@ -0,0 +1,124 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formula_engine import DIV0, NAME, VALUE, FormulaEngine, compile_formula, tokenize
+from sheet_model import MARGIN_OF_SAFETY_FORMULAS, SHEET
+
+# "Input into the EA settings" i dictionary.py
+EA_SETTINGS = {
+    "D7": 1250, "D8": 0.10, "D9": 100, "D10": 50, "D11": 0.04, "D12": 40,
+    "D13": 0.35, "D14": 0.50, "D15": 0.65, "D16": 6.0, "D17": 10, "D18": 13.0,
+}
+
+# Resultaten som arbetsboken sparat, från "Trading Plan Overview", "Initial Stop" och "Margin of Safety"
+WORKBOOK_RESULTS = {
+    "O12": 125, "M8": 0.10, "N8": 87, "O8": 87,
+    "L9": 35, "M9": 0.02, "N9": 52, "O9": 9,
+    "L10": 50, "M10": 0.04, "N10": 37, "O10": 13,
+    "L11": 65, "M11": 0.08, "N11": 22, "O11": 16,
+    "M25": 0.1, "N25": 50, "O25": 50,
+    "U9": 29, "U16": 33, "U24": -32,
+}
+
+
+def _workbook(inputs=EA_SETTINGS, formulas=MARGIN_OF_SAFETY_FORMULAS):
+    cells = {coordinate: {"value": value, "formula": None} for coordinate, value in inputs.items()}
+    cells.update({coordinate: {"value": None, "formula": formula} for coordinate, formula in formulas.items()})
+    return {SHEET: cells}
+
+
+def _evaluate(formula, **cells):
+    return compile_formula(formula, SHEET).evaluate({(SHEET, name): value for name, value in cells.items()})
+
+
+def test_workbook_formulas_give_saved_results():
+    values = FormulaEngine(_workbook()).evaluate()
+    for coordinate, expected in WORKBOOK_RESULTS.items():
+        assert values[(SHEET, coordinate)] == pytest.approx(expected), coordinate
+
+
+def test_no_third_top_up_gives_text():
+    inputs = dict(EA_SETTINGS, D15=0)
+    values = FormulaEngine(_workbook(inputs)).evaluate()
+    assert values[(SHEET, "U24")] == "NA"
+    assert values[(SHEET, "M11")] == 0
+
+
+def test_order_puts_dependencies_first():
+    engine = FormulaEngine(_workbook())
+    position = {key: index for index, key in enumerate(engine.order)}
+    assert set(position) == {(SHEET, coordinate) for coordinate in MARGIN_OF_SAFETY_FORMULAS}
+    for key in engine.order:
+        for reference in engine.formulas[key].references:
+            if reference in engine.formulas:
+                assert position[reference] < position[key], (reference, key)
+
+
+def test_circular_reference():
+    with pytest.raises(ValueError, match="Circular"):
+        FormulaEngine(_workbook(formulas={"A1": "=B1+1", "B1": "=C1", "C1": "=A1", "D1": "=1"}))
+
+
+def test_differences_against_saved_values():
+    workbook = _workbook()
+    engine = FormulaEngine(workbook)
+    # Celler utan sparat resultat i dictionary.py får det beräknade värdet
+    for (_, coordinate), value in engine.evaluate().items():
+        workbook[SHEET][coordinate]["value"] = WORKBOOK_RESULTS.get(coordinate, value)
+    assert engine.differences(workbook, tolerance=1e-6) == []
+    workbook[SHEET]["O12"]["value"] = 126
+    assert engine.differences(workbook, tolerance=1e-6) == [(SHEET, "O12", 126, 125)]
+
+
+def test_swedish_aliases_and_separators():
+    assert _evaluate('=OM(D15=0;"N/A";-U24)', D15=0.65, U24=-32) == 32
+    assert _evaluate('=OM(D15=0;"N/A";-U24)', D15=0, U24=-32) == "N/A"
+    assert _evaluate("=AVRUNDA.UPPÅT(A1*1,5;0)", A1=3) == 5
+    assert _evaluate("=SUMMA(A1:A3;0,25)", A1=1, A2=2, A3=None) == 3.25
+    assert _evaluate("=OCH(SANT;ICKE(FALSKT))") is True
+    # Med ',' som avskiljare är '.' decimaltecken
+    assert _evaluate("=ROUND(A1*1.5,0)", A1=3) == 5
+    assert ("number", "1,5") in tokenize("=A1*1,5;2")
+    assert ("number", "1,5") not in tokenize("=ROUND(1,5)")
+
+
+def test_precedence():
+    assert _evaluate("=2+3*4^2") == 50
+    assert _evaluate("=-2^2") == 4
+    assert _evaluate("=(+R8-L9)*-1", R8=50, L9=35) == -15
+    assert _evaluate("=50%*4") == 2
+    assert _evaluate('=1+1&"a"') == "2a"
+    assert _evaluate("=1+2=3") is True
+
+
+def test_rounding_is_half_away_from_zero():
+    assert _evaluate("=ROUND(2.5;0)") == 3
+    assert _evaluate("=ROUND(-2.5;0)") == -3
+    assert _evaluate("=ROUNDUP(0.021;2)") == pytest.approx(0.03)
+    assert _evaluate("=ROUNDDOWN(-1.29;1)") == pytest.approx(-1.2)
+    # 0.285 kan inte skrivas exakt binärt, Excel avrundar det som visas
+    assert _evaluate("=ROUND(0.285;2)") == pytest.approx(0.29)
+
+
+def test_error_values():
+    assert _evaluate("=1/0") == DIV0
+    assert _evaluate("=A1*2+1", A1=DIV0) == DIV0
+    assert _evaluate("=IFERROR(1/A1;7)", A1=0) == 7
+    assert _evaluate("=OMFEL(1/A1;7)", A1=4) == 0.25
+    assert _evaluate('="x"+1') == VALUE
+    assert _evaluate("=NOSUCHFUNCTION(1)") == NAME
+    assert _evaluate("=AVERAGE(A1:A2)", A1=None, A2=None) == DIV0
+    assert _evaluate("=SUM(A1:A2)", A1=1, A2=DIV0) == DIV0
+    # IF räknar bara grenen som används
+    assert _evaluate("=OM(A1=0;0;1/A1)", A1=0) == 0
+
+
+def test_syntax_errors():
+    with pytest.raises(SyntaxError):
+        compile_formula("=1+#")
+    with pytest.raises(SyntaxError):
+        compile_formula("=ROUND(1;")
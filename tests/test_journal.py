@@ -0,0 +1,122 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_mt5
+import journal
+from supervisor import Ladder, LadderSupervisor
+
+
+@pytest.fixture
+def terminal():
+    terminal = fake_mt5.FakeTerminal(balance=100000, leverage=1000, currency="USD")
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+    previous = fake_mt5.install(terminal)
+    yield terminal
+    fake_mt5.restore(previous)
+
+
+def _ladder(magic):
+    return Ladder("EURUSD", magic, 1.1001, 1.1004, [1.1004, 1.1007, 1.1010], 0.00001, 10, tp_price=1.1101)
+
+
+def _write(path, events):
+    log = journal.Journal(str(path), sync_interval=0)
+    for magic, event_type, fields in events:
+        if event_type == "plan":
+            journal.record_plan(log, _ladder(magic), tp_price=1.1101)
+        else:
+            log.append(event_type, symbol="EURUSD", magic=magic, **fields)
+    log.close()
+
+
+def _open(terminal, magic):
+    result = terminal.order_send({"action": terminal.TRADE_ACTION_DEAL, "symbol": "EURUSD", "volume": 0.1,
+                                  "type": terminal.ORDER_TYPE_BUY, "magic": magic})
+    return result.order
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    _write(path, [(1, "plan", {}), (1, "fill", {"ticket": 10})])
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"type":"sl","symbol":"EURUSD","magic":1,"tick')
+
+    events = list(journal.read_events(str(path)))
+    assert [event["type"] for event in events] == ["plan", "fill"]
+    assert journal.replay(str(path))[("EURUSD", 1)]["positions"] == {"10": None}
+
+
+def test_closed_event_drops_its_ladder(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    _write(path, [(1, "plan", {}), (2, "plan", {}), (1, "fill", {"ticket": 10}), (1, "closed", {}),
+                  (2, "fill", {"ticket": 11}), (1, "sl", {"ticket": 10, "sl": 1.1004})])
+
+    ladders = journal.replay(str(path))
+    assert list(ladders) == [("EURUSD", 2)]
+    assert ladders[("EURUSD", 2)]["levels"] == [1.1004, 1.1007, 1.1010]
+    assert ladders[("EURUSD", 2)]["tp_price"] == 1.1101
+
+
+def test_missing_journal_replays_empty(tmp_path):
+    assert journal.replay(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_recover_drops_ladder_closed_while_down(tmp_path, terminal):
+    path = tmp_path / "journal.jsonl"
+    live = _open(terminal, 1)
+    _write(path, [(1, "plan", {}), (2, "plan", {}), (1, "fill", {"ticket": live}), (2, "fill", {"ticket": 99})])
+
+    supervisor = LadderSupervisor()
+    with contextlib.redirect_stdout(io.StringIO()):
+        recovered = journal.recover(str(path), supervisor)
+
+    assert [ladder.key for ladder in recovered] == [("EURUSD", 1)]
+    assert list(supervisor.ladders) == [("EURUSD", 1)]
+    assert recovered[0].position_tickets == {live}
+    assert recovered[0].tp_price == 1.1101
+    # Journalen skrivs om utan den stängda stegen
+    assert list(journal.replay(str(path))) == [("EURUSD", 1)]
+
+
+def test_recover_restores_break_even_from_sl_events(tmp_path, terminal):
+    path = tmp_path / "journal.jsonl"
+    first, second = _open(terminal, 1), _open(terminal, 2)
+    _write(path, [(1, "plan", {}), (1, "fill", {"ticket": first}), (1, "sl", {"ticket": first, "sl": 1.1004}),
+                  (2, "plan", {}), (2, "fill", {"ticket": second})])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        recovered = {ladder.magic: ladder for ladder in journal.recover(str(path), LadderSupervisor())}
+
+    assert recovered[1].break_even_active
+    assert not recovered[2].break_even_active
+
+
+def test_recover_returns_none_when_terminal_does_not_answer(tmp_path, terminal, monkeypatch):
+    path = tmp_path / "journal.jsonl"
+    _write(path, [(1, "plan", {})])
+    monkeypatch.setattr(terminal, "positions_get", lambda *args, **kwargs: None)
+    journal.mt5.reset()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert journal.recover(str(path), LadderSupervisor()) is None
+    journal.mt5.reset()
+    assert list(journal.replay(str(path))) == [("EURUSD", 1)]
+
+
+def test_compact_keeps_state(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    _write(path, [(1, "plan", {}), (2, "plan", {}), (1, "fill", {"ticket": 10}), (1, "fill", {"ticket": 11}),
+                  (1, "sl", {"ticket": 10, "sl": 1.1004}), (2, "closed", {})])
+    before = journal.replay(str(path))
+
+    journal.compact(str(path), before)
+
+    assert journal.replay(str(path)) == before
+    assert len(list(journal.read_events(str(path)))) == 4
+    assert not os.path.exists(str(path) + ".tmp")
@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_mt5
+from metrics import InstrumentedBackend, Registry
+
+
+def test_errors_by_call():
+    terminal = fake_mt5.FakeTerminal()
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+    registry = Registry()
+    backend = InstrumentedBackend(terminal, registry)
+
+    assert backend.initialize()
+    backend.shutdown()
+    assert backend.symbol_info("GBPUSD") is None
+    result = backend.order_send({"action": terminal.TRADE_ACTION_DEAL, "symbol": "EURUSD", "volume": 0.001,
+                                 "type": terminal.ORDER_TYPE_BUY})
+
+    # shutdown() ger None och initialize() mäts inte, en omstart är inget fel
+    assert registry.errors == {("symbol_info", "none"): 1, ("order_send", str(result.retcode)): 1}
+    assert set(registry.calls) == {"symbol_info", "order_send"}
+    assert 'mt5_call_errors_total{call="symbol_info",retcode="none"} 1' in registry.render()
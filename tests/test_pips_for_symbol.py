@@ -0,0 +1,63 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_mt5
+import main
+import pip_values
+import settings
+
+
+@pytest.fixture
+def terminal():
+    terminal = fake_mt5.FakeTerminal(balance=100000, leverage=1000, currency="USD")
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+    terminal.add_symbol("GBPJPY", digits=3, bid=190.0, ask=190.02)
+    terminal.add_symbol("USDJPY", digits=3, bid=150.0, ask=150.01)
+    previous = fake_mt5.install(terminal)
+    pip_values.service.refresh()
+    yield terminal
+    fake_mt5.restore(previous)
+
+
+def test_three_digit_symbol_uses_its_own_pips(terminal):
+    with contextlib.redirect_stdout(io.StringIO()):
+        # settings.number_of_pips och initial_stop_level gäller settings.symbol (EURUSD)
+        assert settings.number_of_pips == 10
+        assert settings.initial_stop_level == 3
+        ladder_plan = main.plan("GBPJPY")
+        prepared = main.prepare_planned_ladder("GBPJPY", ladder_plan)
+
+    assert settings.pips_for_symbol("GBPJPY", "number_of_pips") == 100
+    assert settings.pips_for_symbol("GBPJPY", "initial_stop_level") == 30
+    # Lot size räknas med 30 pips stop, inte EURUSD:s 3 pips (avrundad till 0.01)
+    loss = float(ladder_plan["loss_in_dollars"][0, 0])
+    pip_value = pip_values.service.pip_value("GBPJPY")
+    assert float(ladder_plan["initial_lot_size"][0, 0]) == pytest.approx(loss / (30 * pip_value), abs=0.01)
+
+    ask = 190.02
+    assert prepared is not None
+    assert prepared["tp_price"] == pytest.approx(ask + 100 * 10 * 0.001)
+    assert prepared["sl_price"] == pytest.approx(ask - 30 * 10 * 0.001)
+
+
+def test_failed_lookup_is_not_cached():
+    terminal = fake_mt5.FakeTerminal(balance=100000, leverage=1000, currency="USD")
+    previous = fake_mt5.install(terminal)
+    settings.__dict__.pop("number_of_pips", None)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            # EURUSD finns inte än, pipsen är ojusterade
+            assert settings.number_of_pips == 100
+        assert "number_of_pips" not in settings.__dict__
+
+        terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+        assert settings.number_of_pips == 10
+        assert settings.__dict__["number_of_pips"] == 10
+    finally:
+        fake_mt5.restore(previous)
@@ -0,0 +1,140 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from planner import plan_ladders
+
+
+def baseline(pip_value, spread_in_pips, account_size, target_gain_percent, number_of_pips,
+             initial_stop_percent, initial_stop_level, top_up_levels1, top_up_levels2, top_up_levels3):
+    """
+    Formlerna från den ursprungliga main.py, för en symbol och tre top ups.
+    """
+    loss_in_dollars = (initial_stop_percent / 100) * account_size
+    initial_lot_size = round(loss_in_dollars / (initial_stop_level * pip_value), 2)
+    pip_gains = {
+        'initial': round(number_of_pips - spread_in_pips, 2),
+        'stop_1': round(number_of_pips * (1 - (top_up_levels1 / 100)) - spread_in_pips, 2),
+        'stop_2': round(number_of_pips * (1 - (top_up_levels2 / 100)) - spread_in_pips, 2),
+        'stop_3': round(number_of_pips * (1 - (top_up_levels3 / 100)) - spread_in_pips, 2),
+    }
+    total_gain = (account_size * target_gain_percent) / 100
+    gain_in_dollars_initial = initial_lot_size * pip_gains['initial'] * pip_value
+    top_up_sum = top_up_levels1 + top_up_levels2 + top_up_levels3
+    gain_in_dollars_stop_1 = ((total_gain - gain_in_dollars_initial) * top_up_levels1) / top_up_sum
+    gain_in_dollars_stop_2 = ((total_gain - gain_in_dollars_initial) * top_up_levels2) / top_up_sum
+    gain_in_dollars_stop_3 = ((total_gain - gain_in_dollars_initial) * top_up_levels3) / top_up_sum
+    total_gain_actual = gain_in_dollars_initial + gain_in_dollars_stop_1 + gain_in_dollars_stop_2 + gain_in_dollars_stop_3
+
+    pips_stop_1 = top_up_levels1 / number_of_pips
+    pips_stop_2 = number_of_pips / (top_up_levels2 / 10)
+    pips_stop_3 = number_of_pips / (top_up_levels3 / 10)
+
+    lots_stop_1 = gain_in_dollars_stop_1 / (pip_gains['stop_1'] * pip_value)
+    level_initial = (lots_stop_1 / initial_lot_size) * pips_stop_2 / (lots_stop_1 / initial_lot_size)
+    level_stop_1 = level_initial
+    pip_gains_initial = level_initial
+    pip_gain_stop_1 = (level_initial - pips_stop_1) * -1
+    result_initial = initial_lot_size * pip_gains_initial * pip_value
+    result_stop_1 = lots_stop_1 * pip_gain_stop_1 * (-pip_value)
+
+    lots_stop_2 = gain_in_dollars_stop_2 / (pip_gains['stop_2'] * pip_value)
+    level_stop_2 = (lots_stop_2 / lots_stop_1) * pips_stop_3 / (lots_stop_2 / lots_stop_1)
+    pip_gain_stop_2 = (level_stop_2 - pips_stop_2) * -1
+    result_stop_2 = lots_stop_2 * pip_gain_stop_2 * (-pip_value)
+
+    lots_stop_3 = gain_in_dollars_stop_3 / (pip_gains['stop_3'] * pip_value)
+    level_stop_3 = (lots_stop_3 / lots_stop_2) * pips_stop_3 / (lots_stop_3 / lots_stop_2)
+    pip_gain_stop_3 = (level_stop_3 - pips_stop_3) * -1
+    result_stop_3 = lots_stop_3 * pip_gain_stop_3 * (-pip_value)
+
+    return {
+        "loss_in_dollars": loss_in_dollars,
+        "initial_lot_size": initial_lot_size,
+        "pip_gains": [pip_gains['initial'], pip_gains['stop_1'], pip_gains['stop_2'], pip_gains['stop_3']],
+        "total_gain": total_gain,
+        "gain_in_dollars": [gain_in_dollars_initial, gain_in_dollars_stop_1, gain_in_dollars_stop_2,
+                            gain_in_dollars_stop_3],
+        "total_gain_actual": total_gain_actual,
+        "level": [level_initial, level_stop_1, level_stop_2, level_stop_3],
+        "lots": [initial_lot_size, lots_stop_1, lots_stop_2, lots_stop_3],
+        "spread": [lots * spread_in_pips * pip_value
+                   for lots in (initial_lot_size, lots_stop_1, lots_stop_2, lots_stop_3)],
+        "pip_gain": [pip_gains_initial, pip_gain_stop_1, pip_gain_stop_2, pip_gain_stop_3],
+        "result": [result_initial, result_stop_1, result_stop_2, result_stop_3],
+    }
+
+
+PIP_VALUES = [10.0, 6.7]
+SPREADS = [0.2, 1.5]
+VARIANTS = {
+    "account_size": [10000.0, 25000.0],
+    "target_gain_percent": [10.0, 4.0],
+    "number_of_pips": [100.0, 60.0],
+    "initial_stop_percent": [1.0, 0.5],
+    "initial_stop_level": [3.0, 5.0],
+    "top_up_levels": [[10.0, 20.0, 30.0], [15.0, 35.0, 50.0]],
+}
+
+
+def _plan(**overrides):
+    parameters = dict(VARIANTS, **overrides)
+    return plan_ladders(["EURUSD", "GBPJPY"], PIP_VALUES, SPREADS, **parameters)
+
+
+def test_three_top_ups_match_baseline():
+    plan = _plan()
+    assert plan["pip_gains"].shape == (2, 2, 4)
+    for s, (pip_value, spread) in enumerate(zip(PIP_VALUES, SPREADS)):
+        for v in range(2):
+            parameters = {name: values[v] for name, values in VARIANTS.items() if name != "top_up_levels"}
+            expected = baseline(pip_value, spread, *parameters.values(), *VARIANTS["top_up_levels"][v])
+            for name in ("loss_in_dollars", "initial_lot_size", "pip_gains", "total_gain", "gain_in_dollars",
+                         "total_gain_actual"):
+                assert plan[name][s, v] == pytest.approx(expected[name]), name
+            for name in ("level", "lots", "spread", "pip_gain", "result"):
+                assert plan["break_even"][name][s, v] == pytest.approx(expected[name]), name
+            # Tabell n summerar rad 0..n
+            for table in range(3):
+                assert plan["break_even"]["total_result"][s, v, table] == pytest.approx(
+                    sum(expected["result"][:table + 2]))
+                assert plan["break_even"]["total_pip_gain"][s, v, table] == pytest.approx(
+                    sum(expected["pip_gain"][:table + 2]))
+
+
+@pytest.mark.parametrize("top_up_levels", [[20.0, 40.0], [10.0, 20.0, 30.0, 40.0], [25.0]])
+def test_other_number_of_top_ups(top_up_levels):
+    plan = plan_ladders(["EURUSD"], [10.0], [0.2], 10000.0, 10.0, 100.0, 1.0, 3.0, top_up_levels)
+    count = len(top_up_levels)
+    levels = np.array(top_up_levels)
+
+    assert plan["pip_gains"][0, 0] == pytest.approx([99.8] + list(np.round(100 * (1 - levels / 100) - 0.2, 2)))
+    # Resten av målvinsten fördelas på stop-ordrarna i proportion till nivåerna
+    gains = plan["gain_in_dollars"][0, 0]
+    assert gains[1:] == pytest.approx((1000.0 - gains[0]) * levels / levels.sum())
+    assert plan["total_gain_actual"][0, 0] == pytest.approx(1000.0)
+
+    # Första stoppet t1 / pips, övriga pips / (t / 10). Stop k ligger på nivån för stop
+    # k + 1, det sista på sin egen, och initialordern på samma nivå som stop 1.
+    pips_stops = 100 / (levels / 10)
+    pips_stops[0] = levels[0] / 100
+    next_stop = [min(k + 1, count - 1) for k in range(count)]
+    expected_level = [pips_stops[next_stop[0]]] + [pips_stops[k] for k in next_stop]
+    break_even = plan["break_even"]
+    assert break_even["level"][0, 0] == pytest.approx(expected_level)
+    assert break_even["pip_gain"][0, 0] == pytest.approx([expected_level[0]] + list(pips_stops - expected_level[1:]))
+    lots = break_even["lots"][0, 0]
+    assert lots[1:] == pytest.approx(gains[1:] / (plan["pip_gains"][0, 0, 1:] * 10.0))
+    assert break_even["result"][0, 0, 0] == pytest.approx(lots[0] * expected_level[0] * 10.0)
+    assert break_even["result"][0, 0, 1:] == pytest.approx(-lots[1:] * break_even["pip_gain"][0, 0, 1:] * 10.0)
+    assert break_even["total_result"].shape == (1, 1, count)
+    assert break_even["total_result"][0, 0, -1] == pytest.approx(break_even["result"][0, 0].sum())
+
+
+def test_mismatched_symbol_values():
+    with pytest.raises(ValueError):
+        plan_ladders(["EURUSD", "GBPJPY"], [10.0], [0.2, 1.5], 10000.0, 10.0, 100.0, 1.0, 3.0, [10.0, 20.0, 30.0])
@@ -0,0 +1,101 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_mt5
+from connection import mt5
+from order_execution import prepare_ladder
+from preflight import validate_ladder
+
+
+def _install(balance=100000, leverage=1000, stops_level=0, freeze_level=0):
+    terminal = fake_mt5.FakeTerminal(balance=balance, leverage=leverage, currency="USD")
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1000, ask=1.1001, stops_level=stops_level,
+                        freeze_level=freeze_level)
+    return terminal, fake_mt5.install(terminal)
+
+
+@pytest.fixture
+def install():
+    previous = []
+
+    def install(**kwargs):
+        terminal, backend = _install(**kwargs)
+        previous.append(backend)
+        return terminal
+
+    yield install
+    for backend in reversed(previous):
+        fake_mt5.restore(backend)
+
+
+def _ladder(levels=(1.1011, 1.1021, 1.1031), lots=(1.0, 0.5, 0.5, 0.5)):
+    # Köp på ask 1.1001 med SL 1.0971 och TP 1.1101, break-even på initialorderns pris
+    return prepare_ladder("EURUSD", lots[0], 1.1001, 1.0971, 1.1101, list(lots[1:]), list(levels))
+
+
+def _checks(report):
+    return sorted({(violation["order"], violation["check"]) for violation in report["violations"]})
+
+
+def test_valid_ladder(install):
+    install()
+    report = validate_ladder(_ladder())
+    assert report["violations"] == []
+    # 100 000 i kontrakt, hävstång 1000, marginal per lot räknad på högsta priset
+    assert report["margin_per_order"] == pytest.approx([110.31, 55.155, 55.155, 55.155])
+    assert report["margin_required"] == pytest.approx(275.775)
+
+
+def test_stops_level(install):
+    # stop_1 ligger 100 points från ask, stop_2 200 points
+    install(stops_level=150)
+    report = validate_ladder(_ladder())
+    assert ("stop_1", "stops_level") in _checks(report)
+    assert ("stop_2", "stops_level") not in _checks(report)
+
+    # Initialorderns SL ligger 290 points under bid
+    install(stops_level=400)
+    checks = _checks(validate_ladder(_ladder()))
+    assert ("initial", "stops_level") in checks
+    assert all((f"stop_{i}", "stops_level") in checks for i in (1, 2, 3))
+
+
+def test_freeze_level(install):
+    install(freeze_level=250)
+    checks = _checks(validate_ladder(_ladder()))
+    assert ("stop_1", "freeze_level") in checks
+    assert ("stop_2", "freeze_level") in checks
+    assert ("stop_3", "freeze_level") not in checks
+    # Break-even-SL:n vid fyllning räknas mot freeze level också
+    assert ("stop_1", "break_even") in checks
+
+
+def test_break_even_too_close(install):
+    install()
+    report = validate_ladder(_ladder(), break_even_price=1.1011)
+    assert ("stop_1", "break_even") in _checks(report)
+
+
+def test_margin_for_whole_ladder(install):
+    # 250 fri marginal räcker för initialordern men inte för hela stegen
+    install(balance=250)
+    report = validate_ladder(_ladder())
+    assert _checks(report) == [("ladder", "margin")]
+    assert report["margin_free"] == pytest.approx(250)
+
+
+def test_failed_margin_lookup(install, monkeypatch):
+    terminal = install()
+    monkeypatch.setattr(terminal, "order_calc_margin", lambda *args: None)
+    mt5.reset()
+    try:
+        report = validate_ladder(_ladder())
+    finally:
+        monkeypatch.undo()
+        mt5.reset()
+    assert ("ladder", "margin") in _checks(report)
+    assert report["margin_per_order"] == [None] * 4
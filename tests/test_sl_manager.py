@@ -0,0 +1,130 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_mt5
+from connection import mt5
+from sl_manager import SLManager
+
+POINT = 0.00001
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def terminal():
+    terminal = fake_mt5.FakeTerminal(balance=100000, leverage=1000, currency="USD")
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+    previous = fake_mt5.install(terminal)
+    yield terminal
+    fake_mt5.restore(previous)
+    mt5.reset()
+
+
+def _open(terminal, count=1):
+    for _ in range(count):
+        terminal.order_send({"action": terminal.TRADE_ACTION_DEAL, "symbol": "EURUSD", "volume": 0.1,
+                             "type": terminal.ORDER_TYPE_BUY, "magic": 1})
+    return list(terminal.positions_get())
+
+
+def _flush(manager, tickets=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return manager.flush(tickets)
+
+
+def test_sl_within_half_a_point_is_not_sent(terminal):
+    manager = SLManager(clock=Clock())
+    position = _open(terminal)[0]
+    terminal.positions[position.ticket]["sl"] = 1.09
+    position = terminal.positions_get()[0]
+
+    assert not manager.request(position, 1.09 + 0.4 * POINT, POINT)
+    assert manager.request(position, 1.09 + 0.6 * POINT, POINT)
+    assert manager.stats()["skipped"] == 1
+
+
+def test_sent_sl_is_not_resent_until_resend_after(terminal):
+    clock = Clock()
+    manager = SLManager(resend_after=1.0, clock=clock)
+    position = _open(terminal)[0]
+
+    assert manager.request(position, 1.09, POINT)
+    (ticket, sl, result), = _flush(manager)
+    assert (ticket, sl, result.retcode) == (position.ticket, 1.09, mt5.TRADE_RETCODE_DONE)
+
+    # Positionen från före ändringen har ännu ingen SL
+    clock.now = 0.5
+    assert not manager.request(position, 1.09, POINT)
+    clock.now = 1.5
+    assert manager.request(position, 1.09, POINT)
+    # När positionen visar nivån behövs inget mer
+    assert not manager.request(terminal.positions_get()[0], 1.09, POINT)
+    assert manager.stats()["pending"] == 0
+
+
+def test_token_bucket_limits_sends(terminal):
+    clock = Clock()
+    manager = SLManager(max_per_second=2.0, burst=3, clock=clock)
+    positions = _open(terminal, 5)
+    for position in positions:
+        manager.request(position, 1.09, POINT)
+
+    assert len(_flush(manager)) == 3
+    assert manager.stats()["pending"] == 2
+    assert _flush(manager) == []
+    clock.now = 0.5
+    assert len(_flush(manager)) == 1
+    clock.now = 10.0
+    assert len(_flush(manager)) == 1
+    assert all(position["sl"] == 1.09 for position in terminal.positions.values())
+
+
+def test_flush_only_given_tickets(terminal):
+    manager = SLManager(clock=Clock())
+    first, second = _open(terminal, 2)
+    manager.request(first, 1.09, POINT)
+    manager.request(second, 1.09, POINT)
+
+    assert [ticket for ticket, _, _ in _flush(manager, {second.ticket})] == [second.ticket]
+    assert manager.stats()["pending"] == 1
+    manager.forget([first.ticket])
+    assert manager.stats()["pending"] == 0
+
+
+@pytest.mark.parametrize("answer", [None, "rejected"])
+def test_failed_send_is_requested_again(terminal, monkeypatch, answer):
+    manager = SLManager(clock=Clock())
+    position = _open(terminal)[0]
+    send = terminal.order_send
+
+    def failing_send(request):
+        if answer is None:
+            return None
+        return send(dict(request, sl=position.price_current + POINT))
+
+    monkeypatch.setattr(terminal, "order_send", failing_send)
+    mt5.reset()
+    manager.request(position, 1.09, POINT)
+    # Ett None-svar från terminalen får inte krascha flush
+    (_, _, result), = _flush(manager)
+    assert result is None if answer is None else result.retcode != mt5.TRADE_RETCODE_DONE
+    assert manager.stats()["failed"] == 1
+
+    monkeypatch.setattr(terminal, "order_send", send)
+    mt5.reset()
+    assert manager.request(position, 1.09, POINT)
+    (_, _, result), = _flush(manager)
+    assert result.retcode == mt5.TRADE_RETCODE_DONE
+    assert terminal.positions[position.ticket]["sl"] == 1.09
@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_mt5
+from connection import mt5
+from symbol_cache import SymbolInfoCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def terminal(monkeypatch):
+    terminal = fake_mt5.FakeTerminal()
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+    terminal.add_symbol("USDJPY", digits=3, bid=150.0, ask=150.01)
+    symbol_info = terminal.symbol_info
+    terminal.calls = []
+    terminal.release = threading.Event()
+    terminal.release.set()
+
+    def slow_symbol_info(symbol):
+        terminal.calls.append(symbol)
+        if symbol == "USDJPY":
+            terminal.release.wait(5)
+        return symbol_info(symbol)
+
+    monkeypatch.setattr(terminal, "symbol_info", slow_symbol_info)
+    previous = fake_mt5.install(terminal)
+    yield terminal
+    fake_mt5.restore(previous)
+    mt5.reset()
+
+
+def _read_in_background(cache, symbol):
+    thread = threading.Thread(target=cache.info, args=(symbol,))
+    thread.start()
+    time.sleep(0.05)
+    return thread
+
+
+def test_static_and_volatile_fields(terminal):
+    clock = Clock()
+    cache = SymbolInfoCache(volatile_ttl=0.25, clock=clock)
+    assert cache.get("EURUSD", "digits") == 5
+    terminal.push_tick("EURUSD", 1, 1.2, 1.2001)
+    clock.now = 1.0
+    assert cache.get("EURUSD", "digits") == 5
+    assert terminal.calls == ["EURUSD"]
+    assert cache.get("EURUSD", "bid") == 1.2
+    cache.invalidate("EURUSD", fields=("digits",))
+    cache.get("EURUSD", "digits")
+    assert len(terminal.calls) == 3
+    assert cache.get("GBPUSD", "digits") is None
+
+
+def test_slow_symbol_does_not_block_others(terminal):
+    cache = SymbolInfoCache()
+    terminal.release.clear()
+    thread = _read_in_background(cache, "USDJPY")
+    started = time.perf_counter()
+    assert cache.get("EURUSD", "digits") == 5
+    assert time.perf_counter() - started < 0.5
+    terminal.release.set()
+    thread.join()
+
+
+def test_concurrent_reads_of_one_symbol_fetch_once(terminal):
+    cache = SymbolInfoCache()
+    terminal.release.clear()
+    threads = [_read_in_background(cache, "USDJPY") for _ in range(3)]
+    terminal.release.set()
+    for thread in threads:
+        thread.join()
+    assert terminal.calls == ["USDJPY"]
+    assert cache.misses == 1
+
+
+def test_invalidate_during_fetch_wins(terminal):
+    cache = SymbolInfoCache()
+    terminal.release.clear()
+    thread = _read_in_background(cache, "USDJPY")
+    cache.invalidate()
+    terminal.release.set()
+    thread.join()
+    # Svaret hämtades före ogiltigförklaringen och sparades inte
+    cache.static("USDJPY")
+    assert terminal.calls == ["USDJPY", "USDJPY"]
@@ -0,0 +1,141 @@
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_mt5
+from sl_manager import SLManager
+from supervisor import Ladder, LadderSupervisor
+from triggers import BREAK_EVEN, ENTRY, TAKE_PROFIT, TriggerIndex
+
+KEY = ("EURUSD", 7)
+
+
+def _ladder(magic=7, sl_manager=None):
+    # Köpstege: entry på 1.1001, stop-ordrar på 1.1011 och 1.1021, break-even 1.1006 och TP 1.1101
+    return Ladder("EURUSD", magic, 1.1001, 1.1006, [1.1011, 1.1021], 0.00001, 10, tp_price=1.1101,
+                  sl_manager=sl_manager)
+
+
+@pytest.fixture
+def index():
+    index = TriggerIndex()
+    index.add(_ladder())
+    return index
+
+
+def test_first_tick_only_seeds(index):
+    assert index.crossed("EURUSD", 1.1030, 1.1031) == []
+    assert index.crossed("EURUSD", 1.1000, 1.1001) == [(1.1006, BREAK_EVEN, KEY)]
+
+
+def test_entry_triggers_on_rising_ask(index):
+    index.crossed("EURUSD", 1.1000, 1.1001)
+    assert index.crossed("EURUSD", 1.1009, 1.1011) == [(1.1011, ENTRY, KEY)]
+    # Samma nivå nedåt är ingen aktivering
+    assert index.crossed("EURUSD", 1.1008, 1.1009) == []
+    assert index.crossed("EURUSD", 1.1008, 1.1009) == []
+
+
+def test_rising_price_crosses_every_level_passed(index):
+    index.crossed("EURUSD", 1.1000, 1.1001)
+    hits = index.crossed("EURUSD", 1.1101, 1.1102)
+    assert sorted(kind for _, kind, _ in hits) == [ENTRY, ENTRY, TAKE_PROFIT]
+
+
+def test_break_even_triggers_on_falling_bid(index):
+    index.crossed("EURUSD", 1.1000, 1.1001)
+    # Bid upp genom break-even triggar inte
+    assert index.crossed("EURUSD", 1.1007, 1.1008) == []
+    assert index.crossed("EURUSD", 1.1006, 1.1007) == [(1.1006, BREAK_EVEN, KEY)]
+
+
+def test_symbols_are_tracked_separately(index):
+    index.crossed("EURUSD", 1.1000, 1.1001)
+    index.crossed("GBPUSD", 1.2000, 1.2001)
+    assert index.crossed("GBPUSD", 1.2100, 1.2101) == []
+    assert index.crossed("EURUSD", 1.1010, 1.1011) == [(1.1011, ENTRY, KEY)]
+
+
+def test_remove_and_replace(index):
+    index.crossed("EURUSD", 1.1000, 1.1001)
+    index.add(Ladder("EURUSD", 7, 1.1001, 1.1006, [1.1031], 0.00001, 10))
+    assert index.crossed("EURUSD", 1.1020, 1.1021) == []
+
+    index.remove(KEY)
+    assert index.crossed("EURUSD", 1.1040, 1.1041) == []
+    assert index.symbols() == set()
+    assert index.distance("EURUSD", 1.1, 1.1001) is None
+
+
+def test_distance_to_nearest_level(index):
+    assert index.distance("EURUSD", 1.1000, 1.1001) == pytest.approx(0.0006)
+    assert index.distance("EURUSD", 1.1009, 1.1010) == pytest.approx(0.0001)
+    assert index.distance("EURUSD", 1.2000, 1.2001) == pytest.approx(1.2000 - 1.1101)
+    assert index.distance("GBPUSD", 1.2, 1.2001) is None
+    assert index.symbols() == {"EURUSD"}
+
+
+def test_supervisor_on_tick():
+    terminal = fake_mt5.FakeTerminal(balance=100000, leverage=1000, currency="USD")
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+    previous = fake_mt5.install(terminal)
+    try:
+        terminal.order_send({"action": terminal.TRADE_ACTION_DEAL, "symbol": "EURUSD", "volume": 0.1,
+                             "type": terminal.ORDER_TYPE_BUY, "magic": 7})
+        for level in (1.1011, 1.1021):
+            terminal.order_send({"action": terminal.TRADE_ACTION_PENDING, "symbol": "EURUSD", "volume": 0.1,
+                                 "type": terminal.ORDER_TYPE_BUY_STOP, "price": level, "magic": 7})
+        supervisor = LadderSupervisor()
+        supervisor.register(_ladder(sl_manager=SLManager(max_per_second=None)))
+
+        def tick(bid, ask):
+            terminal.push_tick("EURUSD", 0, bid, ask)
+            with contextlib.redirect_stdout(io.StringIO()):
+                return supervisor.on_tick("EURUSD", bid, ask)
+
+        assert tick(1.1000, 1.1001) == []
+        assert tick(1.1003, 1.1004) == []
+        # Första stop-ordern aktiveras, alla positioner får SL på break-even
+        assert tick(1.1011, 1.1012) == [KEY]
+        assert len(terminal.positions) == 2
+        assert all(position["sl"] == 1.1006 for position in terminal.positions.values())
+        assert supervisor.ladders[KEY].break_even_active
+
+        # Priset faller till break-even, positionerna stängs och stegen avregistreras
+        assert tick(1.1005, 1.1006) == [KEY]
+        assert not terminal.positions
+        assert KEY not in supervisor.ladders
+        assert supervisor.triggers.symbols() == set()
+    finally:
+        fake_mt5.restore(previous)
+
+
+def test_register_does_not_wait_for_terminal():
+    terminal = fake_mt5.FakeTerminal(balance=100000, leverage=1000, currency="USD")
+    terminal.add_symbol("EURUSD", digits=5, bid=1.1, ask=1.1001)
+    previous = fake_mt5.install(terminal)
+    try:
+        supervisor = LadderSupervisor()
+        supervisor.register(_ladder(sl_manager=SLManager(max_per_second=None)))
+        supervisor.on_tick("EURUSD", 1.1000, 1.1001)
+        terminal.set_latency({"positions_get": 0.5})
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Entry-nivån passeras, on_tick väntar på positions_get i en annan tråd
+            thread = threading.Thread(target=supervisor.on_tick, args=("EURUSD", 1.1011, 1.1012))
+            thread.start()
+            time.sleep(0.1)
+            started = time.perf_counter()
+            supervisor.register(_ladder(magic=8))
+            elapsed = time.perf_counter() - started
+            thread.join()
+        assert elapsed < 0.2
+        assert ("EURUSD", 8) in supervisor.ladders
+    finally:
+        fake_mt5.restore(previous)
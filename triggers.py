@@ -0,0 +1,99 @@
+import bisect
+
+# Typer av triggers
+ENTRY = "entry"
+BREAK_EVEN = "break_even"
+TAKE_PROFIT = "take_profit"
+
+# Stop-ordrar för köp aktiveras på ask, SL och TP för köppositioner på bid
+ASK = "ask"
+BID = "bid"
+
+# Riktningen som priset måste passera nivån i för att triggern ska räknas
+RISING = frozenset({ENTRY, TAKE_PROFIT})
+FALLING = frozenset({BREAK_EVEN})
+
+
+class TriggerIndex:
+    """
+    Sorterade triggernivåer för alla övervakade stegar, per symbol och prissida.
+    För varje tick letas de nivåer som passerats sedan förra ticken upp med binärsökning,
+    så att kostnaden per tick är O(log n) oavsett hur många stegar som övervakas.
+    """
+
+    def __init__(self):
+        # (symbol, sida) -> sorterade priser och (pris, typ, nyckel) i samma ordning
+        self._prices = {}
+        self._entries = {}
+        self._last = {}
+        self._keys = {}
+
+    def add(self, ladder):
+        """
+        Lägger in stegens nivåer från ladder.triggers(). En tidigare stege med samma nyckel ersätts.
+        """
+        self.remove(ladder.key)
+        sides = set()
+        for side, price, kind in ladder.triggers():
+            if price is None:
+                continue
+            index = (ladder.symbol, side)
+            prices = self._prices.setdefault(index, [])
+            entries = self._entries.setdefault(index, [])
+            position = bisect.bisect_right(prices, price)
+            prices.insert(position, price)
+            entries.insert(position, (price, kind, ladder.key))
+            sides.add(index)
+        self._keys[ladder.key] = sides
+
+    def remove(self, key):
+        for index in self._keys.pop(key, ()):
+            kept = [entry for entry in self._entries[index] if entry[2] != key]
+            self._entries[index] = kept
+            self._prices[index] = [entry[0] for entry in kept]
+
+    def distance(self, symbol, bid, ask):
+        """
+        Avståndet i pris från bid och ask till närmaste nivå på respektive sida.
+        :return: Avståndet, eller None om symbolen saknar nivåer.
+        """
+        nearest = None
+        for side, price in ((ASK, ask), (BID, bid)):
+            prices = self._prices.get((symbol, side))
+            if not prices:
+                continue
+            position = bisect.bisect_left(prices, price)
+            for neighbour in prices[max(position - 1, 0):position + 1]:
+                gap = abs(neighbour - price)
+                if nearest is None or gap < nearest:
+                    nearest = gap
+        return nearest
+
+    def symbols(self):
+        return {symbol for symbol, side in self._prices if self._prices[(symbol, side)]}
+
+    def crossed(self, symbol, bid, ask):
+        """
+        Nivåer som priset har passerat sedan förra ticken för symbolen, i triggerns riktning
+        (entry och TP uppåt, break-even nedåt). Första ticken för en sida ger inga träffar,
+        den sätter bara utgångsläget.
+        :return: Lista med (pris, typ, nyckel), tom om ingen nivå passerats.
+        """
+        hits = []
+        for side, price in ((ASK, ask), (BID, bid)):
+            index = (symbol, side)
+            last = self._last.get(index)
+            self._last[index] = price
+            prices = self._prices.get(index)
+            if last is None or not prices or price == last:
+                continue
+            if price > last:
+                # Uppåt: nivåer i (last, price]
+                start, end = bisect.bisect_right(prices, last), bisect.bisect_right(prices, price)
+                kinds = RISING
+            else:
+                # Nedåt: nivåer i [price, last)
+                start, end = bisect.bisect_left(prices, price), bisect.bisect_left(prices, last)
+                kinds = FALLING
+            hits.extend(entry for entry in self._entries[index][start:end] if entry[1] in kinds)
+        return hits